@@ -1,21 +1,30 @@
-import string
-import random
-from flask import Blueprint, jsonify
+import hashlib
+
+from flask import Blueprint, jsonify, request, make_response
+from sqlalchemy.exc import IntegrityError
 from flask_jwt_extended import (
     jwt_required, 
     get_jwt_identity
 )
 
 from models import db, User, GameRoom
+from src.llm.scheduler import llm_scheduler
+from src.room.timer import room_timers
+from src.passwords import password_hasher
+from src.user_cache import user_cache
+from src.persistence import persistence
+from src.story import story_text
+from src.lobby.snapshot import lobby_snapshot, encode_cursor, decode_cursor
+from src.room.codes import room_codes
+from src.lobby.matchmaking import matchmaking
+from src.reaper import reaper
+from src.room.snapshots import room_snapshots
+from src.room.actors import room_actors
+from src.store.store import room_store
+from src.data import ROOM_CODE_RETRIES, LOBBY_PAGE_SIZE, LOBBY_PAGE_MAX, QUICK_JOIN_HOLD
 
 api = Blueprint('api', __name__, url_prefix='/api')
 
-def generate_room_code(length=6):
-    while True:
-        code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-        if not GameRoom.query.filter_by(room_code=code).first():
-            return code
-
 @api.route('/rooms', methods=['POST'])
 @jwt_required()
 def create_room():
@@ -25,18 +34,29 @@ def create_room():
     if user.is_guest:
         return jsonify({"msg": "Convidados não podem criar salas"}), 403
 
-    new_room = GameRoom(
-        room_code=generate_room_code(),
-        status='LOBBY'
-    )
-    new_room.participants.append(user)
-    
-    db.session.add(new_room)
-    db.session.commit()
+    for _ in range(ROOM_CODE_RETRIES):
+        new_room = GameRoom(
+            room_code=room_codes.allocate(),
+            status='LOBBY'
+        )
+        new_room.participants.append(user)
+        
+        db.session.add(new_room)
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Código já usado por uma sala criada antes do alocador
+            db.session.rollback()
+    else:
+        return jsonify({"msg": "Não foi possível criar a sala"}), 500
+
+    lobby_snapshot.refresh_room(new_room.id)
 
     return jsonify({
         "msg": "Sala criada com sucesso",
         "room": {
+            "room_id": new_room.id,
             "room_code": new_room.room_code,
             "status": new_room.status,
             "created_at": new_room.created_at
@@ -45,17 +65,59 @@ def create_room():
 
 @api.route('/rooms', methods=['GET'])
 def list_rooms():
-    rooms = GameRoom.query.filter_by(status='LOBBY').all()
-    
-    room_list = [
-        {
-            "room_code": room.room_code,
-            "participants_count": room.participants.count(),
-            "created_at": room.created_at
-        } for room in rooms
-    ]
-    
-    return jsonify(rooms=room_list)
+    # ?cursor=...&limit=50&not_full=1&prefix=AB
+    try:
+        limit = min(max(int(request.args.get('limit', LOBBY_PAGE_SIZE)), 1), LOBBY_PAGE_MAX)
+    except ValueError:
+        return jsonify({"msg": "limit deve ser um número"}), 400
+
+    cursor = request.args.get('cursor') or None
+    not_full = request.args.get('not_full', '').lower() in ('1', 'true', 'yes')
+    prefix = request.args.get('prefix', '').upper() or None
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"msg": "Cursor inválido"}), 400
+
+    # A mesma versão da lista com os mesmos parâmetros dá a mesma página
+    params = f'{cursor}|{limit}|{int(not_full)}|{prefix}'
+    etag = f'{lobby_snapshot.current_version()}-{hashlib.sha1(params.encode()).hexdigest()[:16]}'
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    rooms, last = lobby_snapshot.page(after, limit, not_full, prefix)
+
+    response = jsonify(rooms=rooms, next_cursor=encode_cursor(last) if last else None)
+    response.set_etag(etag)
+    return response
+
+@api.route('/rooms/quick_join', methods=['POST'])
+@jwt_required()
+def quick_join():
+    # Segura um lugar na sala em WAITING mais cheia; o cliente entra com join_room (ou quick_join) no socket
+    user_id = int(get_jwt_identity())
+
+    room_id = matchmaking.claim(user_id)
+    if room_id is None:
+        return jsonify({"msg": "Nenhuma sala disponível"}), 404
+
+    room = room_store.get(room_id)
+    if room is None:
+        matchmaking.release(user_id)
+        return jsonify({"msg": "Nenhuma sala disponível"}), 404
+
+    room_timers.arm(('quick_join', user_id), QUICK_JOIN_HOLD, matchmaking.release, user_id)
+
+    return jsonify({
+        "room": {
+            "room_id": room_id,
+            "room_code": room.room_name
+        },
+        "hold": QUICK_JOIN_HOLD
+    })
 
 @api.route('/rooms/<string:room_code>', methods=['GET'])
 def get_room_details(room_code):
@@ -88,12 +150,47 @@ def join_game_room(room_code):
     if room.status != 'LOBBY':
         return jsonify({"msg": "Não é possível entrar em uma sala que já começou"}), 403
 
-    if user in room.participants:
+    if room.has_participant(user.id):
         return jsonify({"msg": "Você já está nesta sala"}), 409
 
     room.participants.append(user)
     db.session.commit()
+    lobby_snapshot.refresh_room(room.id)
 
     return jsonify({
         "msg": f"Usuário {user.username} entrou na sala {room.room_code}"
-    })
\ No newline at end of file
+    })
+
+@api.route('/rooms/<string:room_code>/story', methods=['GET'])
+def get_room_story(room_code):
+    room = GameRoom.query.filter_by(room_code=room_code.upper()).first()
+
+    if not room:
+        return jsonify({"msg": "Sala não encontrada"}), 404
+
+    # Só leitura: final_story_text é gravado no fim do jogo (src/persistence.py)
+    if room.status != 'LOBBY' or room.final_story_text is None:
+        # Jogo em andamento ou texto ainda não gravado: monta a partir dos trechos
+        story = story_text(room)
+    else:
+        story = room.final_story_text
+
+    return jsonify({
+        "room_code": room.room_code,
+        "status": room.status,
+        "story": story
+    })
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        "llm": llm_scheduler.metrics(),
+        "room_timers": room_timers.metrics(),
+        "room_actors": room_actors.metrics(),
+        "passwords": password_hasher.metrics(),
+        "user_cache": user_cache.metrics(),
+        "persistence": persistence.metrics(),
+        "matchmaking": matchmaking.metrics(),
+        "reaper": reaper.metrics(),
+        "snapshots": room_snapshots.metrics()
+    })
@@ -0,0 +1,128 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(SERVER_DIR, 'bench', 'results')
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+# Amostragem do processo do servidor via /proc (Linux), sem depender do psutil.
+# O servidor de desenvolvimento roda com reloader, então somamos a árvore de processos.
+
+def _children(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+def process_tree(pid):
+    pids = [pid]
+    index = 0
+    while index < len(pids):
+        pids.extend(_children(pids[index]))
+        index += 1
+    return pids
+
+def sample_process(pid):
+    # Retorna (rss em bytes, tempo de CPU em segundos) somados na árvore do pid
+    rss = 0
+    cpu = 0.0
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{child}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return rss, cpu
+
+def sample_servers(pids):
+    rss = 0
+    cpu = 0.0
+    for pid in pids:
+        pid_rss, pid_cpu = sample_process(pid)
+        rss += pid_rss
+        cpu += pid_cpu
+    return rss, cpu
+
+
+def percentiles(samples):
+    if not samples:
+        return {'count': 0, 'p50': None, 'p99': None, 'max': None, 'avg': None}
+
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'p50': round(ordered[len(ordered) // 2] * 1000, 2),
+        'p99': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+        'avg': round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+def spawn_server(port=5000, env=None, args=None):
+    # Sobe o run.py com o stub de LLM, a não ser que env diga outra coisa
+    server_env = dict(os.environ)
+    server_env.setdefault('MAKEASTORY_LLM_PROVIDER', 'stub')
+    server_env['MAKEASTORY_PORT'] = str(port)
+    server_env.update(env or {})
+
+    process = subprocess.Popen(
+        args or [sys.executable, 'run.py'],
+        cwd=SERVER_DIR,
+        env=server_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return process
+
+def wait_for_server(url, timeout=30):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'{url}/api/rooms', timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+    }
+
+def write_result(name, result, output=None):
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{name}-{stamp}.json')
+
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+    return output
@@ -0,0 +1,136 @@
+'''
+Idle sockets held by one server process: Flask-SocketIO vs the asyncio server
+
+For each --mode (threading, eventlet, gevent, asgi) starts serve.py with one
+process, opens --sockets python-socketio clients on /r that stay idle, and
+reports connections/sec, server RSS per socket and the time to answer a
+request while they are connected. Then it runs a short bench/loadtest.py with
+a slow stub LLM (--llm-latency), so hundreds of LLM calls are in flight at once.
+
+    ulimit -n 65536
+    python bench/idle_sockets.py --sockets 20000 --modes threading asgi
+
+Requires: requests, python-socketio[asyncio_client]
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import requests
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import environment, percentiles, sample_servers, spawn_server, wait_for_server, write_result
+from loadtest import guest_token, parse_args as loadtest_args, run_loadtest
+
+
+async def hold_sockets(url, tokens, count, concurrency):
+    clients = []
+    errors = []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def connect(index):
+        async with limit:
+            client = socketio.AsyncClient(reconnection=False)
+            try:
+                await client.connect(url, namespaces=['/r'], auth={'token': tokens[index % len(tokens)]},
+                                     transports=['websocket'])
+                clients.append(client)
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.monotonic()
+    await asyncio.gather(*[connect(index) for index in range(count)])
+    return clients, errors, time.monotonic() - started
+
+def probe(url, samples=20):
+    # Tempo de resposta do REST com os sockets conectados
+    times = []
+    for _ in range(samples):
+        started = time.monotonic()
+        requests.get(f'{url}/api/rooms', timeout=30)
+        times.append(time.monotonic() - started)
+    return percentiles(times)
+
+async def run_mode(mode, args, loadtest_argv):
+    port = args.port
+    url = f'http://localhost:{port}'
+    server = spawn_server(port, env={
+        'MAKEASTORY_STUB_LATENCY': f'fixed:{args.llm_latency}',
+    }, args=[sys.executable, 'serve.py', '--async-mode', mode])
+
+    try:
+        if not wait_for_server(url, timeout=60):
+            raise RuntimeError(f'servidor {url} não respondeu ({mode})')
+
+        tokens = [guest_token(url, f'idle{mode[:3]}{os.getpid()}n{index}') for index in range(args.tokens)]
+        baseline = sample_servers([server.pid])
+
+        clients, errors, elapsed = await hold_sockets(url, tokens, args.sockets, args.connect_concurrency)
+        await asyncio.sleep(2)
+        held = sample_servers([server.pid])
+        latency = await asyncio.to_thread(probe, url)
+
+        loadtest = await run_loadtest(loadtest_args(loadtest_argv + ['--url', url, '--server-pid', str(server.pid)]))
+
+        for client in clients:
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+
+        return {
+            'sockets': len(clients),
+            'connect_errors': len(errors),
+            'error_samples': errors[:10],
+            'connections_per_sec': round(len(clients) / elapsed, 2) if elapsed else 0,
+            'rss_baseline_mb': round(baseline[0] / 2**20, 2),
+            'rss_held_mb': round(held[0] / 2**20, 2),
+            'rss_per_socket_kb': round((held[0] - baseline[0]) / max(1, len(clients)) / 1024, 2),
+            'rest_latency_ms': latency,
+            'loadtest': {
+                'rounds_per_sec': loadtest['rounds_per_sec'],
+                'events_per_sec': loadtest['events_per_sec'],
+                'llm_max_concurrency': (loadtest['server_metrics'] or {}).get('llm', {}).get('max_concurrency'),
+                'round_ended_to_new_story_part': loadtest['latency_ms']['round_ended_to_new_story_part'],
+                'errors': loadtest['errors'],
+            },
+        }
+
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sockets parados e chamadas da IA em andamento por processo')
+    parser.add_argument('--modes', nargs='+', default=['threading', 'asgi'])
+    parser.add_argument('--sockets', type=int, default=5000)
+    parser.add_argument('--tokens', type=int, default=50, help='convidados usados pelos sockets parados')
+    parser.add_argument('--connect-concurrency', type=int, default=200)
+    parser.add_argument('--llm-latency', type=float, default=5.0, help='latência do stub, em segundos')
+    parser.add_argument('--port', type=int, default=5300)
+    parser.add_argument('--output', help='arquivo JSON de saída')
+    args, loadtest_argv = parser.parse_known_args()
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = asyncio.run(run_mode(mode, args, loadtest_argv))
+        print(f"{mode}: {results[mode]['sockets']} sockets, {results[mode]['rss_per_socket_kb']} KiB/socket, "
+              f"{results[mode]['loadtest']['rounds_per_sec']} rounds/s")
+
+    result = {
+        'benchmark': 'idle_sockets',
+        'environment': environment(),
+        'config': {'sockets': args.sockets, 'llm_latency': args.llm_latency},
+        'modes': results,
+    }
+    path = write_result('idle_sockets', result, args.output)
+    print(f'Resultado salvo em {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+Development server (run.py) vs production launcher (serve.py)
+
+Runs bench/loadtest.py against:
+
+  1. run.py: Werkzeug dev server, debug and reloader on
+  2. serve.py with the async mode in --async-mode (auto picks eventlet or
+     gevent if installed), one process
+  3. serve.py --workers N behind its sticky proxy, only with --redis
+     (the workers share rooms and events through Redis)
+
+and reports connections/sec while the rooms join and client events/sec
+(start_game + story_snippet acks) while they play, plus the loadtest latencies.
+
+    python bench/launcher.py --rooms 200 --players 5 --rounds 5
+    python bench/launcher.py --workers 4 --redis redis://localhost:6379/0
+
+Requires: requests, python-socketio[asyncio_client]
+'''
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import environment, spawn_server, wait_for_server, write_result
+from loadtest import parse_args as loadtest_args, run_loadtest
+from multiworker import clear_store
+
+
+def run_scenario(port, loadtest_argv, env=None, args=None):
+    server = spawn_server(port, env=env, args=args)
+    url = f'http://localhost:{port}'
+
+    try:
+        if not wait_for_server(url, timeout=60):
+            raise RuntimeError(f'servidor {url} não respondeu')
+
+        return asyncio.run(run_loadtest(loadtest_args(loadtest_argv + [
+            '--url', url,
+            '--server-pid', str(server.pid),
+        ])))
+
+    finally:
+        server.terminate()
+        server.wait()
+
+def summary(result):
+    return {
+        'connections': result['connections'],
+        'connections_per_sec': result['connections_per_sec'],
+        'events_per_sec': result['events_per_sec'],
+        'rounds_per_sec': result['rounds_per_sec'],
+        'ack_story_snippet_p99_ms': result['latency_ms']['ack_story_snippet']['p99'],
+        'errors': result['errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de desenvolvimento vs serve.py')
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--async-mode', default='auto', help='modo do serve.py (auto, eventlet, gevent, threading)')
+    parser.add_argument('--workers', type=int, default=4, help='workers do cenário com vários processos')
+    parser.add_argument('--redis', help='URL do Redis; sem ela o cenário com vários workers não roda')
+    parser.add_argument('--output', help='arquivo JSON de saída')
+    args, loadtest_argv = parser.parse_known_args()
+
+    serve = [sys.executable, 'serve.py', '--async-mode', args.async_mode]
+
+    scenarios = {}
+    scenarios['dev_server'] = run_scenario(args.port, loadtest_argv, {'MAKEASTORY_DEBUG': '1'})
+    scenarios['serve'] = run_scenario(args.port, loadtest_argv, args=serve + ['--workers', '1'])
+
+    if args.redis:
+        clear_store(args.redis)
+        scenarios['serve_workers'] = run_scenario(args.port, loadtest_argv, {
+            'MAKEASTORY_STATE_STORE': args.redis,
+            'MAKEASTORY_MESSAGE_QUEUE': args.redis,
+        }, args=serve + ['--workers', str(args.workers)])
+
+    result = {
+        'benchmark': 'launcher',
+        'environment': environment(),
+        'async_mode': args.async_mode,
+        'workers': args.workers if args.redis else 1,
+        'summary': {name: summary(scenario) for name, scenario in scenarios.items()},
+        'scenarios': scenarios,
+    }
+
+    path = write_result('launcher', result, args.output)
+    for name, scenario in result['summary'].items():
+        print(f"{name}: {scenario['connections_per_sec']} conexões/s, "
+              f"{scenario['events_per_sec']} eventos/s, {scenario['rounds_per_sec']} rounds/s")
+    print(f'Resultado salvo em {path}')
+
+
+if __name__ == '__main__':
+    main()
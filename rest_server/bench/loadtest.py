@@ -0,0 +1,288 @@
+'''
+Load test of the game server with simulated players
+
+Each simulated room has one registered host (creates the room through
+POST /api/rooms) and guests (POST /auth/guest_login). Every player connects a
+python-socketio client to /r and plays join_room -> start_game ->
+story_snippet for --rounds rounds.
+
+Run the server with the stub LLM (MAKEASTORY_LLM_PROVIDER=stub), or let this
+script start it with --spawn:
+
+    python bench/loadtest.py --spawn --rooms 200 --players 5 --rounds 5
+
+Requires: requests, python-socketio[asyncio_client]
+
+The result is written as JSON to bench/results/ (or --output), so runs can
+be compared to track regressions.
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+import requests
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import (
+    environment, percentiles, sample_servers, spawn_server, wait_for_server, write_result
+)
+
+
+class Stats:
+    def __init__(self):
+        self.acks = {'join_room': [], 'start_game': [], 'story_snippet': []}
+        self.round_to_story = []
+        self.first_chunk = []
+        self.rounds = 0
+        self.connected = 0
+        self.errors = []
+
+    def error(self, where, e):
+        self.errors.append(f'{where}: {e}')
+
+
+def _post(url, path, payload, token=None):
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    r = requests.post(f'{url}{path}', json=payload, headers=headers, timeout=30)
+    r.raise_for_status()
+    return r.json()
+
+def create_host_room(url, name):
+    password = uuid.uuid4().hex
+    _post(url, '/auth/register', {'username': name, 'email': f'{name}@loadtest.local', 'password': password})
+    token = _post(url, '/auth/login', {'username': name, 'password': password})['access_token']
+    room = _post(url, '/api/rooms', {}, token)['room']
+    return token, room['room_id']
+
+def guest_token(url, name):
+    return _post(url, '/auth/guest_login', {'username': name})['access_token']
+
+
+async def timed_call(client, stats, event, data=None):
+    started = time.monotonic()
+    ack = await client.call(event, data, namespace='/r', timeout=60)
+    stats.acks[event].append(time.monotonic() - started)
+
+    if isinstance(ack, dict) and ack.get('status') == 'error':
+        stats.error(event, ack.get('msg'))
+    return ack
+
+
+async def play_room(args, run_id, index, stats, ready, go):
+    url = args.url
+    names = [f'lt{run_id}r{index}p{p}' for p in range(args.players)]
+
+    try:
+        host_token, room_id = await asyncio.to_thread(create_host_room, url, names[0])
+        tokens = [host_token] + [await asyncio.to_thread(guest_token, url, name) for name in names[1:]]
+    except Exception as e:
+        stats.error('http', e)
+        ready.release()
+        return
+
+    clients = []
+    done = asyncio.Event()
+    round_ended_at = {}
+
+    def make_handlers(client, observer):
+        async def on_round_started(data):
+            # A sala segue para a rodada seguinte enquanto os clientes desconectam
+            if done.is_set() or data.get('round', 0) > args.rounds:
+                return
+            asyncio.create_task(
+                timed_call(client, stats, 'story_snippet', {'snippet': f'snippet {data.get("round")} {uuid.uuid4().hex[:8]}'})
+            )
+
+        client.on('round_started', on_round_started, namespace='/r')
+
+        if not observer:
+            return
+
+        async def on_round_ended(data):
+            round_ended_at['t'] = time.monotonic()
+            round_ended_at['chunk'] = None
+
+        async def on_story_chunk(data):
+            if round_ended_at.get('t') and round_ended_at.get('chunk') is None:
+                round_ended_at['chunk'] = time.monotonic()
+                stats.first_chunk.append(round_ended_at['chunk'] - round_ended_at['t'])
+
+        async def on_new_story_part(data):
+            if round_ended_at.get('t'):
+                stats.round_to_story.append(time.monotonic() - round_ended_at['t'])
+            stats.rounds += 1
+            if data.get('round', 0) >= args.rounds:
+                done.set()
+
+        client.on('round_ended', on_round_ended, namespace='/r')
+        client.on('story_chunk', on_story_chunk, namespace='/r')
+        client.on('new_story_part', on_new_story_part, namespace='/r')
+
+    try:
+        for position, token in enumerate(tokens):
+            # Com vários workers, os jogadores da mesma sala se espalham entre eles
+            socket_url = args.socket_urls[(index + position) % len(args.socket_urls)]
+            client = socketio.AsyncClient(reconnection=False)
+            make_handlers(client, observer=position == 0)
+            await client.connect(socket_url, namespaces=['/r'], auth={'token': token}, transports=['websocket'])
+            clients.append(client)
+            stats.connected += 1
+            await timed_call(client, stats, 'join_room', {'room_id': room_id})
+    except Exception as e:
+        stats.error('connect', e)
+
+    ready.release()
+    await go.wait()
+
+    try:
+        if clients:
+            await timed_call(clients[0], stats, 'start_game')
+            await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        stats.error('rounds', f'sala {room_id} não terminou as rodadas a tempo')
+    except Exception as e:
+        stats.error('play', e)
+
+    for client in clients:
+        try:
+            await client.disconnect()
+        except Exception:
+            pass
+
+
+async def run_loadtest(args):
+    run_id = uuid.uuid4().hex[:6]
+    stats = Stats()
+
+    ready = asyncio.Semaphore(0)
+    go = asyncio.Event()
+    connect_limit = asyncio.Semaphore(args.connect_concurrency)
+
+    async def limited(index):
+        async with connect_limit:
+            room_ready = asyncio.Semaphore(0)
+            task = asyncio.create_task(play_room(args, run_id, index, stats, room_ready, go))
+            await room_ready.acquire()
+        ready.release()
+        await task
+
+    baseline = sample_servers(args.server_pids) if args.server_pids else None
+
+    setup_started = time.monotonic()
+    tasks = [asyncio.create_task(limited(index)) for index in range(args.rooms)]
+    for _ in range(args.rooms):
+        await ready.acquire()
+    setup_time = time.monotonic() - setup_started
+
+    joined = sample_servers(args.server_pids) if args.server_pids else None
+
+    started = time.monotonic()
+    go.set()
+    await asyncio.gather(*tasks)
+    duration = time.monotonic() - started
+
+    finished = sample_servers(args.server_pids) if args.server_pids else None
+
+    server = None
+    if baseline:
+        server = {
+            'rss_baseline_mb': round(baseline[0] / 2**20, 2),
+            'rss_joined_mb': round(joined[0] / 2**20, 2),
+            'rss_end_mb': round(finished[0] / 2**20, 2),
+            'memory_per_room_kb': round((joined[0] - baseline[0]) / args.rooms / 1024, 2),
+            'cpu_seconds': round(finished[1] - joined[1], 2),
+            'cpu_percent': round((finished[1] - joined[1]) / duration * 100, 1),
+        }
+
+    try:
+        server_metrics = requests.get(f'{args.url}/api/metrics', timeout=5).json()
+    except Exception:
+        server_metrics = None
+
+    return {
+        'benchmark': 'loadtest',
+        'config': {
+            'url': args.url,
+            'socket_urls': args.socket_urls,
+            'rooms': args.rooms,
+            'players': args.players,
+            'rounds': args.rounds,
+        },
+        'environment': environment(),
+        'setup_seconds': round(setup_time, 2),
+        'connections': stats.connected,
+        'connections_per_sec': round(stats.connected / setup_time, 2) if setup_time else 0,
+        'duration_seconds': round(duration, 2),
+        'rounds_completed': stats.rounds,
+        'rounds_per_sec': round(stats.rounds / duration, 2) if duration else 0,
+        'events_per_sec': round((len(stats.acks['start_game']) + len(stats.acks['story_snippet'])) / duration, 2)
+            if duration else 0,
+        'latency_ms': {
+            'ack_join_room': percentiles(stats.acks['join_room']),
+            'ack_start_game': percentiles(stats.acks['start_game']),
+            'ack_story_snippet': percentiles(stats.acks['story_snippet']),
+            'round_ended_to_first_chunk': percentiles(stats.first_chunk),
+            'round_ended_to_new_story_part': percentiles(stats.round_to_story),
+        },
+        'server': server,
+        'server_metrics': server_metrics,
+        'errors': len(stats.errors),
+        'error_samples': stats.errors[:20],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do makeAStory')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--socket-urls', nargs='+', help='URLs dos workers socket.io (padrão: --url)')
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--players', type=int, default=5, help='jogadores por sala (máx MAX_ROOM_SIZE)')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=300, help='tempo máximo para cada sala terminar')
+    parser.add_argument('--connect-concurrency', type=int, default=20, help='salas conectando ao mesmo tempo')
+    parser.add_argument('--server-pid', type=int, nargs='+', dest='server_pids',
+                        help='pid(s) do servidor, para medir memória e CPU')
+    parser.add_argument('--spawn', action='store_true', help='sobe o servidor com o stub de LLM')
+    parser.add_argument('--output', help='arquivo JSON de saída')
+
+    args = parser.parse_args(argv)
+    args.socket_urls = args.socket_urls or [args.url]
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    server = None
+    if args.spawn:
+        port = int(args.url.rsplit(':', 1)[1])
+        server = spawn_server(port)
+        args.server_pids = [server.pid]
+        if not wait_for_server(args.url):
+            server.terminate()
+            sys.exit('servidor não respondeu')
+
+    try:
+        result = asyncio.run(run_loadtest(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    path = write_result('loadtest', result, args.output)
+    print(f"{result['rounds_per_sec']} rounds/s, "
+          f"round_ended->new_story_part p99 {result['latency_ms']['round_ended_to_new_story_part']['p99']} ms, "
+          f"{result['errors']} erros")
+    print(f'Resultado salvo em {path}')
+
+    # Nenhuma rodada completa: os eventos não chegaram aos clientes, a execução não mede nada
+    if result['rounds_completed'] == 0:
+        sys.exit('nenhuma sala completou uma rodada')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+Single process vs several worker processes sharing room state
+
+Runs bench/loadtest.py twice against the stub LLM:
+
+  1. one server process with the in-memory room store
+  2. --workers processes on consecutive ports, all using the Redis room store
+     (MAKEASTORY_STATE_STORE) and the Socket.IO message queue
+     (MAKEASTORY_MESSAGE_QUEUE). Players of the same room are spread across
+     the workers, so every round crosses processes.
+
+Any server that speaks the Redis protocol works (redis-server, KeyDB, ...):
+
+    redis-server --port 6379 &
+    python bench/multiworker.py --workers 4 --rooms 200
+
+Requires: requests, redis, python-socketio[asyncio_client]
+'''
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import environment, spawn_server, wait_for_server, write_result
+from loadtest import parse_args as loadtest_args, run_loadtest
+
+
+def clear_store(redis_url):
+    import redis
+
+    client = redis.Redis.from_url(redis_url)
+    keys = list(client.scan_iter('mas:*'))
+    if keys:
+        client.delete(*keys)
+
+def run_scenario(workers, base_port, loadtest_argv, env):
+    servers = [spawn_server(base_port + i, env=env) for i in range(workers)]
+    urls = [f'http://localhost:{base_port + i}' for i in range(workers)]
+
+    try:
+        for url in urls:
+            if not wait_for_server(url):
+                raise RuntimeError(f'servidor {url} não respondeu')
+
+        args = loadtest_args(loadtest_argv + [
+            '--url', urls[0],
+            '--socket-urls', *urls,
+            '--server-pid', *[str(server.pid) for server in servers],
+        ])
+        return asyncio.run(run_loadtest(args))
+
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark com vários workers')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--base-port', type=int, default=5100)
+    parser.add_argument('--redis', default='redis://localhost:6379/0')
+    parser.add_argument('--output', help='arquivo JSON de saída')
+    args, loadtest_argv = parser.parse_known_args()
+
+    single = run_scenario(1, args.base_port, loadtest_argv, {'MAKEASTORY_STATE_STORE': 'memory'})
+
+    clear_store(args.redis)
+    multi = run_scenario(args.workers, args.base_port, loadtest_argv, {
+        'MAKEASTORY_STATE_STORE': args.redis,
+        'MAKEASTORY_MESSAGE_QUEUE': args.redis,
+    })
+
+    result = {
+        'benchmark': 'multiworker',
+        'environment': environment(),
+        'workers': args.workers,
+        'single_process': single,
+        'multi_worker': multi,
+        'speedup_rounds_per_sec': round(multi['rounds_per_sec'] / single['rounds_per_sec'], 2)
+            if single['rounds_per_sec'] else None,
+    }
+
+    path = write_result('multiworker', result, args.output)
+    print(f"1 processo: {single['rounds_per_sec']} rounds/s, "
+          f"{args.workers} workers: {multi['rounds_per_sec']} rounds/s")
+    print(f'Resultado salvo em {path}')
+
+
+if __name__ == '__main__':
+    main()
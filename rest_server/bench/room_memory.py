@@ -0,0 +1,142 @@
+'''
+Memory per active room: nested dicts vs the Room/Member model
+
+Builds --rooms rooms with --players members and plays N rounds in each
+(snippets of MAX_SNIPPET_SIZE characters, AI responses of --story-chars),
+measuring the bytes allocated per room with tracemalloc:
+
+  dicts   the previous layout: room_members dict of dicts, 'history' with
+          the snippets keyed by username and 'history_parsed' with every
+          prompt and response as message dicts
+  model   src/room/model.py: __slots__ objects, snippets stored once per
+          Round, prompts built on demand
+
+Context compaction is left out on purpose, so both layouts keep every
+round (in the server, compaction drops the folded rounds of the model).
+
+    python bench/room_memory.py --rooms 500 --rounds 10 100
+
+No dependencies besides the standard library.
+'''
+import argparse
+import gc
+import os
+import random
+import string
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import environment, write_result
+from src.data import RoomState, MAX_SNIPPET_SIZE, GPT_ENTRY_PROMPT, GPT_SNIPPETS_TEMPLATE
+from src.room.model import Room, Member, Round
+
+
+def _text(rng, size):
+    # Texto novo a cada chamada, como chegaria pela rede
+    return ''.join(rng.choices(string.ascii_letters + ' ', k=size))
+
+
+def build_dicts(room_id, players, rounds, story_chars, rng):
+    room = {
+        'room_id': room_id,
+        'room_name': f'R{room_id:05d}',
+        'room_state': RoomState.WAITING,
+        'room_members': {},
+        'pending': 0,
+        'history': [],
+        'history_parsed': [{'role': 'developer', 'content': GPT_ENTRY_PROMPT}],
+        'summary': '',
+        'compacting': False,
+        'current_round': 0
+    }
+    for user_id in range(players):
+        room['room_members'][user_id] = {'user_id': user_id, 'username': f'player{room_id}_{user_id}', 'submitted': False, 'snippet': ''}
+
+    for number in range(1, rounds + 1):
+        room['current_round'] = number
+        registry = {'round': number, 'snippets': {}}
+        snippets = ''
+        for member in room['room_members'].values():
+            member['snippet'] = _text(rng, MAX_SNIPPET_SIZE)
+            member['submitted'] = True
+            registry['snippets'][member['username']] = member['snippet']
+            snippets += f"- {member['username']}: {member['snippet']}\n"
+
+        room['history'].append(registry)
+        room['history_parsed'].append({'role': 'user', 'content': GPT_SNIPPETS_TEMPLATE.substitute(cround=number, snippets=snippets)})
+        room['history_parsed'].append({'role': 'assistant', 'content': _text(rng, story_chars)})
+
+    return room
+
+
+def build_model(room_id, players, rounds, story_chars, rng):
+    room = Room(room_id, f'R{room_id:05d}')
+    for user_id in range(players):
+        room.members[user_id] = Member(user_id, f'player{room_id}_{user_id}')
+
+    for number in range(1, rounds + 1):
+        room.current_round = number
+        for member in room.members.values():
+            member.snippet = _text(rng, MAX_SNIPPET_SIZE)
+            member.submitted = True
+
+        round_ = Round(number, tuple((member.username, member.snippet) for member in room.members.values()))
+        round_.story = _text(rng, story_chars)
+        room.rounds.append(round_)
+
+    return room
+
+
+def measure(build, rooms, players, rounds, story_chars, seed):
+    rng = random.Random(seed)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    kept = [build(room_id, players, rounds, story_chars, rng) for room_id in range(rooms)]
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del kept
+    return (after - before) / rooms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memória por sala: dicts vs modelo')
+    parser.add_argument('--rooms', type=int, default=500)
+    parser.add_argument('--players', type=int, default=5)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--story-chars', type=int, default=800)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='arquivo JSON de saída')
+    args = parser.parse_args()
+
+    results = []
+    for rounds in args.rounds:
+        dicts = measure(build_dicts, args.rooms, args.players, rounds, args.story_chars, args.seed)
+        model = measure(build_model, args.rooms, args.players, rounds, args.story_chars, args.seed)
+        results.append({
+            'rounds': rounds,
+            'dicts_bytes_per_room': round(dicts),
+            'model_bytes_per_room': round(model),
+            'saved_percent': round((1 - model / dicts) * 100, 1),
+        })
+        print(f'{rounds:4} rodadas: dicts {dicts / 1024:8.1f} KiB/sala, modelo {model / 1024:8.1f} KiB/sala '
+              f'({results[-1]["saved_percent"]}% menos)')
+
+    result = {
+        'benchmark': 'room_memory',
+        'environment': environment(),
+        'config': {'rooms': args.rooms, 'players': args.players, 'story_chars': args.story_chars},
+        'results': results,
+    }
+    print(f"Resultado salvo em {write_result('room_memory', result, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
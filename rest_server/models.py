@@ -3,6 +3,8 @@ from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 
+from src.passwords import password_hasher
+
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 
@@ -10,7 +12,9 @@ bcrypt = Bcrypt()
 game_participants = db.Table('game_participants',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
     db.Column('game_room_id', db.Integer, db.ForeignKey('game_room.id'), primary_key=True),
-    db.Column('joined_at', db.DateTime, default=lambda: datetime.now(timezone.utc))
+    db.Column('joined_at', db.DateTime, default=lambda: datetime.now(timezone.utc)),
+    # A chave primária é (user_id, game_room_id); este índice atende as buscas por sala
+    db.Index('ix_game_participants_room_user', 'game_room_id', 'user_id')
 )
 
 class User(db.Model):
@@ -30,7 +34,8 @@ class User(db.Model):
     last_login = db.Column(db.DateTime, nullable=True)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
 
-    segments = db.relationship('StorySegment', back_populates='author', lazy=True, cascade="all, delete-orphan")
+    # Sem delete-orphan: quando um convidado é removido os trechos dele ficam na história (user_id vira NULL)
+    segments = db.relationship('StorySegment', back_populates='author', lazy=True)
     game_rooms = db.relationship('GameRoom', secondary=game_participants, 
                                  back_populates='participants', lazy='dynamic')
     
@@ -39,16 +44,23 @@ class User(db.Model):
         self.email = email
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username} ({self.email})>'
 
 class GameRoom(db.Model):
     __tablename__ = 'game_room'
+    __table_args__ = (
+        # Lista do lobby: salas em LOBBY ordenadas por criação
+        db.Index('ix_game_room_status_created_at', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -57,6 +69,7 @@ class GameRoom(db.Model):
     status = db.Column(db.String(20), default='LOBBY', nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     final_story_text = db.Column(db.Text, nullable=True)
+    games = db.Column(db.Integer, default=0, nullable=False)   # jogos iniciados; o atual é o de número games
 
     participants = db.relationship('User', secondary=game_participants, 
                                    back_populates='game_rooms', lazy='dynamic')
@@ -64,6 +77,15 @@ class GameRoom(db.Model):
     segments = db.relationship('StorySegment', back_populates='game_room', 
                                lazy='dynamic', cascade="all, delete-orphan")
 
+    def has_participant(self, user_id):
+        # EXISTS no índice de game_participants, sem carregar a lista de participantes
+        return db.session.query(
+            db.exists().where(
+                game_participants.c.game_room_id == self.id,
+                game_participants.c.user_id == user_id
+            )
+        ).scalar()
+
     def __repr__(self):
         return f'<GameRoom {self.room_code} ({self.status})>'
 
@@ -73,13 +95,26 @@ class StorySegment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text_content = db.Column(db.Text, nullable=False)
     round_number = db.Column(db.Integer, nullable=False)
+    game = db.Column(db.Integer, default=1, nullable=False)    # GameRoom.games quando o trecho foi escrito
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False, default='snippet')   # 'snippet' (jogador) ou 'ai'
+    author_name = db.Column(db.String(80), nullable=True)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     author = db.relationship('User', back_populates='segments')
 
     game_room_id = db.Column(db.Integer, db.ForeignKey('game_room.id'), nullable=False)
     game_room = db.relationship('GameRoom', back_populates='segments')
 
     def __repr__(self):
-        return f'<Segment (Round {self.round_number}) by {self.author.username}>'
\ No newline at end of file
+        return f'<Segment (Round {self.round_number}) by {self.author_name or self.kind}>'
+
+class CodeSequence(db.Model):
+    __tablename__ = 'code_sequence'
+
+    name = db.Column(db.String(32), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CodeSequence {self.name} ({self.next_value})>'
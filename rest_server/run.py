@@ -1,6 +1,8 @@
 from src.main import create_app
 from models import db
+from src.migrations import upgrade
 import logging
+import os
 
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
@@ -8,5 +10,6 @@ if __name__ == "__main__":
     app, socketio = create_app()
     with app.app_context():
         db.create_all()
+        upgrade()
 
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=int(os.getenv('MAKEASTORY_PORT', 5000)), debug=app.debug)
\ No newline at end of file
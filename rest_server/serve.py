@@ -0,0 +1,275 @@
+'''
+Entrada de produção do servidor
+
+    python serve.py                                   # 1 processo, porta 5000
+    python serve.py --workers 4 --async-mode eventlet  # 4 processos atrás do proxy
+    python serve.py --async-mode asgi                  # servidor asyncio (src/aio) no uvicorn
+
+Sem debug nem reloader (MAKEASTORY_DEBUG=1 liga de novo). Com --workers N > 1
+este processo vira um proxy TCP na --port e sobe N workers nas portas
+seguintes. Cada cliente vai sempre para o mesmo worker (hash do IP), que é o
+que o Socket.IO precisa para o long-polling. Os workers compartilham o estado
+das salas e os eventos por MAKEASTORY_STATE_STORE e MAKEASTORY_MESSAGE_QUEUE
+(ex: redis://localhost:6379/0), que são obrigatórios nesse caso.
+
+SIGTERM / Ctrl+C: o proxy para de aceitar conexões e cada worker espera as
+rodadas que estão com a IA terminarem (até --drain-timeout) antes de sair,
+gravando o que falta no DB e no snapshot das salas.
+'''
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import zlib
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ASYNC_MODES = ('auto', 'eventlet', 'gevent', 'threading', 'asgi')
+
+
+def resolve_async_mode(mode):
+    if mode != 'auto':
+        return mode
+
+    for candidate in ('eventlet', 'gevent'):
+        try:
+            __import__(candidate)
+            return candidate
+        except ImportError:
+            continue
+    return 'threading'
+
+def patch(mode):
+    # Tem que vir antes de importar o app (socket, threading, time, ...)
+    if mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def migrate(app=None):
+    from src.main import create_flask_app
+    from src.migrations import upgrade
+    from models import db
+
+    if app is None:
+        app = create_flask_app()
+    with app.app_context():
+        db.create_all()
+        upgrade()
+
+def run_asgi(args):
+    import uvicorn
+    from src.aio.server import create_asgi_app
+
+    if args.migrate:
+        migrate()
+
+    # SIGTERM: o uvicorn fecha as conexões e o shutdown do app espera as rodadas
+    uvicorn.run(
+        create_asgi_app(args.drain_timeout),
+        host=args.host,
+        port=args.port,
+        log_level='warning',
+        lifespan='on',
+        timeout_graceful_shutdown=args.drain_timeout
+    )
+
+def run_worker(args):
+    mode = resolve_async_mode(args.async_mode)
+    patch(mode)
+    os.environ.setdefault('MAKEASTORY_DEBUG', '0')
+
+    if mode == 'asgi':
+        run_asgi(args)
+        return
+
+    os.environ['MAKEASTORY_ASYNC_MODE'] = mode
+
+    from src.main import create_app
+    from src.log import logger
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    app, socketio = create_app()
+    if args.migrate:
+        migrate(app)
+    room_ns = app.extensions['room_ns']
+
+    if not os.getenv('JWT_SECRET_KEY') or not os.getenv('MAKEASTORY_SOCKETIO_APP_KEY'):
+        logger.warning('[SERVE] JWT_SECRET_KEY ou MAKEASTORY_SOCKETIO_APP_KEY não definidos, usando chaves padrão')
+
+    def shutdown(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        logger.info(f'[SERVE] Encerrando worker {os.getpid()}, esperando as rodadas em andamento...')
+        left = room_ns.drain(args.drain_timeout)
+        if left:
+            logger.warning(f'[SERVE] {left} rodadas ainda esperavam a IA após {args.drain_timeout}s')
+
+        # SystemExit roda os atexit (fila de escrita do DB, snapshot das salas)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logger.info(f'[SERVE] Worker {os.getpid()} ({mode}) na porta {args.port}, debug={app.debug}')
+    socketio.run(
+        app,
+        host=args.host,
+        port=args.port,
+        debug=app.debug,
+        use_reloader=False,
+        log_output=app.debug,
+        allow_unsafe_werkzeug=mode == 'threading'   # o modo threading só tem o servidor do Werkzeug
+    )
+
+
+class StickyProxy:
+    # Proxy TCP na frente dos workers: mesmo IP, mesmo worker
+
+    def __init__(self, args, ports):
+        self.args = args
+        self.ports = ports
+        self.workers = [None] * len(ports)
+        self.stopping = False
+        self.connections = set()
+
+    def spawn(self, index):
+        # Repassa as opções para o worker; a porta é a dele
+        argv = [
+            sys.executable, os.path.abspath(__file__), '--worker',
+            '--host', '127.0.0.1',
+            '--port', str(self.ports[index]),
+            '--async-mode', self.args.async_mode,
+            '--drain-timeout', str(self.args.drain_timeout),
+        ]
+        self.workers[index] = subprocess.Popen(argv, cwd=SERVER_DIR)
+
+    def pick(self, host):
+        return self.ports[zlib.crc32(host.encode()) % len(self.ports)]
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, client_reader, client_writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            peer = client_writer.get_extra_info('peername')
+            port = self.pick(peer[0] if peer else '')
+
+            # Um worker reiniciando demora um pouco para voltar a aceitar conexões
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    worker_reader, worker_writer = await asyncio.open_connection('127.0.0.1', port)
+                    break
+                except OSError:
+                    if self.stopping or time.monotonic() > deadline:
+                        client_writer.close()
+                        return
+                    await asyncio.sleep(0.2)
+
+            await asyncio.gather(
+                self._pipe(client_reader, worker_writer),
+                self._pipe(worker_reader, client_writer)
+            )
+        finally:
+            self.connections.discard(task)
+
+    async def supervise(self):
+        while not self.stopping:
+            for index, worker in enumerate(self.workers):
+                if worker.poll() is not None and not self.stopping:
+                    print(f'[SERVE] Worker da porta {self.ports[index]} saiu ({worker.returncode}), reiniciando', file=sys.stderr)
+                    self.spawn(index)
+            await asyncio.sleep(1)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+
+        for index in range(len(self.ports)):
+            self.spawn(index)
+
+        server = await asyncio.start_server(self.handle, self.args.host, self.args.port, backlog=1024)
+        supervisor = asyncio.create_task(self.supervise())
+        print(f'[SERVE] Proxy em {self.args.host}:{self.args.port} -> workers {self.ports}', file=sys.stderr)
+
+        await stop.wait()
+
+        # Para de aceitar conexões, e os workers terminam as rodadas antes de sair
+        self.stopping = True
+        server.close()
+        supervisor.cancel()
+        for worker in self.workers:
+            if worker.poll() is None:
+                worker.send_signal(signal.SIGTERM)
+
+        deadline = time.monotonic() + self.args.drain_timeout + 10
+        while any(worker.poll() is None for worker in self.workers) and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        for worker in self.workers:
+            if worker.poll() is None:
+                worker.kill()
+
+        for task in list(self.connections):
+            task.cancel()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor de produção do makeAStory')
+    parser.add_argument('--host', default=os.getenv('MAKEASTORY_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('MAKEASTORY_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('MAKEASTORY_WORKERS', 1)),
+                        help='processos (mais de 1 exige MAKEASTORY_STATE_STORE e MAKEASTORY_MESSAGE_QUEUE)')
+    parser.add_argument('--async-mode', choices=ASYNC_MODES, default=os.getenv('MAKEASTORY_ASYNC_MODE') or 'auto',
+                        help='auto = eventlet, gevent ou threading, o primeiro instalado; '
+                             'asgi = servidor asyncio (src/aio) no uvicorn')
+    parser.add_argument('--drain-timeout', type=float, default=float(os.getenv('MAKEASTORY_DRAIN_TIMEOUT', 60)),
+                        help='tempo máximo esperando as rodadas em andamento ao encerrar')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--migrate', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.worker or args.workers <= 1:
+        args.migrate = args.migrate or not args.worker
+        run_worker(args)
+        return
+
+    if os.getenv('MAKEASTORY_STATE_STORE', 'memory') == 'memory' or not os.getenv('MAKEASTORY_MESSAGE_QUEUE'):
+        sys.exit('--workers > 1 precisa de MAKEASTORY_STATE_STORE e MAKEASTORY_MESSAGE_QUEUE (ex: redis://localhost:6379/0)')
+
+    # Tabelas e migrações uma vez só, antes dos workers
+    if subprocess.run([sys.executable, '-c', 'import serve; serve.migrate()'], cwd=SERVER_DIR).returncode:
+        sys.exit('falha ao criar/migrar o banco de dados')
+
+    ports = [args.port + 1 + index for index in range(args.workers)]
+    asyncio.run(StickyProxy(args, ports).run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from models import User, GameRoom, StorySegment
+from src.data import DATABASE_URL
+from src.database import engine_options, sqlite_pragmas
+
+
+# Banco do servidor asyncio
+#
+# Mesma URI e mesmo perfil de src/database.py, com o driver async equivalente
+# (sqlite -> aiosqlite, postgresql -> asyncpg, mysql -> aiomysql). As leituras
+# dos handlers (entrada na sala, usuários de tokens antigos) usam estas
+# sessões; as escritas continuam em lote no src/persistence.py, numa thread.
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+_engine = None
+_sessions = None
+
+
+def async_url(uri):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'Banco sem driver async conhecido: {backend}')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def configure_async_database():
+    global _engine, _sessions
+
+    uri = os.getenv('MAKEASTORY_DATABASE_URL', DATABASE_URL)
+    profile = os.getenv('MAKEASTORY_DB_PROFILE', 'tuned')
+    url = async_url(uri)
+
+    _engine = create_async_engine(url, **engine_options(url, profile))
+    _sessions = async_sessionmaker(_engine, expire_on_commit=False)
+
+    in_memory = url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+    pragmas = [] if in_memory or url.get_backend_name() != 'sqlite' else sqlite_pragmas(profile)
+    if pragmas:
+        @event.listens_for(_engine.sync_engine, 'connect')
+        def _on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return _engine
+
+
+async def dispose():
+    if _engine is not None:
+        await _engine.dispose()
+
+
+async def load_user(user_id):
+    async with _sessions() as session:
+        return await session.get(User, user_id)
+
+async def load_room(room_id):
+    # (GameRoom, trechos do jogo atual em ordem) ou (None, []) se a sala não existe.
+    # Os trechos só são lidos para salas IN_PROGRESS (ver rebuild_room)
+    async with _sessions() as session:
+        game_room_db = await session.get(GameRoom, room_id)
+        if game_room_db is None or game_room_db.status != 'IN_PROGRESS':
+            return game_room_db, []
+
+        segments = await session.scalars(
+            select(StorySegment).filter_by(
+                game_room_id=room_id, game=game_room_db.games
+            ).order_by(
+                StorySegment.id
+            )
+        )
+        return game_room_db, list(segments)
@@ -0,0 +1,60 @@
+import asyncio
+
+import socketio
+
+from src.data import LOBBY_TICK
+from src.lobby.lobby import LOBBY_CHANNEL
+from src.lobby.snapshot import lobby_snapshot
+
+from src.log import logger
+
+
+# Namespace / do servidor asyncio, com os mesmos eventos do LobbyNS.
+# A lista vem do lobby_snapshot; quando ela expira, a releitura do DB
+# (síncrona, Flask-SQLAlchemy) vai para uma thread e não trava o loop.
+
+
+class AsyncLobbyNS(socketio.AsyncNamespace):
+    def __init__(self, namespace, app):
+        super().__init__(namespace)
+        self.app = app
+
+    def _in_app(self, fn):
+        with self.app.app_context():
+            return fn()
+
+    async def on_connect(self, sid, environ, auth=None):
+        await self.enter_room(sid, LOBBY_CHANNEL)
+        self.server.start_background_task(self._send_rooms, sid)
+
+    async def _send_rooms(self, sid):
+        try:
+            seq, rooms_info = await asyncio.to_thread(self._in_app, lobby_snapshot.socket_view)
+        except Exception as e:
+            logger.error(f"Erro ao buscar salas do lobby: {e}")
+            seq, rooms_info = None, []
+
+        await self.emit('rooms_info', {'rooms': rooms_info, 'seq': seq}, to=sid)
+
+    async def on_resync(self, sid, data=None):
+        seq = data.get('seq') if isinstance(data, dict) else None
+
+        batches = lobby_snapshot.since(seq) if isinstance(seq, int) else None
+        if batches is not None:
+            return {'status': 'ok', 'mode': 'delta', 'batches': batches}
+
+        seq, rooms_info = await asyncio.to_thread(self._in_app, lobby_snapshot.socket_view)
+        return {'status': 'ok', 'mode': 'snapshot', 'seq': seq, 'rooms': rooms_info}
+
+    async def broadcast_deltas(self):
+        while True:
+            await self.server.sleep(LOBBY_TICK)
+
+            try:
+                batch = await asyncio.to_thread(self._in_app, lobby_snapshot.flush)
+            except Exception as e:
+                logger.error(f"Erro ao gerar deltas do lobby: {e}")
+                continue
+
+            if batch:
+                await self.emit('lobby_delta', batch, to=LOBBY_CHANNEL)
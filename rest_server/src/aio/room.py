@@ -0,0 +1,533 @@
+import asyncio
+import json
+import time
+import weakref
+
+import socketio
+from socketio.exceptions import ConnectionRefusedError
+from flask_jwt_extended import decode_token
+
+from src.data import (
+    RoomState, MAX_ROOM_SIZE, MAX_SNIPPET_SIZE, GPT_THEME_PROMPT, STREAM_STORY, STORY_CHUNK_INTERVAL,
+    ROUND_TIMEOUT, READING_TIME
+)
+
+from src.aio.database import load_user, load_room
+from src.llm.gpt import submit_round_async, stream_round_async
+from src.llm.context import build_prompt, compact_history_async
+from src.llm.scheduler import llm_scheduler, PRIORITY_STORY, PRIORITY_BACKGROUND
+from src.media.jamendo import search_track_async
+from src.store.store import room_store
+from src.room.timer import room_timers
+from src.user_cache import user_cache
+from src.persistence import persistence
+from src.lobby.matchmaking import matchmaking
+from src.room.model import Room, Member, Round
+from src.room.snapshots import room_snapshots
+from src.story import rebuild_room
+from src.store.base import (
+    JOIN_FULL, JOIN_NO_ROOM,
+    SUBMIT_ROUND_ENDED, SUBMIT_NOT_SNIPPETING, SUBMIT_NOT_MEMBER, SUBMIT_NO_ROOM
+)
+
+from src.log import logger
+
+
+# Namespace /r do servidor asyncio (src/aio/server.py)
+#
+# Mesmos eventos e acks do RoomNS (src/room/room.py, schema em src/data.py),
+# com os handlers em corrotinas: a IA, o Jamendo e as leituras do DB são
+# await, e um socket parado não ocupa thread nenhuma.
+#
+# Uma mudança de estado faz várias chamadas ao room_store com await no meio
+# (com o Redis cada uma vai para uma thread), então outro evento da mesma sala
+# poderia rodar entre elas. Cada sala tem um asyncio.Lock, e tudo que muda a
+# sala (entrada, saída, início do jogo, snippet, prazos, resposta da IA) roda
+# com ele, um evento de cada vez: o papel dos workers de src/room/actors.py no
+# servidor síncrono. A chamada da IA roda fora do lock.
+# Os timers e a fila da IA rodam em threads e agendam as corrotinas no loop.
+
+
+def _payload(data, event):
+    # Os clientes mandam dict ou JSON em string; None se não der para ler
+    if not isinstance(data, str):
+        return data if isinstance(data, dict) else {}
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        logger.error(f"Erro ao decodificar JSON do {event}: {data}")
+        return None
+
+async def _store(fn, *args):
+    # O store em memória é só dict e roda no loop; o Redis bloqueia e vai para uma thread
+    if room_store.name == 'memory':
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+class AsyncRoomNS(socketio.AsyncNamespace):
+    def __init__(self, namespace, app):
+        super().__init__(namespace)
+        self.app = app
+        self.loop = None
+        self._rounds = set()   # tarefas de process_round em andamento
+        self._locks = weakref.WeakValueDictionary()   # room_id -> asyncio.Lock, enquanto alguém usa
+
+    def bind(self, loop):
+        self.loop = loop
+
+    def _call_soon(self, fn, *args):
+        # Chamado pelos timers e pela fila da IA, de fora do loop
+        asyncio.run_coroutine_threadsafe(fn(*args), self.loop)
+
+    def _start(self, fn, *args):
+        return self.server.start_background_task(fn, *args)
+
+    def _lock(self, room_id):
+        lock = self._locks.get(room_id)
+        if lock is None:
+            lock = self._locks[room_id] = asyncio.Lock()
+        return lock
+
+    async def _locked(self, room_id, fn, *args):
+        # Roda fn(*args) com o lock da sala, depois dos eventos que já estão esperando
+        async with self._lock(room_id):
+            return await fn(*args)
+
+    async def _auth_info(self, sid):
+        session = await self.get_session(sid)
+        user_id = session.get('user_id')
+        if not user_id:
+            logger.warning("Tentativa de ação no RoomNS sem user_id na sessão")
+        return user_id, session.get('username', 'Convidado'), session.get('is_guest', False)
+
+    async def on_connect(self, sid, environ, auth=None):
+        token = auth.get('token') if auth else None
+
+        if not token:
+            logger.warning(f"Conexão rejeitada no RoomNS (sem token) do sid: {sid}")
+            raise ConnectionRefusedError('unauthorized - no token')
+
+        try:
+            with self.app.app_context():
+                token_data = decode_token(token)
+            user_id = int(token_data['sub'])
+
+            if user_cache.is_deleted(user_id):
+                raise ConnectionRefusedError('unauthorized - user not found')
+
+            if 'username' in token_data:
+                username = token_data['username']
+                is_guest = token_data.get('is_guest', False)
+            else:
+                # Token emitido antes das claims: busca no cache (ou no DB)
+                user = await user_cache.get_async(user_id, load_user)
+                if not user:
+                    raise ConnectionRefusedError('unauthorized - user not found')
+                username = user['username']
+                is_guest = user['is_guest']
+
+        except ConnectionRefusedError:
+            raise
+        except Exception as e:
+            logger.warning(f"Conexão com token inválido: {e}")
+            raise ConnectionRefusedError('unauthorized - invalid token')
+
+        await self.save_session(sid, {'user_id': user_id, 'username': username, 'is_guest': is_guest})
+        logger.info(f'[ROOM] Conexão autenticada para {username} (ID: {user_id}) (sid: {sid})')
+
+        # O cliente só pode receber eventos depois que o connect termina
+        self._start(self._confirm, sid)
+
+    async def _confirm(self, sid):
+        await self.emit('connect_ack', to=sid)
+        await self.emit('connect_confirm', {'sid': sid}, to=sid)
+
+    async def on_join_room(self, sid, data):
+        user_id, username, _ = await self._auth_info(sid)
+        if not user_id:
+            return {'status': 'error', 'msg': 'usuário não autenticado'}
+
+        room_data = _payload(data, 'on_join_room')
+        if room_data is None:
+            return {'status': 'error', 'msg': 'Dados de sala inválidos'}
+
+        room_id_from_client = room_data.get('room_id')
+        if room_id_from_client is None:
+            logger.warning(f"on_join_room recebido sem 'room_id': {room_data}")
+            return {'status': 'error', 'msg': 'room_id não fornecido'}
+
+        try:
+            room_id = int(room_id_from_client)
+        except (ValueError, TypeError):
+            logger.warning(f"room_id inválido recebido: {room_id_from_client}")
+            return {'status': 'error', 'msg': 'room_id deve ser um número'}
+
+        return await self._join(sid, user_id, username, room_id)
+
+    async def on_quick_join(self, sid, data=None):
+        user_id, username, _ = await self._auth_info(sid)
+        if not user_id:
+            return {'status': 'error', 'msg': 'usuário não autenticado'}
+
+        if await _store(room_store.room_of, user_id) is not None:
+            return {'status': 'error', 'msg': 'Você já está em uma sala'}
+
+        # claim() e release() também seguram/liberam o lugar no room_store
+        room_id = matchmaking.held_room(user_id) or await _store(matchmaking.claim, user_id)
+        if room_id is None:
+            logger.info(f'[ROOM] Quick join de {username} (ID: {user_id}) sem sala disponível')
+            return {'status': 'error', 'msg': 'no room'}
+
+        logger.info(f'[ROOM {room_id}] Quick join de {username} (ID: {user_id})')
+        return await self._join(sid, user_id, username, room_id)
+
+    async def _join(self, sid, user_id, username, room_id):
+        ack = await self._locked(room_id, self._add_to_room, sid, user_id, username, room_id)
+        if ack['status'] != 'ok' and matchmaking.held_room(user_id) == room_id:
+            await _store(matchmaking.release, user_id)
+            room_timers.cancel(('quick_join', user_id))
+        return ack
+
+    async def _add_to_room(self, sid, user_id, username, room_id):
+        if not await _store(room_store.__contains__, room_id):
+            game_room_db, segments = await load_room(room_id)
+
+            if not game_room_db:
+                logger.warning(f'[ROOM] User {username} (ID: {user_id}) pediu para entrar na sala {room_id} (inexistente no DB)')
+                return {'status': 'error', 'msg': "A sala não existe.", 'room_id': room_id}
+
+            logger.info(f"[ROOM {room_id}] Sala '{game_room_db.room_code}' está inativa. Ativando e hidratando cache...")
+            room = None
+            if game_room_db.status == 'IN_PROGRESS':
+                room = room_snapshots.restore(room_id) or rebuild_room(game_room_db, segments)
+            if room is None:
+                await _store(room_store.create, Room(game_room_db.id, game_room_db.room_code, game=game_room_db.games))
+            elif await _store(room_store.create, room):
+                logger.info(f"[ROOM {room_id}] Jogo retomado na rodada {room.current_round} ({len(room.rounds)} rodadas no contexto)")
+
+        joined = await _store(room_store.add_member, room_id, user_id, Member(user_id, username), MAX_ROOM_SIZE)
+
+        if joined == JOIN_FULL:
+            logger.warning(f'[ROOM] User {username} (ID: {user_id}) tentou entrar na sala {room_id} (cheia no cache)')
+            return {'status': 'error', 'msg': 'A sala está cheia', 'room_id': room_id}
+
+        if joined == JOIN_NO_ROOM:
+            logger.warning(f'[ROOM {room_id}] Sala removida enquanto {username} (ID: {user_id}) entrava')
+            return {'status': 'error', 'msg': 'Tente novamente', 'room_id': room_id}
+
+        logger.info(f'[ROOM {room_id}] User {username} (ID: {user_id}) entrou')
+        await _store(room_store.map_user, user_id, room_id)
+
+        room = await _store(room_store.get, room_id)
+        if room is not None:
+            matchmaking.set_room(room_id, len(room.members), room.room_state == RoomState.WAITING)
+        matchmaking.settle(user_id, room_id)
+        room_timers.cancel(('quick_join', user_id))
+
+        await self.enter_room(sid, room_id)
+        await self.emit('status_update', {'msg': f'{username} entrou na sala.'}, to=room_id, skip_sid=sid)
+
+        return {'status': 'ok', 'room_id': room_id}
+
+    async def on_disconnect(self, sid, *args):
+        user_id, username, is_guest = await self._auth_info(sid)
+
+        room_id = await _store(room_store.room_of, user_id) if user_id else None
+        if room_id is None:
+            logger.info(f"Disconnect de SID {sid} sem user_id mapeado.")
+            return
+
+        await self.leave_room(sid, room_id)
+        await self._locked(room_id, self._remove_from_room, user_id, username, room_id, is_guest)
+
+    async def _remove_from_room(self, user_id, username, room_id, is_guest):
+        remaining = await _store(room_store.remove_member, room_id, user_id)
+
+        if remaining is not None:
+            await self.emit('status_update', {'msg': f'{username} saiu.'}, to=room_id)
+            logger.info(f"User {username} (ID: {user_id}) removido da sala {room_id}")
+
+            if remaining:
+                room = await _store(room_store.get, room_id)
+                if room is not None:
+                    matchmaking.set_room(room_id, remaining, room.room_state == RoomState.WAITING)
+
+            if remaining == 0:
+                logger.info(f"[ROOM {room_id}] A sala está vazia. Removida do cache de memória.")
+                room_timers.cancel(room_id)
+                matchmaking.remove(room_id)
+
+                persistence.set_room_status(room_id, 'LOBBY')
+                persistence.finish_story(room_id)
+
+        if await _store(room_store.room_of, user_id) == room_id:
+            await _store(room_store.unmap_user, user_id)
+
+        if not is_guest:
+            return
+
+        logger.info(f"Convidado {username} (ID: {user_id}) desconectou. Remoção do banco de dados agendada.")
+        persistence.delete_guest(user_id)
+
+    async def on_start_game(self, sid, data=None):
+        user_id, username, _ = await self._auth_info(sid)
+
+        room_id = await _store(room_store.room_of, user_id) if user_id else None
+        if room_id is None:
+            logger.warning(f'[ROOM] User {username} tried to start a game but is not in a room')
+            return {'status': 'error', 'msg': 'not in room'}
+
+        return await self._locked(room_id, self._start_game, user_id, username, room_id)
+
+    async def _start_game(self, user_id, username, room_id):
+        room = await _store(room_store.get, room_id)
+        if room is None:
+            logger.warning(f'[ROOM] User {username} tried to start a game but is not in a room')
+            return {'status': 'error', 'msg': 'not in room'}
+
+        if room.room_state != RoomState.WAITING:
+            logger.warning(f'[ROOM {room_id}] User {username} tried to start a game but room state {room.room_state}')
+
+        logger.info(f'[ROOM {room_id}] User {username} started the game')
+
+        game = await _store(room_store.update, room_id, Room.next_game)
+        if game is None:
+            return {'status': 'error', 'msg': 'not in room'}
+
+        persistence.start_game(room_id, game)
+        matchmaking.remove(room_id)
+
+        triggerer = room.members.get(user_id)
+        await self.emit('game_started', {'triggerer': triggerer.username if triggerer else 'Sistema'}, to=room_id)
+        logger.info(f'[ROOM {room_id}] O jogo começou')
+        await self.start_round(room_id, 'game_start')
+
+    async def on_story_snippet(self, sid, data):
+        user_id, username, _ = await self._auth_info(sid)
+
+        room_id = await _store(room_store.room_of, user_id) if user_id else None
+        if room_id is None:
+            logger.warning(f'[ROOM] User {username} (ID: {user_id}) tentou enviar snippet mas não está em sala')
+            return {'status': 'error', 'msg': 'Você não está em uma sala'}
+
+        snippet_data = _payload(data, 'on_story_snippet')
+        if snippet_data is None:
+            return {'status': 'error', 'msg': 'Dados de snippet inválidos'}
+
+        snippet = snippet_data.get('snippet')
+        if not snippet:
+            return {'status': 'error', 'msg': 'Snippet não pode ser vazio'}
+
+        if len(snippet) > MAX_SNIPPET_SIZE:
+            logger.warning(f'[ROOM {room_id}] User {username} enviou snippet muito longo')
+            return {'status': 'error', 'msg': f'Snippet muito longo (max: {MAX_SNIPPET_SIZE})'}
+
+        return await self._locked(room_id, self._submit_snippet, user_id, username, room_id, snippet)
+
+    async def _submit_snippet(self, user_id, username, room_id, snippet):
+        submitted = await _store(room_store.submit_snippet, room_id, user_id, snippet)
+
+        if submitted == SUBMIT_NOT_SNIPPETING:
+            logger.warning(f'[ROOM {room_id}] User {username} tentou enviar snippet fora da hora de snippets')
+            return {'status': 'error', 'msg': 'Não é hora de enviar snippets'}
+
+        if submitted in (SUBMIT_NOT_MEMBER, SUBMIT_NO_ROOM):
+            logger.warning(f'[ROOM {room_id}] User {username} (ID: {user_id}) tentou enviar snippet mas não está na sala')
+            return {'status': 'error', 'msg': 'Você não está em uma sala'}
+
+        logger.info(f"[ROOM {room_id}] Snippet recebido de {username} (ID: {user_id})")
+
+        await self.emit('snippet_received', {'username': username}, to=room_id)
+
+        if submitted == SUBMIT_ROUND_ENDED:
+            await self.end_round(room_id, 'all_snippets_received')
+
+        return {'status': 'ok'}
+
+    async def start_round(self, room_id, trigger=None):
+        current_round = await _store(room_store.start_round, room_id)
+        if current_round is None:
+            logger.info(f'[ROOM {room_id}] Sala não está mais ativa, rodada não iniciada ({trigger})')
+            return
+
+        logger.info(f'[ROOM {room_id}] Room started the round {current_round} by trigger {trigger}')
+
+        room_timers.arm(room_id, ROUND_TIMEOUT, self._call_soon, self._locked, room_id, self._round_timeout, room_id, current_round)
+
+        await self.emit('round_started', {
+            'triggerer': trigger,
+            'round': current_round,
+            'timeout': ROUND_TIMEOUT
+        }, to=room_id)
+
+    async def _round_timeout(self, room_id, current_round):
+        if await _store(room_store.close_round, room_id, current_round):
+            await self.end_round(room_id, 'timeout')
+
+    async def end_round(self, room_id, trigger):
+        room_timers.cancel(room_id)
+        await _store(room_store.set_state, room_id, RoomState.RESPONSE)
+        room = await _store(room_store.get, room_id)
+        if room is None:
+            return
+
+        current_round = room.current_round
+        logger.info(f'[ROOM {room_id}] Room round {current_round} ended by trigger {trigger}')
+
+        # Copia agora: os membros mudam quando a próxima rodada começar
+        submitted = [(member.user_id, member.username, member.snippet) for member in room.members.values() if member.submitted]
+        if not submitted:
+            logger.info(f'[ROOM {room_id}] Nenhum snippet recebido, reiniciando a rodada')
+            await self.start_round(room_id, 'no_snippets')
+            return
+
+        round_ = Round(current_round, tuple((username, snippet) for _, username, snippet in submitted))
+        await _store(room_store.update, room_id, lambda room: room.rounds.append(round_))
+        persistence.append_segments(room_id, room.game, current_round, [{
+            'kind': 'snippet',
+            'user_id': user_id,
+            'author_name': username,
+            'text_content': snippet
+        } for user_id, username, snippet in submitted])
+
+        room = await _store(room_store.get, room_id)
+        if room is None:
+            return
+
+        await self.emit('round_ended', {'snippets': [
+            {'sender_username': username, 'snippet': snippet} for _, username, snippet in submitted
+        ]}, to=room_id)
+
+        task = self._start(self.process_round, room_id, room.game, current_round, build_prompt(room))
+        self._rounds.add(task)
+        task.add_done_callback(self._rounds.discard)
+
+    async def process_round(self, room_id, game, current_round, input_array):
+        try:
+            logger.info(f"[ROOM {room_id}] Enviando prompt para a IA...")
+            async with llm_scheduler.slot_async(room_id, PRIORITY_STORY):
+                if STREAM_STORY:
+                    ia_text_response = await self.stream_story(room_id, current_round, input_array)
+                else:
+                    ia_text_response = await submit_round_async(input_array)
+
+        except Exception as e:
+            logger.error(f"[ROOM {room_id}] Erro ao processar a rodada com a IA: {e}")
+            await self._locked(room_id, self.fail_round, room_id)
+            return
+
+        # A resposta volta para a sala com o lock, na vez dela
+        await self._locked(room_id, self.finish_round, room_id, game, current_round, ia_text_response)
+
+    async def finish_round(self, room_id, game, current_round, ia_text_response):
+        def add_story(room):
+            round_ = room.find_round(current_round)
+            if round_ is not None:
+                round_.story = ia_text_response
+
+        await _store(room_store.update, room_id, add_story)
+
+        logger.info(f"[ROOM {room_id}] Resposta da IA recebida.")
+        logger.info(ia_text_response)
+
+        await self.emit('new_story_part', {
+            'round': current_round,
+            'text': ia_text_response
+        }, to=room_id)
+
+        if READING_TIME > 0:
+            await _store(room_store.set_state, room_id, RoomState.READING)
+            room_timers.arm(room_id, READING_TIME, self._call_soon, self._locked, room_id, self.start_round, room_id, 'reading_timeout')
+        else:
+            await self.start_round(room_id, 'ia_finished')
+
+        # Pós-processamento fora do caminho crítico: a próxima rodada já começou
+        persistence.append_segments(room_id, game, current_round, [{
+            'kind': 'ai',
+            'user_id': None,
+            'author_name': None,
+            'text_content': ia_text_response
+        }])
+        self._start(self.fetch_story_media, room_id, current_round, ia_text_response)
+        self._start(compact_history_async, room_id)
+
+    async def fail_round(self, room_id):
+        await self.emit('error', {'msg': 'Erro na IA, a rodada será reiniciada.'}, to=room_id)
+        await self.start_round(room_id, 'ia_error')
+
+    async def drain(self, timeout):
+        # Encerramento: espera as rodadas com a IA. Retorna quantas ficaram sem resposta
+        if self._rounds:
+            await asyncio.wait(list(self._rounds), timeout=timeout)
+        return len(self._rounds)
+
+    def notify_llm_queue(self, room_id, position, eta):
+        self._call_soon(self.emit, 'llm_queue', {
+            'position': position,
+            'eta': eta
+        }, to=room_id)
+
+    async def stream_story(self, room_id, current_round, input_array):
+        # Repassa o texto da IA para a sala conforme chega, agrupando os pedaços
+        parts = []
+        buffer = ''
+        index = 0
+        last_emit = time.monotonic()
+
+        async for chunk in stream_round_async(input_array):
+            parts.append(chunk)
+            buffer += chunk
+
+            now = time.monotonic()
+            if now - last_emit >= STORY_CHUNK_INTERVAL:
+                await self.emit('story_chunk', {
+                    'round': current_round,
+                    'index': index,
+                    'text': buffer
+                }, to=room_id)
+                buffer = ''
+                index += 1
+                last_emit = now
+
+        if buffer:
+            await self.emit('story_chunk', {
+                'round': current_round,
+                'index': index,
+                'text': buffer
+            }, to=room_id)
+
+        return ''.join(parts)
+
+    async def fetch_story_media(self, room_id, current_round, ia_text_response):
+        theme = None
+        music_url = None
+
+        try:
+            theme_prompt = [
+                {'role': 'system', 'content': GPT_THEME_PROMPT},
+                {'role': 'user', 'content': ia_text_response}
+            ]
+            async with llm_scheduler.slot_async(room_id, PRIORITY_BACKGROUND):
+                tags_str = (await submit_round_async(theme_prompt)).strip().lower()
+            theme = tags_str.replace(',', ' ').replace('  ', ' ')
+            logger.info(f"[ROOM {room_id}] Temas extraídos: {theme}")
+
+        except Exception as e:
+            logger.warning(f"[ROOM {room_id}] Não foi possível extrair os temas: {e}")
+
+        if theme:
+            try:
+                music_url = await search_track_async(theme)
+                if music_url:
+                    logger.info(f"[ROOM {room_id}] URL de música do Jamendo encontrada: {music_url}")
+                else:
+                    logger.warning(f"[ROOM {room_id}] Nenhuma música encontrada no Jamendo para o tema: {theme}")
+            except Exception as e:
+                logger.error(f"[ROOM {room_id}] Erro ao chamar API do Jamendo: {e}")
+
+        await self.emit('story_media', {
+            'round': current_round,
+            'theme': theme,
+            'music_url': music_url
+        }, to=room_id)
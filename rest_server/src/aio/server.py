@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+import time
+
+import socketio
+from a2wsgi import WSGIMiddleware
+
+from src.main import create_flask_app
+from src.aio.database import configure_async_database, dispose
+from src.aio.lobby import AsyncLobbyNS
+from src.aio.room import AsyncRoomNS
+from src.llm.scheduler import llm_scheduler
+from src.room.timer import room_timers
+from src.persistence import persistence
+from src.reaper import reaper
+from src.room.snapshots import room_snapshots
+from src.data import ASYNC_LLM_MAX_CONCURRENCY, ASGI_REST_THREADS
+
+from src.log import logger
+
+
+# Servidor asyncio: socketio.AsyncServer em um app ASGI (uvicorn, hypercorn, ...)
+#
+#     python serve.py --async-mode asgi
+#     uvicorn --factory src.aio.server:create_asgi_app
+#
+# Os namespaces / e /r são os de src/aio, com os mesmos eventos do servidor
+# Flask-SocketIO. As rotas REST continuam no Flask, num pool de threads.
+# Os serviços síncronos (roda de timers, fila de escrita do DB, reaper,
+# snapshots) rodam em threads, como no modo threading do Flask-SocketIO.
+#
+# Pacotes a mais: uvicorn, a2wsgi, httpx e o driver async do banco (aiosqlite, asyncpg, ...)
+
+
+class _Threads:
+    # start_background_task/sleep do Flask-SocketIO, para os serviços síncronos
+
+    def start_background_task(self, target, *args, **kwargs):
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+def create_asgi_app(drain_timeout=None):
+    if drain_timeout is None:
+        drain_timeout = float(os.getenv('MAKEASTORY_DRAIN_TIMEOUT', 60))
+
+    app = create_flask_app()
+    configure_async_database()
+    llm_scheduler.max_concurrency = int(os.getenv('MAKEASTORY_LLM_CONCURRENCY', ASYNC_LLM_MAX_CONCURRENCY))
+
+    # Com mais de um processo, os eventos passam pelo Redis (ver serve.py)
+    queue = os.getenv('MAKEASTORY_MESSAGE_QUEUE')
+    sio = socketio.AsyncServer(
+        async_mode='asgi',
+        cors_allowed_origins='*',
+        client_manager=socketio.AsyncRedisManager(queue) if queue else None
+    )
+
+    room_ns = AsyncRoomNS('/r', app)
+    lobby_ns = AsyncLobbyNS('/', app)
+    sio.register_namespace(lobby_ns)
+    sio.register_namespace(room_ns)
+    llm_scheduler.on_queue_update(room_ns.notify_llm_queue)
+
+    threads = _Threads()
+
+    async def startup():
+        room_ns.bind(asyncio.get_running_loop())
+        room_timers.start(threads)
+        persistence.start(threads, app)
+        reaper.start(threads, app)
+        room_snapshots.start(threads)
+        sio.start_background_task(lobby_ns.broadcast_deltas)
+        logger.info(f'[ASGI] Servidor asyncio pronto (IA: até {llm_scheduler.max_concurrency} chamadas)')
+
+    async def shutdown():
+        logger.info('[ASGI] Encerrando, esperando as rodadas em andamento...')
+        left = await room_ns.drain(drain_timeout)
+        if left:
+            logger.warning(f'[ASGI] {left} rodadas ainda esperavam a IA após {drain_timeout}s')
+
+        await asyncio.to_thread(persistence.flush)
+        await dispose()
+
+    return socketio.ASGIApp(
+        sio,
+        other_asgi_app=WSGIMiddleware(app, workers=ASGI_REST_THREADS),
+        on_startup=startup,
+        on_shutdown=shutdown
+    )
@@ -2,10 +2,20 @@ import uuid
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from models import db, bcrypt, User
+from models import db, User
+from src.passwords import password_hasher, PasswordQueueFull
+from src.user_cache import user_cache
 
 auth_bp = Blueprint('auth_bp', __name__, url_prefix='/auth')
 
+def _access_token(user):
+    # username e is_guest vão no token, o socket não precisa consultar o DB ao conectar
+    user_cache.put(user)
+    return create_access_token(identity=str(user.id), additional_claims={
+        'username': user.username,
+        'is_guest': user.is_guest
+    })
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -23,7 +33,10 @@ def register():
         return jsonify({"msg": "Email já está em uso"}), 409
 
     new_user = User(username=username, email=email)
-    new_user.set_password(password)
+    try:
+        new_user.set_password(password)
+    except PasswordQueueFull:
+        return jsonify({"msg": "Servidor ocupado, tente novamente"}), 503
     
     db.session.add(new_user)
     db.session.commit()
@@ -48,10 +61,20 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and not user.is_guest and user.check_password(password):
+    try:
+        valid = user and not user.is_guest and user.check_password(password)
+
+        # Custo do bcrypt mudou desde que o hash foi gerado: refaz com a senha que acabou de ser verificada
+        if valid and user.password_needs_rehash():
+            user.set_password(password)
+            password_hasher.count_rehash()
+    except PasswordQueueFull:
+        return jsonify({"msg": "Servidor ocupado, tente novamente"}), 503
+
+    if valid:
         user.last_login = datetime.utcnow()
         db.session.commit()
-        access_token = create_access_token(identity=str(user.id))
+        access_token = _access_token(user)
         return jsonify(access_token=access_token)
 
     return jsonify({"msg": "Usuário ou senha inválidos"}), 401
@@ -84,7 +107,7 @@ def guest_login():
     db.session.commit()
     
     # Cria token de acesso para convidado
-    access_token = create_access_token(identity=str(user.id))
+    access_token = _access_token(user)
     return jsonify(access_token=access_token)
 
 @auth_bp.route('/me', methods=['GET'])
@@ -10,6 +10,24 @@ $snippets
 
 Now continue the story with this new snippets.''')
 
+GPT_SUMMARY_PROMPT = '''You are helping the game master of a collaborative storytelling game to remember the story. You will receive the current summary of the story and the rounds that happened after it. Rewrite the summary so it covers everything, keeping characters, places, open plot threads and ideas the players sent that were not used yet. Answer only with the new summary, at maximum 1500 characters long.'''
+
+GPT_SUMMARY_TEMPLATE = Template('''Current summary:
+
+$summary
+
+Rounds to add to the summary:
+
+$transcript''')
+
+GPT_THEME_PROMPT = (
+    "Sua tarefa é extrair o 'clima' ou 'sentimento' de um texto. "
+    "Forneça de 5 a 7 tags em inglês que descrevam o GÊNERO (ex: medieval fantasy, sci-fi) "
+    ",os instrumentos a serem utilizados na musica e a EMOÇÃO (ex: epic, battle, sad, mysterious, rainy), não os objetos. "
+    "EVITE tags de objetos literais como 'dragon', 'bard' ou 'sword'. "
+    "Responda apenas com as tags separadas por vírgula."
+)
+
 
 class RoomState(Enum):
     WAITING = 0
@@ -17,43 +35,12 @@ class RoomState(Enum):
     RESPONSE = 2
     READING = 4
 
-ROOMS_SAMPLE_STRUCTURE = {
-    0: {
-        'room_id': 0,
-        'room_name': 'Room Name',
-
-        'room_state': RoomState.WAITING,
-
-        'room_members': {
-                'someplayer1': {
-                    'user_id': str,
-                    'submitted': bool,
-                    'snippet': str
-                    
-                }
-            },
-
-        'pending': 99,
-        'timer': None,
-
-        'history': [
-            {
-                'round': 1,
-                'snippets': {
-                    'someplayer1': "Once upon a time there was a dragon",
-                    'someplayer2': "Once upon a time there was a princes",
-                    'someplayer3': "Once upon a time there was a thief"
-                    }
-            }
-        ],
-        'history_parsed': [],
-        'current_round': 1
-    }
-}
+# Active rooms: room_id -> Room (src/room/model.py). Round deadlines are kept by
+# src/room/timer.py and older rounds are folded into Room.summary by src/llm/context.py
 
 ROOMS = {}
 
-USER_ROOM_MAP = {}
+USER_ROOM_MAP = {}    # user_id -> room_id
 
 
 # Config
@@ -62,10 +49,157 @@ MAX_ROOM_SIZE = 5
 
 MAX_SNIPPET_SIZE = 100   # in characters
 
+ROOM_CODE_LENGTH = 6
+
+ROOM_CODE_BLOCK = 1000    # room code numbers reserved from the DB at once, per process
+
+ROOM_CODE_RETRIES = 5     # retries if a code is already taken (rooms created before the allocator)
+
+ROUND_TIMEOUT = 90        # in seconds, the round ends with the snippets already sent
+
+READING_TIME = 0          # in seconds, time to read the story before the next round (0 = start right away)
+
+TIMER_TICK = 0.25         # in seconds, resolution of the round deadlines
+
+TIMER_WHEEL_SLOTS = 1024
+
+LOBBY_SNAPSHOT_TTL = 5    # in seconds, max age of the cached lobby room list
+
+LOBBY_TICK = 0.5          # in seconds, lobby changes are sent together once per tick
+
+LOBBY_DELTA_HISTORY = 256 # lobby_delta batches kept for clients that fell behind
+
+QUICK_JOIN_HOLD = 15      # in seconds, a seat taken by POST /api/rooms/quick_join waits this long for join_room
+
+LOBBY_PAGE_SIZE = 50      # rooms per /api/rooms page by default
+
+LOBBY_PAGE_MAX = 200      # max limit accepted by /api/rooms
+
+ROOM_ACTOR_SHARDS = 4     # workers running room events, rooms are split among them by room_id (MAKEASTORY_ROOM_SHARDS)
+
+ROOM_ACTOR_QUEUE_LIMIT = 1000   # events waiting in one worker, more than that are rejected
+
+ROOM_ACTOR_TIMEOUT = 10   # in seconds, max time a player event waits for its room
+
+ASGI_REST_THREADS = 16    # threads running the Flask REST routes in the asyncio server
+
+STREAM_STORY = True
+
+CONTEXT_TOKEN_BUDGET = 4000   # in tokens, max size of the story prompt sent each round
+
+CONTEXT_KEEP_ROUNDS = 4       # rounds kept verbatim, older ones are summarized
+
+CONTEXT_FOLD_ROUNDS = 2       # min rounds folded into the summary at once
+
+CHARS_PER_TOKEN = 4           # estimate used to count tokens
+
+LLM_MAX_CONCURRENCY = 16          # LLM calls running at the same time (all rooms)
+
+ASYNC_LLM_MAX_CONCURRENCY = 256   # same, in the asyncio server (src/aio), where a waiting call holds no thread
+
+LLM_QUEUE_LIMIT = 2000            # calls waiting for a slot, more than that are rejected
+
+LLM_QUEUE_TIMEOUT = 60            # in seconds, max time a call waits for a slot
+
+LLM_QUEUE_NOTIFY_INTERVAL = 1.0   # in seconds, min time between llm_queue updates
+
+STORY_CHUNK_INTERVAL = 0.05   # in seconds, min time between story_chunk emits
+
+DATABASE_URL = 'sqlite:///game_data.db'   # MAKEASTORY_DATABASE_URL overrides it
+
+SQLITE_BUSY_TIMEOUT = 5       # in seconds, a writer waits this long for the lock before failing
+
+SQLITE_MMAP_SIZE = 256 * 2**20   # in bytes
+
+DB_POOL_SIZE = 10             # connections kept open (server databases, ex: Postgres)
+
+DB_MAX_OVERFLOW = 20          # extra connections opened under load
+
+DB_POOL_TIMEOUT = 30          # in seconds, max time waiting for a free connection
+
+DB_POOL_RECYCLE = 1800        # in seconds, connections older than this are reopened
+
+SNAPSHOT_PATH = 'room_snapshots.jsonl'   # MAKEASTORY_SNAPSHOT_PATH overrides it ('' turns snapshots off)
+
+SNAPSHOT_INTERVAL = 5         # in seconds, changed rooms are appended to the snapshot log once per interval
+
+SNAPSHOT_COMPACT_RATIO = 4    # the log is rewritten when it has this many lines per room it holds
+
+SNAPSHOT_COMPACT_MIN = 1000   # min lines before the log is rewritten
+
+SNAPSHOT_MAX_AGE = 86400      # in seconds, rooms not rejoined for this long are dropped at compaction
+
+WRITER_INTERVAL = 0.2         # in seconds, game-side DB writes are committed together once per interval
+
+WRITER_MAX_RETRIES = 5        # failed write batches are retried this many times, then dropped
+
+REAPER_INTERVAL = 60          # in seconds, time between reaper runs
+
+WORKER_TTL = 3 * REAPER_INTERVAL  # in seconds, a process that stops its heartbeat for this long is dead (its users are released)
+
+ROOM_IDLE_TTL = 3600          # in seconds, LOBBY rooms older than this that never had a story are deleted
+
+GUEST_TTL = 3600              # in seconds since the last login, guests not in a room are deleted
+
+REAPER_BATCH = 500            # rows deleted per transaction
+
+USER_CACHE_SIZE = 10000       # users kept in the in-process cache (LRU)
+
+USER_CACHE_TTL = 900          # in seconds, as long as an access token lives (deleted users stay marked too)
+
+BCRYPT_LOG_ROUNDS = 12        # bcrypt work factor for new hashes (MAKEASTORY_BCRYPT_ROUNDS)
+
+PASSWORD_WORKERS = 2          # processes hashing/checking passwords
+
+PASSWORD_QUEUE_LIMIT = 256    # upper bound on password jobs waiting for a worker (the real limit is what the workers can start within PASSWORD_QUEUE_TIMEOUT)
+
+PASSWORD_QUEUE_TIMEOUT = 2    # in seconds, a password job not started by then is dropped (503)
+
+BCRYPT_HASH_SECONDS = 0.25    # in seconds, estimated time of one hash at work factor 12 (doubles per extra round), until the workers measure it
+
 
 '''
 Custom Events Schema
 
+Lobby namespace (/)
+
+rooms_info: server -> client
+    Full list of LOBBY rooms, sent on connect
+
+    Params:
+        rooms: list of {room_id: int, room_name: str, members: int}
+        seq: int                 version of the list, lobby_delta batches continue from it
+
+lobby_delta: server -> client
+    Changes in the lobby since the previous batch, at most one batch per LOBBY_TICK.
+    Events carry the final state, so applying a batch twice is harmless.
+    Apply it if prev_seq <= your seq < seq, ignore it if seq <= your seq,
+    and send resync if prev_seq > your seq (you missed a batch)
+
+    Params:
+        prev_seq: int
+        seq: int
+        events: list of
+            {type: 'room_added', room: {room_id, room_name, members}}
+            {type: 'room_updated', room_id: int, members: int}
+            {type: 'room_removed', room_id: int}
+
+resync: client -> server
+    Client fell behind and asks for what it missed
+
+    Params:
+        seq: int                 last seq the client applied
+
+    Ack:
+        status: str
+            - ok
+        mode: str
+            - delta              batches: list of lobby_delta batches after seq
+            - snapshot           seq: int, rooms: same as rooms_info (history too old)
+
+
+Room namespace (/r)
+
 connect_ack: server -> client
     Acknowledgement that client connected successfully (since on_connect can't return a ack)
 
@@ -84,6 +218,19 @@ join_room: client -> server
             - special message    if user try to join a room that not exist
 
 
+quick_join: client -> server
+    Client asks to be placed in a room. The fullest WAITING room with a free
+    seat in this server is chosen, and the client joins it as in join_room
+
+    Ack:
+        status: str
+            - ok                 room_id: int
+            - error
+        msg: str (only set if status is error)
+            - no room            no WAITING room with a free seat, create one
+            - same messages as join_room
+
+
 start_game: client -> server
     One of the player clicked to start the game
 
@@ -109,6 +256,12 @@ round_started: server -> client
         triggerer: str
             - user_id          if a user have started the round
             - game_start       if it was triggered by game start event
+            - ia_finished      the AI finished the previous round
+            - reading_timeout  the reading time after the previous round is over
+            - ia_error         the previous round failed and is being restarted
+            - no_snippets      the previous round timed out with no snippets
+        round: int
+        timeout: int             seconds until the round ends with the snippets already sent
 
 
 story_snippet: client -> server
@@ -125,4 +278,42 @@ story_snippet: client -> server
             - not in room        user is not in a room
             - room not reading   room is not in reading state
             - size limit         snippet bigger than MAX_SNIPPET_SIZE
+
+
+story_chunk: server -> client
+    Partial AI text of the current round, sent while the LLM is still generating
+    (only when STREAM_STORY is enabled)
+
+    Params:
+        round: int
+        index: int               order of the chunk inside the round, starting at 0
+        text: str                new text since the previous chunk
+
+
+new_story_part: server -> client
+    Complete AI text of the round, always sent after the last story_chunk.
+    The next round starts right after it, media arrives later in story_media
+
+    Params:
+        round: int
+        text: str
+
+
+llm_queue: server -> client
+    The story of the round is waiting for a free LLM slot (sent when the room
+    enters the queue and periodically while it waits)
+
+    Params:
+        position: int            1 means next to be served
+        eta: float               estimated wait in seconds
+
+
+story_media: server -> client
+    Result of the round post-processing (theme extraction and music lookup),
+    sent some time after the new_story_part of the same round
+
+    Params:
+        round: int
+        theme: str | None
+        music_url: str | None
 '''
\ No newline at end of file
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+from src.data import (
+    DATABASE_URL, SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+)
+
+
+# Configuração do banco
+#
+# A URI vem de MAKEASTORY_DATABASE_URL (padrão: SQLite local). O perfil
+# (MAKEASTORY_DB_PROFILE) escolhe como o banco é usado:
+#   - tuned (padrão): SQLite em WAL, synchronous=NORMAL, busy_timeout e mmap;
+#     bancos de servidor (Postgres, ...) com o pool dimensionado em src/data.py
+#   - plain: o que o driver faz por padrão (serve de comparação nos benchmarks)
+
+PROFILES = ('tuned', 'plain')
+
+_sqlite_pragmas = []
+
+
+def sqlite_pragmas(profile):
+    if profile != 'tuned':
+        return []
+
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}',
+        f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}',
+    ]
+
+
+def engine_options(url, profile):
+    if profile != 'tuned':
+        return {}
+
+    if url.get_backend_name() == 'sqlite':
+        # Uma conexão por thread/greenlet; o lock de escrita é do próprio SQLite
+        return {
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT, 'check_same_thread': False},
+        }
+
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+
+
+def configure_database(app):
+    uri = os.getenv('MAKEASTORY_DATABASE_URL', DATABASE_URL)
+    profile = os.getenv('MAKEASTORY_DB_PROFILE', 'tuned')
+    if profile not in PROFILES:
+        raise ValueError(f'Perfil de banco desconhecido: {profile}')
+
+    url = make_url(uri)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url, profile)
+
+    # Banco em memória não tem WAL nem mmap
+    in_memory = url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+    _sqlite_pragmas[:] = [] if in_memory else sqlite_pragmas(profile)
+
+    return profile
+
+
+@event.listens_for(Engine, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    if not _sqlite_pragmas or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    for pragma in _sqlite_pragmas:
+        cursor.execute(pragma)
+    cursor.close()
@@ -0,0 +1,147 @@
+from src.data import (
+    GPT_SUMMARY_PROMPT, GPT_SUMMARY_TEMPLATE,
+    CONTEXT_TOKEN_BUDGET, CONTEXT_KEEP_ROUNDS, CONTEXT_FOLD_ROUNDS, CHARS_PER_TOKEN
+)
+from src.llm.gpt import submit_round, submit_round_async
+from src.llm.scheduler import llm_scheduler, PRIORITY_BACKGROUND
+from src.store.store import room_store
+
+from src.log import logger
+
+
+# Compactação do contexto da sala
+#
+# room.rounds guarda as rodadas ainda não resumidas; as mensagens para a IA
+# (prompt de entrada, user, assistant, ...) são montadas a partir delas.
+#
+# As rodadas mais antigas são resumidas em room.summary e removidas de
+# room.rounds, assim o prompt enviado para a IA fica limitado a
+# CONTEXT_TOKEN_BUDGET não importa quantas rodadas a sala jogue.
+
+
+def estimate_tokens(messages):
+    return sum(len(message['content']) // CHARS_PER_TOKEN + 4 for message in messages)
+
+def _summary_message(room):
+    if not room.summary:
+        return []
+
+    return [{
+        'role': 'developer',
+        'content': f"Summary of the story so far:\n\n{room.summary}"
+    }]
+
+def _head(room):
+    return room.messages(rounds=()) + _summary_message(room)
+
+def build_prompt(room):
+    head = _head(room)
+    recent = [round_.messages() for round_ in room.rounds]
+
+    # Enquanto o resumo não fica pronto, descarta as rodadas mais antigas,
+    # mas sempre mantém a última (as snippets da rodada atual)
+    budget = CONTEXT_TOKEN_BUDGET - estimate_tokens(head)
+    tokens = [estimate_tokens(messages) for messages in recent]
+    while len(recent) > 1 and sum(tokens) > budget:
+        recent.pop(0)
+        tokens.pop(0)
+
+    return head + [message for messages in recent for message in messages]
+
+def fold_point(room):
+    # Retorna quantas rodadas do começo de room.rounds devem ser resumidas (0 se nada)
+    tokens = [estimate_tokens(round_.messages()) for round_ in room.rounds]
+
+    keep = min(CONTEXT_KEEP_ROUNDS, len(tokens))
+    if keep == 0:
+        return 0
+
+    budget = CONTEXT_TOKEN_BUDGET - estimate_tokens(_head(room))
+    over_budget = False
+    while keep > 1 and sum(tokens[-keep:]) > budget:
+        keep -= 1
+        over_budget = True
+
+    # Resume em lotes para não gastar uma chamada extra da IA a cada rodada
+    if not over_budget and len(tokens) - keep < CONTEXT_FOLD_ROUNDS:
+        return 0
+
+    return len(tokens) - keep
+
+def _claim(room):
+    if room.compacting:
+        return False
+    room.compacting = True
+    return True
+
+def _release(room):
+    room.compacting = False
+
+def _claim_fold(room_id):
+    # Quantas rodadas resumir, já marcando a sala (0 se nada a fazer ou outra compactação rodando)
+    room = room_store.get(room_id)
+    if room is None or room.compacting:
+        return room, 0
+
+    count = fold_point(room)
+    if not count or not room_store.update(room_id, _claim):
+        return room, 0
+    return room, count
+
+def _summary_request(room, count):
+    transcript = '\n\n'.join(
+        f"[{message['role']}]\n{message['content']}" for round_ in room.rounds[:count] for message in round_.messages()
+    )
+
+    return [
+        {'role': 'developer', 'content': GPT_SUMMARY_PROMPT},
+        {'role': 'user', 'content': GPT_SUMMARY_TEMPLATE.substitute(
+            summary=room.summary or '-',
+            transcript=transcript
+        )}
+    ]
+
+def _apply_summary(room_id, count, summary):
+    # Só rodadas do fim são adicionadas enquanto o resumo é gerado,
+    # então as resumidas continuam no começo da lista
+    def apply(room):
+        room.summary = summary.strip()
+        del room.rounds[:count]
+
+    room_store.update(room_id, apply)
+
+    logger.info(f"[ROOM {room_id}] Contexto compactado: {count} rodadas resumidas")
+
+def compact_history(room_id):
+    room, count = _claim_fold(room_id)
+    if not count:
+        return
+
+    try:
+        with llm_scheduler.slot(room_id, PRIORITY_BACKGROUND):
+            summary = submit_round(_summary_request(room, count))
+
+        _apply_summary(room_id, count, summary)
+
+    except Exception as e:
+        logger.warning(f"[ROOM {room_id}] Não foi possível compactar o contexto: {e}")
+
+    finally:
+        room_store.update(room_id, _release)
+
+async def compact_history_async(room_id):
+    room, count = _claim_fold(room_id)
+    if not count:
+        return
+
+    try:
+        async with llm_scheduler.slot_async(room_id, PRIORITY_BACKGROUND):
+            summary = await submit_round_async(_summary_request(room, count))
+
+        _apply_summary(room_id, count, summary)
+
+    except Exception as e:
+        logger.warning(f"[ROOM {room_id}] Não foi possível compactar o contexto: {e}")
+
+    finally:
+        room_store.update(room_id, _release)
@@ -0,0 +1,69 @@
+from src.llm.provider import LLMProvider
+
+
+class OpenAIProvider(LLMProvider):
+    name = 'openai'
+
+    def __init__(self, api_key, model):
+        # Import aqui para que o stub rode sem o pacote openai instalado
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self.model = model
+        self._async_client = None
+
+    def submit(self, input_array):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=input_array
+        )
+
+        return response.choices[0].message.content
+
+    def stream(self, input_array):
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=input_array,
+            stream=True
+        )
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    @property
+    def async_client(self):
+        # Criado no primeiro uso, dentro do loop do servidor asyncio
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
+    async def submit_async(self, input_array):
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=input_array
+        )
+
+        return response.choices[0].message.content
+
+    async def stream_async(self, input_array):
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=input_array,
+            stream=True
+        )
+
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
@@ -0,0 +1,25 @@
+import asyncio
+
+
+class LLMProvider:
+    name = 'base'
+
+    def submit(self, input_array):
+        raise NotImplementedError
+
+    def stream(self, input_array):
+        # Provedores sem streaming entregam a resposta inteira de uma vez
+        yield self.submit(input_array)
+
+    # Versões para o servidor asyncio (src/aio). Sem uma implementação própria,
+    # a chamada síncrona roda em uma thread, fora do loop
+
+    async def submit_async(self, input_array):
+        return await asyncio.to_thread(self.submit, input_array)
+
+    async def stream_async(self, input_array):
+        yield await self.submit_async(input_array)
+
+
+class LLMProviderError(Exception):
+    pass
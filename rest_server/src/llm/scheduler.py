@@ -0,0 +1,262 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, asynccontextmanager
+
+from src.data import (
+    LLM_MAX_CONCURRENCY, LLM_QUEUE_LIMIT, LLM_QUEUE_TIMEOUT, LLM_QUEUE_NOTIFY_INTERVAL
+)
+
+from src.log import logger
+
+
+# Fila global das chamadas para a IA
+#
+# No máximo LLM_MAX_CONCURRENCY chamadas rodam ao mesmo tempo. As que sobram
+# esperam em uma fila por prioridade e, dentro de cada prioridade, as salas
+# são atendidas em rodízio, assim uma sala não passa na frente das outras.
+# O servidor asyncio (src/aio) usa a mesma fila com slot_async.
+
+PRIORITY_STORY = 0        # história da rodada, os jogadores estão esperando
+PRIORITY_BACKGROUND = 1   # temas, resumo do contexto, etc
+
+WAIT_SAMPLES = 1000
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+class _AsyncEvent:
+    # O threading.Event de quem espera no loop do asyncio; set() pode vir de qualquer thread
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+        self._set = False
+
+    def set(self):
+        self._set = True
+        self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+    def is_set(self):
+        return self._set
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._set
+
+
+class _Waiter:
+    __slots__ = ('room_id', 'priority', 'enqueued_at', 'event')
+
+    def __init__(self, room_id, priority, event):
+        self.room_id = room_id
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.event = event
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, queue_limit=LLM_QUEUE_LIMIT,
+                 queue_timeout=LLM_QUEUE_TIMEOUT, notify_interval=LLM_QUEUE_NOTIFY_INTERVAL):
+        self.max_concurrency = max_concurrency
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.notify_interval = notify_interval
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._depth = 0
+        # prioridade -> {room_id: deque de _Waiter}, a ordem do dict é o rodízio
+        self._queues = [OrderedDict(), OrderedDict()]
+
+        self._notify = None
+        self._last_notify = 0.0
+
+        self._service_avg = 1.0   # em segundos, média móvel do tempo de cada chamada
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._granted = 0
+        self._rejected = 0
+        self._timeouts = 0
+
+    def on_queue_update(self, callback):
+        # callback(room_id, position, eta) é chamado para as salas que estão na fila
+        self._notify = callback
+
+    @contextmanager
+    def slot(self, room_id, priority=PRIORITY_STORY):
+        self.acquire(room_id, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, room_id, priority=PRIORITY_STORY):
+        await self.acquire_async(room_id, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def acquire(self, room_id, priority=PRIORITY_STORY):
+        waiter = self._enqueue(room_id, priority, threading.Event)
+        if waiter is not None and not waiter.event.wait(self.queue_timeout):
+            self._give_up(waiter)
+
+    async def acquire_async(self, room_id, priority=PRIORITY_STORY):
+        waiter = self._enqueue(room_id, priority, _AsyncEvent)
+        if waiter is None:
+            return
+
+        try:
+            granted = await waiter.event.wait(self.queue_timeout)
+        except asyncio.CancelledError:
+            # Tarefa cancelada na fila: sai dela, ou devolve o slot se já tinha recebido
+            if not self._leave(waiter):
+                self.release()
+            raise
+
+        if not granted:
+            self._give_up(waiter)
+
+    def _enqueue(self, room_id, priority, event):
+        # None se o slot saiu na hora, senão o _Waiter que está na fila
+        with self._lock:
+            if self._active < self.max_concurrency and self._depth == 0:
+                self._active += 1
+                self._granted += 1
+                self._waits.append(0.0)
+                return None
+
+            if self._depth >= self.queue_limit:
+                self._rejected += 1
+                raise SchedulerBusy('fila da IA cheia')
+
+            waiter = _Waiter(room_id, priority, event())
+            self._queues[priority].setdefault(room_id, deque()).append(waiter)
+            self._depth += 1
+            position = self._position(room_id, priority)
+
+        self._emit(room_id, priority, position)
+        return waiter
+
+    def _leave(self, waiter):
+        # Tira o waiter da fila. False se o slot já tinha sido passado para ele
+        with self._lock:
+            if waiter.event.is_set():
+                return False
+
+            room_queue = self._queues[waiter.priority].get(waiter.room_id)
+            room_queue.remove(waiter)
+            if not room_queue:
+                del self._queues[waiter.priority][waiter.room_id]
+            self._depth -= 1
+            return True
+
+    def _give_up(self, waiter):
+        # Pode ter sido liberado entre o timeout e o lock
+        if not self._leave(waiter):
+            return
+
+        with self._lock:
+            self._timeouts += 1
+        raise SchedulerBusy('tempo de espera na fila da IA esgotado')
+
+    def release(self, elapsed=None):
+        with self._lock:
+            if elapsed is not None:
+                self._service_avg = 0.9 * self._service_avg + 0.1 * elapsed
+
+            waiter = self._next_waiter()
+            if waiter is None:
+                self._active -= 1
+                return
+
+            # O slot passa direto para o próximo da fila
+            self._waits.append(time.monotonic() - waiter.enqueued_at)
+            self._granted += 1
+            waiter.event.set()
+
+            now = time.monotonic()
+            if not self._notify or now - self._last_notify < self.notify_interval:
+                return
+            self._last_notify = now
+            positions = self._positions()
+
+        for room_id, position in positions.items():
+            self._emit(room_id, PRIORITY_STORY, position)
+
+    def _next_waiter(self):
+        for queue in self._queues:
+            if not queue:
+                continue
+
+            room_id, room_queue = next(iter(queue.items()))
+            waiter = room_queue.popleft()
+            if room_queue:
+                queue.move_to_end(room_id)
+            else:
+                del queue[room_id]
+
+            self._depth -= 1
+            return waiter
+
+        return None
+
+    def _position(self, room_id, priority):
+        # Posição aproximada: todos das prioridades maiores + uma volta do rodízio
+        ahead = sum(len(room_queue) for queue in self._queues[:priority] for room_queue in queue.values())
+        for index, queued_room in enumerate(self._queues[priority]):
+            if queued_room == room_id:
+                return ahead + index + len(self._queues[priority][room_id])
+        return ahead
+
+    def _positions(self):
+        story_queue = self._queues[PRIORITY_STORY]
+        return {room_id: index + 1 for index, room_id in enumerate(story_queue)}
+
+    def _emit(self, room_id, priority, position):
+        # Só avisa quem está esperando pela história, o resto é invisível para os jogadores
+        if not self._notify or priority != PRIORITY_STORY:
+            return
+
+        eta = position * self._service_avg / self.max_concurrency
+        try:
+            self._notify(room_id, position, round(eta, 1))
+        except Exception as e:
+            logger.warning(f"[ROOM {room_id}] Erro ao avisar posição na fila da IA: {e}")
+
+    def metrics(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                'active': self._active,
+                'max_concurrency': self.max_concurrency,
+                'queue_depth': self._depth,
+                'queue_depth_story': sum(len(q) for q in self._queues[PRIORITY_STORY].values()),
+                'queue_depth_background': sum(len(q) for q in self._queues[PRIORITY_BACKGROUND].values()),
+                'queued_rooms': len(self._queues[PRIORITY_STORY]),
+                'granted': self._granted,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'service_avg': round(self._service_avg, 3),
+                'wait_avg': round(sum(waits) / len(waits), 3) if waits else 0.0,
+                'wait_p50': round(waits[len(waits) // 2], 3) if waits else 0.0,
+                'wait_p99': round(waits[int(len(waits) * 0.99)], 3) if waits else 0.0,
+                'wait_max': round(waits[-1], 3) if waits else 0.0,
+            }
+
+
+llm_scheduler = LLMScheduler()
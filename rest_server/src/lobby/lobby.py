@@ -1,23 +1,52 @@
-from flask_socketio import Namespace, emit
-from models import GameRoom, db
+import os
+
+from flask_socketio import Namespace, emit, join_room
+
+from src.data import LOBBY_TICK
+from src.lobby.snapshot import lobby_snapshot
+
+from src.log import logger
+
+
+# Sala do socket.io com os clientes do lobby deste processo. Com message_queue,
+# cada processo manda os seus próprios deltas só para os seus clientes.
+LOBBY_CHANNEL = f'lobby:{os.getpid()}'
 
 
 class LobbyNS(Namespace):
     def on_connect(self):
+        join_room(LOBBY_CHANNEL)
 
         try:
-            db_rooms = GameRoom.query.filter_by(status='LOBBY').all()
-
-            rooms_info = [{
-                'room_id': room.id,
-                'room_name': room.room_code,
-                'members': len(room.participants.all())
-            } for room in db_rooms]
-
-            emit('rooms_info', {'rooms': rooms_info})
+            seq, rooms_info = lobby_snapshot.socket_view()
             
         except Exception as e:
             print(f"Erro ao buscar salas do lobby: {e}")
-            emit('rooms_info', {'rooms': []})
+            seq, rooms_info = None, []
+
+        emit('rooms_info', {'rooms': rooms_info, 'seq': seq})
+
+    def on_resync(self, data):
+        seq = data.get('seq') if isinstance(data, dict) else None
+
+        batches = lobby_snapshot.since(seq) if isinstance(seq, int) else None
+        if batches is not None:
+            return {'status': 'ok', 'mode': 'delta', 'batches': batches}
+
+        seq, rooms_info = lobby_snapshot.socket_view()
+        return {'status': 'ok', 'mode': 'snapshot', 'seq': seq, 'rooms': rooms_info}
+
+    def broadcast_deltas(self, socketio, app):
+        # Uma única tarefa junta as mudanças de cada tick em um lote só
+        while True:
+            socketio.sleep(LOBBY_TICK)
+
+            try:
+                with app.app_context():
+                    batch = lobby_snapshot.flush()
+            except Exception as e:
+                logger.error(f"Erro ao gerar deltas do lobby: {e}")
+                continue
 
-        emit('rooms_info', {'rooms': rooms_info})
\ No newline at end of file
+            if batch:
+                socketio.emit('lobby_delta', batch, to=LOBBY_CHANNEL, namespace=self.namespace)
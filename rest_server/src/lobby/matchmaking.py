@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict
+
+from src.data import MAX_ROOM_SIZE, QUICK_JOIN_HOLD
+from src.store.base import JOIN_OK
+from src.store.store import room_store
+
+
+# Índice do quick join: salas em WAITING com lugar livre, agrupadas pelo
+# número de lugares livres (um bucket por valor, de 1 a MAX_ROOM_SIZE).
+#
+# claim() olha os buckets do menos livre para o mais livre, então a sala
+# escolhida é sempre a mais cheia que ainda cabe alguém, em no máximo
+# MAX_ROOM_SIZE passos. O lugar já fica segurado para o usuário (hold) até a
+# entrada de fato (settle) ou a desistência (release), assim dois quick joins
+# ao mesmo tempo nunca disputam o mesmo lugar.
+#
+# O índice é deste processo: só vê as salas que têm jogadores conectados aqui.
+# Por isso o lugar também é segurado no room_store (hold_seat), que é o que
+# add_member respeita em todos os processos; se lá a sala já está cheia (o
+# índice estava atrasado), claim() tenta a próxima.
+
+
+class _Entry:
+    __slots__ = ('members', 'held', 'joinable', 'free')
+
+    def __init__(self):
+        self.members = 0
+        self.held = 0
+        self.joinable = False
+        self.free = 0
+
+
+class MatchmakingIndex:
+    def __init__(self, size=MAX_ROOM_SIZE, store=None, hold=QUICK_JOIN_HOLD):
+        self.size = size
+        self.store = store
+        self.hold = hold
+
+        self._lock = threading.Lock()
+        self._buckets = [OrderedDict() for _ in range(size + 1)]   # lugares livres -> {room_id: None}
+        self._rooms = {}        # room_id -> _Entry
+        self._holds = {}        # user_id -> room_id
+
+        self._claimed = 0
+        self._misses = 0
+
+    def _place(self, room_id, entry):
+        if entry.free:
+            del self._buckets[entry.free][room_id]
+
+        entry.free = max(0, self.size - entry.members - entry.held) if entry.joinable else 0
+        if entry.free:
+            self._buckets[entry.free][room_id] = None
+
+    def set_room(self, room_id, members, joinable):
+        with self._lock:
+            entry = self._rooms.get(room_id)
+            if entry is None:
+                entry = self._rooms[room_id] = _Entry()
+
+            entry.members = members
+            entry.joinable = joinable
+            self._place(room_id, entry)
+
+    def remove(self, room_id):
+        with self._lock:
+            entry = self._rooms.pop(room_id, None)
+            if entry is not None and entry.free:
+                del self._buckets[entry.free][room_id]
+
+            if entry is not None and entry.held:
+                for user_id in [user_id for user_id, held in self._holds.items() if held == room_id]:
+                    del self._holds[user_id]
+
+    def claim(self, user_id):
+        # Sala mais cheia com lugar livre (ou None), com um lugar segurado para user_id
+        self.release(user_id)
+
+        tried = set()
+        while True:
+            with self._lock:
+                room_id = self._claim(user_id, tried)
+                if room_id is None:
+                    self._misses += 1
+                    return None
+
+            if self.store is None or self.store.hold_seat(room_id, user_id, self.size, self.hold) == JOIN_OK:
+                with self._lock:
+                    self._claimed += 1
+                return room_id
+
+            with self._lock:
+                self._release(user_id)
+            tried.add(room_id)
+
+    def _claim(self, user_id, tried):
+        for free in range(1, self.size + 1):
+            for room_id in self._buckets[free]:
+                if room_id in tried:
+                    continue
+
+                entry = self._rooms[room_id]
+                entry.held += 1
+                self._place(room_id, entry)
+
+                self._holds[user_id] = room_id
+                return room_id
+        return None
+
+    def held_room(self, user_id):
+        with self._lock:
+            return self._holds.get(user_id)
+
+    def settle(self, user_id, room_id):
+        # O usuário entrou na sala: o lugar segurado vira um membro (contado em set_room)
+        with self._lock:
+            if self._holds.get(user_id) == room_id:
+                self._release(user_id)
+
+    def release(self, user_id):
+        with self._lock:
+            room_id = self._release(user_id)
+
+        if room_id is not None and self.store is not None:
+            self.store.release_seat(room_id, user_id)
+        return room_id
+
+    def _release(self, user_id):
+        room_id = self._holds.pop(user_id, None)
+        entry = self._rooms.get(room_id)
+        if entry is not None and entry.held:
+            entry.held -= 1
+            self._place(room_id, entry)
+        return room_id
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'rooms': sum(len(bucket) for bucket in self._buckets),
+                'free_seats': sum(free * len(bucket) for free, bucket in enumerate(self._buckets)),
+                'holds': len(self._holds),
+                'claimed': self._claimed,
+                'misses': self._misses,
+            }
+
+
+matchmaking = MatchmakingIndex(store=room_store)
@@ -0,0 +1,231 @@
+import base64
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models import db, GameRoom, game_participants
+from src.data import LOBBY_SNAPSHOT_TTL, LOBBY_DELTA_HISTORY, MAX_ROOM_SIZE
+
+
+# Lista das salas em LOBBY com o número de participantes, montada com uma
+# única consulta agrupada e mantida em memória. Quem muda uma sala chama
+# refresh_room(room_id), que relê só aquela sala. A cada LOBBY_SNAPSHOT_TTL a
+# lista inteira é relida, para pegar mudanças feitas por outros processos.
+#
+# As mudanças ficam marcadas até o próximo flush(), que compara o estado de
+# cada sala antes e depois e gera um lote de deltas (room_added, room_updated,
+# room_removed) com um número de sequência. Os últimos lotes ficam guardados
+# para quem ficou para trás poder se atualizar sem pedir a lista toda.
+#
+# A listagem REST é paginada por chave: o cursor é a chave (created_at, room_id)
+# da última sala da página, e a próxima começa logo depois dela (bisect na lista
+# ordenada). version muda a cada alteração e serve de ETag.
+
+
+def _room_query():
+    return db.session.query(
+        GameRoom.id,
+        GameRoom.room_code,
+        GameRoom.created_at,
+        func.count(game_participants.c.user_id)
+    ).outerjoin(
+        game_participants, game_participants.c.game_room_id == GameRoom.id
+    ).filter(
+        GameRoom.status == 'LOBBY'
+    ).group_by(
+        GameRoom.id
+    )
+
+def _entry(row):
+    room_id, room_code, created_at, count = row
+    return {
+        'room_id': room_id,
+        'room_code': room_code,
+        'created_at': created_at,
+        'participants_count': count
+    }
+
+def _key(entry):
+    return (entry['created_at'] or datetime.min, entry['room_id'])
+
+def encode_cursor(key):
+    created_at, room_id = key
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{room_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    # ValueError se o cursor não for válido
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, room_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(created_at), int(room_id))
+    except (UnicodeDecodeError, TypeError) as e:
+        raise ValueError(str(e))
+
+def _rest_room(entry):
+    return {
+        "room_code": entry['room_code'],
+        "participants_count": entry['participants_count'],
+        "created_at": entry['created_at']
+    }
+
+def _socket_room(entry):
+    return {
+        'room_id': entry['room_id'],
+        'room_name': entry['room_code'],
+        'members': entry['participants_count']
+    }
+
+
+class LobbySnapshot:
+    def __init__(self, ttl=LOBBY_SNAPSHOT_TTL, history=LOBBY_DELTA_HISTORY):
+        self.ttl = ttl
+        self.seq = 0
+        self.version = 0
+        self._epoch = uuid.uuid4().hex[:8]   # versões de outro processo (ou de antes de reiniciar) não se confundem
+
+        self._lock = threading.RLock()
+        self._rooms = None          # room_id -> entrada
+        self._built_at = 0.0
+        self._views = {}
+        self._dirty = {}            # room_id -> entrada antes do último flush (None se não existia)
+        self._history = deque(maxlen=history)
+
+    def _set(self, room_id, entry):
+        old = self._rooms.get(room_id)
+        if old == entry:
+            return
+
+        if room_id not in self._dirty:
+            self._dirty[room_id] = old
+
+        if entry is None:
+            del self._rooms[room_id]
+        else:
+            self._rooms[room_id] = entry
+        self._views = {}
+        self.version += 1
+
+    def _reload(self):
+        rooms = {entry['room_id']: entry for entry in map(_entry, _room_query().all())}
+
+        if self._rooms is None:
+            self._rooms = rooms
+            self.version += 1
+        else:
+            for room_id in set(self._rooms) | set(rooms):
+                self._set(room_id, rooms.get(room_id))
+
+        self._built_at = time.monotonic()
+        self._views = {}
+
+    def _ensure(self):
+        if self._rooms is None or time.monotonic() - self._built_at > self.ttl:
+            self._reload()
+
+    def refresh_room(self, room_id):
+        # Precisa de app context, como o resto das operações que vão ao DB
+        with self._lock:
+            if self._rooms is None:
+                return
+
+            row = _room_query().filter(GameRoom.id == room_id).first()
+            self._set(room_id, _entry(row) if row else None)
+
+    def remove_room(self, room_id):
+        with self._lock:
+            if self._rooms is not None:
+                self._set(room_id, None)
+
+    def rooms(self):
+        # Salas ordenadas por (created_at, room_id)
+        with self._lock:
+            self._ensure()
+            view = self._views.get('rooms')
+            if view is None:
+                view = self._views['rooms'] = sorted(self._rooms.values(), key=_key)
+            return view
+
+    def _view(self, name, build):
+        with self._lock:
+            rooms = self.rooms()
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = build(rooms)
+            return view
+
+    def rest_view(self):
+        return self._view('rest', lambda rooms: [_rest_room(room) for room in rooms])
+
+    def current_version(self):
+        with self._lock:
+            self._ensure()
+            return f'{self._epoch}.{self.version}'
+
+    def page(self, after=None, limit=None, not_full=False, prefix=None):
+        # Salas depois da chave after (created_at, room_id), até limit.
+        # Retorna (salas, chave da última) — a chave é None se não houver próxima página
+        with self._lock:
+            rooms = self.rooms()
+            keys = self._view('keys', lambda rooms: [_key(room) for room in rooms])
+
+            items = []
+            for index in range(bisect_right(keys, after) if after else 0, len(rooms)):
+                room = rooms[index]
+                if not_full and room['participants_count'] >= MAX_ROOM_SIZE:
+                    continue
+                if prefix and not room['room_code'].startswith(prefix):
+                    continue
+
+                if limit is not None and len(items) == limit:
+                    return [_rest_room(room) for room in items], _key(items[-1])
+                items.append(room)
+
+            return [_rest_room(room) for room in items], None
+
+    def socket_view(self):
+        with self._lock:
+            return self.seq, self._view('socket', lambda rooms: [_socket_room(room) for room in rooms])
+
+    def flush(self):
+        # Junta as mudanças desde o último flush em um lote de deltas (None se nada mudou)
+        with self._lock:
+            if self._rooms is not None:
+                self._ensure()
+
+            events = []
+            for room_id, before in self._dirty.items():
+                after = self._rooms.get(room_id)
+                if before is None and after is not None:
+                    events.append({'type': 'room_added', 'room': _socket_room(after)})
+                elif before is not None and after is None:
+                    events.append({'type': 'room_removed', 'room_id': room_id})
+                elif before is not None and before['participants_count'] != after['participants_count']:
+                    events.append({'type': 'room_updated', 'room_id': room_id, 'members': after['participants_count']})
+            self._dirty = {}
+
+            if not events:
+                return None
+
+            batch = {'prev_seq': self.seq, 'seq': self.seq + 1, 'events': events}
+            self.seq += 1
+            self._history.append(batch)
+            return batch
+
+    def since(self, seq):
+        # Lotes depois de seq, ou None se já saíram do histórico (o cliente deve pegar a lista toda)
+        with self._lock:
+            if seq == self.seq:
+                return []
+
+            batches = [batch for batch in self._history if batch['seq'] > seq]
+            if not batches or batches[0]['prev_seq'] > seq:
+                return None
+            return batches
+
+
+lobby_snapshot = LobbySnapshot()
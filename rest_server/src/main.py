@@ -5,31 +5,73 @@ from flask_jwt_extended import JWTManager
 from src.lobby.lobby import LobbyNS
 from src.room.room import RoomNS
 from src.auth import auth_bp
+from src.llm.scheduler import llm_scheduler
+from src.room.timer import room_timers
+from src.passwords import password_hasher
+from src.persistence import persistence
+from src.database import configure_database
+from src.reaper import reaper
+from src.room.snapshots import room_snapshots
+from src.room.actors import room_actors
+from src.data import BCRYPT_LOG_ROUNDS
 from REST.routes import api as api_blueprint
 from models import db, bcrypt
 
 import os
 
 
-def create_app():
+def create_flask_app():
+    # App Flask com o REST e o banco, sem o socket.io (usado também por src/aio/server.py)
     app = Flask(__name__)
-    app.debug = True
+    app.debug = os.getenv('MAKEASTORY_DEBUG', '1') == '1'   # serve.py desliga por padrão
     app.config['SECRET_KEY'] = os.getenv('MAKEASTORY_SOCKETIO_APP_KEY')
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'chave-jwt')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///game_data.db'
+    configure_database(app)   # MAKEASTORY_DATABASE_URL / MAKEASTORY_DB_PROFILE
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('MAKEASTORY_BCRYPT_ROUNDS', BCRYPT_LOG_ROUNDS))
     
     db.init_app(app)
     bcrypt.init_app(app)
+    password_hasher.configure(app)
     jwt = JWTManager(app)
-    socketio = SocketIO(cors_allowed_origins='*')
 
     app.register_blueprint(auth_bp)       # Registra /auth/register, /auth/login, etc.
     app.register_blueprint(api_blueprint) # Registra /api/rooms, /api/rooms/<id>/join, etc.
+
+    return app
+
+
+def create_app():
+    app = create_flask_app()
+
+    # Com mais de um processo, os eventos passam pela fila (ex: redis://localhost:6379/0)
+    # e o estado das salas fica em MAKEASTORY_STATE_STORE (ver src/store/store.py).
+    # MAKEASTORY_ASYNC_MODE: eventlet, gevent ou threading (vazio = o primeiro instalado)
+    options = {
+        'cors_allowed_origins': '*',
+        'async_mode': os.getenv('MAKEASTORY_ASYNC_MODE') or None
+    }
+    # Com a chave message_queue presente (mesmo None) o SocketIO chama init_app no
+    # construtor, e os namespaces registrados depois somem no init_app abaixo
+    if os.getenv('MAKEASTORY_MESSAGE_QUEUE'):
+        options['message_queue'] = os.getenv('MAKEASTORY_MESSAGE_QUEUE')
+    socketio = SocketIO(**options)
     
-    socketio.on_namespace(LobbyNS('/'))
-    socketio.on_namespace(RoomNS('/r', socketio))
+    room_ns = RoomNS('/r', socketio, app)
+    llm_scheduler.on_queue_update(room_ns.notify_llm_queue)
+
+    app.extensions['room_ns'] = room_ns   # serve.py espera as rodadas em andamento ao encerrar
+
+    lobby_ns = LobbyNS('/')
+    socketio.on_namespace(lobby_ns)
+    socketio.on_namespace(room_ns)
 
     socketio.init_app(app)
+    room_actors.start(socketio, app)
+    room_timers.start(socketio)
+    persistence.start(socketio, app)
+    reaper.start(socketio, app)
+    room_snapshots.start(socketio)
+    socketio.start_background_task(lobby_ns.broadcast_deltas, socketio, app)
 
     return app, socketio
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import requests
+
+from src.log import logger
+
+JAMENDO_URL = "https://api.jamendo.com/v3.0/tracks/"
+
+
+_async_client = None
+
+
+def _params(theme):
+    client_id = os.getenv('JAMENDO_CLIENT_ID')
+    if not client_id:
+        logger.warning("JAMENDO_CLIENT_ID não configurada. Pulando música.")
+        return None
+
+    return {
+        'client_id': client_id,
+        'format': 'json',
+        'limit': 1,
+        'search': theme,
+        'order': 'relevance',
+        'vocalinstrumental': 'instrumental'
+    }
+
+def _track(jamendo_data):
+    if jamendo_data.get('results') and len(jamendo_data['results']) > 0:
+        return jamendo_data['results'][0].get('audio')
+
+    return None
+
+def search_track(theme):
+    params = _params(theme)
+    if params is None:
+        return None
+
+    r = requests.get(JAMENDO_URL, params=params, timeout=5)
+    r.raise_for_status()
+    return _track(r.json())
+
+async def search_track_async(theme):
+    # Servidor asyncio: um cliente httpx compartilhado (conexões reaproveitadas)
+    global _async_client
+
+    params = _params(theme)
+    if params is None:
+        return None
+
+    if _async_client is None:
+        import httpx
+
+        _async_client = httpx.AsyncClient(timeout=5)
+
+    r = await _async_client.get(JAMENDO_URL, params=params)
+    r.raise_for_status()
+    return _track(r.json())
@@ -0,0 +1,79 @@
+from sqlalchemy import inspect, text
+
+from models import db, StorySegment, GameRoom, game_participants
+
+from src.log import logger
+
+
+# Ajustes de schema em bancos já existentes (db.create_all só cria tabelas novas)
+#
+# Cada migração olha o schema atual e só roda se ainda não foi aplicada, então
+# upgrade() pode ser chamado a cada inicialização. Precisa de app context.
+
+
+def _columns(table):
+    return {column['name'] for column in inspect(db.engine).get_columns(table)}
+
+
+def _story_segment_authors():
+    # story_segment ganhou kind/author_name e user_id passou a aceitar NULL (trechos da IA).
+    # O SQLite não altera NOT NULL de uma coluna, então a tabela é recriada e os dados copiados.
+    if 'kind' in _columns('story_segment'):
+        return False
+
+    with db.engine.begin() as conn:
+        conn.execute(text('ALTER TABLE story_segment RENAME TO story_segment_old'))
+        StorySegment.__table__.create(conn)
+        conn.execute(text(
+            "INSERT INTO story_segment (id, text_content, round_number, game, created_at, kind, author_name, user_id, game_room_id) "
+            "SELECT s.id, s.text_content, s.round_number, 1, s.created_at, 'snippet', u.username, s.user_id, s.game_room_id "
+            "FROM story_segment_old s LEFT JOIN \"user\" u ON u.id = s.user_id"
+        ))
+        conn.execute(text('DROP TABLE story_segment_old'))
+    return True
+
+
+def _room_indexes():
+    # Índices de game_room(status, created_at) e game_participants(game_room_id, user_id)
+    inspector = inspect(db.engine)
+    created = False
+
+    for table in (GameRoom.__table__, game_participants):
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created = True
+    return created
+
+
+def _story_games():
+    # game_room.games e story_segment.game separam os jogos de uma sala que foi jogada de novo.
+    # Os trechos que já existem são todos do primeiro jogo
+    if 'games' in _columns('game_room'):
+        return False
+
+    # story_segment recriada por _story_segment_authors já tem a coluna
+    segment_columns = _columns('story_segment')
+    with db.engine.begin() as conn:
+        conn.execute(text('ALTER TABLE game_room ADD COLUMN games INTEGER NOT NULL DEFAULT 0'))
+        if 'game' not in segment_columns:
+            conn.execute(text('ALTER TABLE story_segment ADD COLUMN game INTEGER NOT NULL DEFAULT 1'))
+        conn.execute(text(
+            'UPDATE game_room SET games = 1 '
+            'WHERE status = \'IN_PROGRESS\' OR id IN (SELECT game_room_id FROM story_segment)'
+        ))
+    return True
+
+
+MIGRATIONS = [
+    _story_segment_authors,
+    _room_indexes,
+    _story_games,
+]
+
+
+def upgrade():
+    for migration in MIGRATIONS:
+        if migration():
+            logger.info(f"Migração aplicada: {migration.__name__.strip('_')}")
@@ -0,0 +1,175 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+from src.data import (
+    BCRYPT_LOG_ROUNDS, BCRYPT_HASH_SECONDS, PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT, PASSWORD_QUEUE_TIMEOUT
+)
+
+
+# Hash e verificação de senhas fora do processo do servidor
+#
+# Cada chamada do bcrypt leva centenas de ms de CPU e, rodando no handler,
+# segura o worker inteiro (e o tráfego de todas as salas). Aqui o trabalho vai
+# para um pool de PASSWORD_WORKERS processos. Só entram os pedidos que os
+# workers conseguem começar em PASSWORD_QUEUE_TIMEOUT: no máximo
+# workers * timeout / tempo de um hash em andamento (o tempo é medido nos
+# workers; a fila nunca passa de PASSWORD_QUEUE_LIMIT). Com a fila cheia o
+# pedido recebe PasswordQueueFull na hora, sem esperar vaga, e um pedido que
+# mesmo assim não começou a tempo sai da fila com o mesmo erro: num pico o
+# handler devolve 503 logo em vez de ficar preso.
+#
+# O custo (BCRYPT_LOG_ROUNDS) vale para os hashes novos. No login, um hash com
+# custo diferente do configurado é refeito (needs_rehash).
+
+
+class PasswordQueueFull(Exception):
+    pass
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _check(password_hash, password):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def _timed(fn, *args):
+    # Roda no worker: o tempo do hash sem a espera na fila
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+def hash_seconds(rounds):
+    # Estimativa até o primeiro hash medido: cada round a mais dobra o custo
+    return BCRYPT_HASH_SECONDS * 2 ** (rounds - 12)
+
+def hash_cost(password_hash):
+    # '$2b$12$...' -> 12
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=BCRYPT_LOG_ROUNDS, workers=PASSWORD_WORKERS,
+                 queue_limit=PASSWORD_QUEUE_LIMIT, queue_timeout=PASSWORD_QUEUE_TIMEOUT):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._job_seconds = hash_seconds(rounds)
+
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def configure(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        with self._lock:
+            self._job_seconds = hash_seconds(self.rounds)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: os processos não herdam as threads/greenlets do servidor
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _capacity(self):
+        # Pedidos em andamento (rodando + na fila) que os workers começam antes
+        # do timeout: o último da fila começa um hash antes dele. Precisa do _lock
+        fits = int(self.workers * self.queue_timeout / self._job_seconds)
+        return max(self.workers, min(self.workers + self.queue_limit, fits))
+
+    def _run(self, fn, *args):
+        with self._lock:
+            full = self._pending >= self._capacity()
+            if full:
+                self._rejected += 1
+            else:
+                self._pending += 1
+        if full:
+            raise PasswordQueueFull('Fila de senhas cheia')
+
+        started = time.monotonic()
+        seconds = None
+        try:
+            future = self._pool().submit(_timed, fn, *args)
+            try:
+                result, seconds = future.result(timeout=self.queue_timeout)
+            except FutureTimeout:
+                # Se ainda não começou, sai da fila; se já está rodando, termina logo
+                if future.cancel():
+                    self._reject()
+                    raise PasswordQueueFull('Fila de senhas demorou demais')
+                result, seconds = future.result()
+
+            return result
+
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._pending -= 1
+                if seconds is not None:
+                    self._completed += 1
+                    self._latency_total += elapsed
+                    self._latency_max = max(self._latency_max, elapsed)
+                    # Média móvel: acompanha a máquina e o custo dos hashes que chegam
+                    self._job_seconds = max(0.001, 0.8 * self._job_seconds + 0.2 * seconds)
+
+    def _reject(self):
+        with self._lock:
+            self._rejected += 1
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(_check, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return hash_cost(password_hash) != self.rounds
+
+    def count_rehash(self):
+        with self._lock:
+            self._rehashed += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'workers': self.workers,
+                'queue_limit': self._capacity() - self.workers,
+                'hash_seconds': round(self._job_seconds, 4),
+                'running': min(self._pending, self.workers),
+                'queued': max(0, self._pending - self.workers),
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'rehashed': self._rehashed,
+                'latency_avg': round(self._latency_total / self._completed, 4) if self._completed else 0.0,
+                'latency_max': round(self._latency_max, 4),
+            }
+
+
+password_hasher = PasswordHasher()
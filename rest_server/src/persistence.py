@@ -0,0 +1,287 @@
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError, InterfaceError
+
+from models import db, User, GameRoom, StorySegment
+from src.data import WRITER_INTERVAL, WRITER_MAX_RETRIES
+from src.lobby.snapshot import lobby_snapshot
+from src.story import materialize_story
+from src.user_cache import user_cache
+
+from src.log import logger
+
+
+# Escritas do jogo no DB fora dos handlers (write-behind)
+#
+# Os handlers só registram a mudança em memória e seguem. Uma única tarefa de
+# fundo junta tudo que chegou a cada WRITER_INTERVAL e grava em uma transação:
+#   - status da sala: só o último valor de cada sala é gravado (e o número do
+#     jogo, quando um jogo começa)
+#   - trechos da história (StorySegment): inseridos todos de uma vez
+#   - fim de jogo: final_story_text é montado a partir dos trechos do jogo, uma vez só
+#   - convidados a remover: removidos juntos, a não ser que tenham logado de novo
+# Se o banco recusa alguma linha (FK, NOT NULL...), o lote é dividido ao meio
+# e cada metade gravada em separado, até isolar as linhas ruins, que são
+# descartadas; o resto é gravado. Erro de conexão ou de lock não é culpa de
+# nenhuma linha: o lote volta para a fila como está, com as suas próprias
+# tentativas (até WRITER_MAX_RETRIES), na frente dos lotes mais novos.
+# Ao encerrar o processo o que estiver pendente é gravado (atexit).
+
+
+class _Batch:
+    def __init__(self):
+        self.statuses = {}      # room_id -> status
+        self.games = {}         # room_id -> número do jogo que começou
+        self.segments = []      # linhas de story_segment, na ordem em que chegaram
+        self.finished = set()   # room_id das salas cujo jogo acabou
+        self.guests = {}        # user_id -> quando foi pedido (utc)
+        self.oldest = None      # time.monotonic() da mudança mais antiga
+        self.attempts = 0
+
+    def __len__(self):
+        return len(self.statuses) + len(self.segments) + len(self.finished) + len(self.guests)
+
+    def touch(self):
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+
+    def split(self):
+        # Duas metades, na ordem em que são gravadas (status, trechos, fim de jogo, convidados)
+        items = (
+            [('status', room_id) for room_id in self.statuses] +
+            [('segment', row) for row in self.segments] +
+            [('finished', room_id) for room_id in self.finished] +
+            [('guest', user_id) for user_id in self.guests]
+        )
+        middle = len(items) // 2
+        return self._part(items[:middle]), self._part(items[middle:])
+
+    def _part(self, items):
+        part = _Batch()
+        for kind, item in items:
+            if kind == 'status':
+                part.statuses[item] = self.statuses[item]
+                if item in self.games:
+                    part.games[item] = self.games[item]
+            elif kind == 'segment':
+                part.segments.append(item)
+            elif kind == 'finished':
+                part.finished.add(item)
+            else:
+                part.guests[item] = self.guests[item]
+
+        part.oldest = self.oldest
+        part.attempts = self.attempts
+        return part
+
+
+class PersistenceWriter:
+    def __init__(self, interval=WRITER_INTERVAL, max_retries=WRITER_MAX_RETRIES):
+        self.interval = interval
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = _Batch()
+        self._retry = []        # lotes que falharam por conexão/lock, do mais antigo ao mais novo
+        self._app = None
+        self._running = False
+
+        self._flushes = 0
+        self._written = 0
+        self._failures = 0
+        self._dropped = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._last_flush = 0.0
+
+    def set_room_status(self, room_id, status):
+        with self._lock:
+            self._pending.statuses[room_id] = status
+            self._pending.touch()
+
+    def start_game(self, room_id, game):
+        # IN_PROGRESS e o novo jogo; o texto pronto do jogo anterior deixa de valer
+        with self._lock:
+            self._pending.statuses[room_id] = 'IN_PROGRESS'
+            self._pending.games[room_id] = game
+            self._pending.touch()
+
+    def append_segments(self, room_id, game, current_round, segments):
+        # segments: [{'kind', 'user_id', 'author_name', 'text_content'}]
+        now = datetime.utcnow()
+        rows = [
+            dict(segment, game_room_id=room_id, game=game, round_number=current_round, created_at=now)
+            for segment in segments
+        ]
+
+        with self._lock:
+            self._pending.segments.extend(rows)
+            self._pending.touch()
+
+    def finish_story(self, room_id):
+        with self._lock:
+            self._pending.finished.add(room_id)
+            self._pending.touch()
+
+    def delete_guest(self, user_id):
+        with self._lock:
+            self._pending.guests[user_id] = datetime.utcnow()
+            self._pending.touch()
+
+    def start(self, socketio, app):
+        self._app = app
+        if self._running:
+            return
+        self._running = True
+        atexit.register(self.flush)
+        socketio.start_background_task(self._run, socketio)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self, socketio):
+        while self._running:
+            socketio.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        # Grava o que estiver pendente (os lotes que voltaram primeiro). Retorna o número de mudanças gravadas
+        with self._flush_lock:
+            with self._lock:
+                if len(self._pending):
+                    self._retry.append(self._pending)
+                    self._pending = _Batch()
+                queue, self._retry = self._retry, []
+
+            if not queue:
+                return 0
+
+            started = time.monotonic()
+            written = []
+            deleted = []
+
+            with self._app.app_context():
+                while queue:
+                    batch = queue.pop(0)
+                    try:
+                        deleted += self._write(batch)
+                        written.append(batch)
+
+                    except (OperationalError, InterfaceError) as e:
+                        # Banco fora ou travado: este e os seguintes ficam para o próximo intervalo
+                        self._rollback()
+                        self._failed(batch, queue, e)
+                        break
+
+                    except Exception as e:
+                        # Alguma linha foi recusada: divide até achar qual
+                        self._rollback()
+                        with self._lock:
+                            self._failures += 1
+                        if len(batch) > 1:
+                            queue[:0] = batch.split()
+                        else:
+                            self._drop(batch, e)
+
+            if not written:
+                return 0
+
+            try:
+                with self._app.app_context():
+                    for room_id in {room_id for batch in written for room_id in batch.statuses}:
+                        lobby_snapshot.refresh_room(room_id)
+            except Exception as e:
+                logger.error(f"Erro ao atualizar o lobby após gravar o lote: {e}")
+
+            for user_id in deleted:
+                user_cache.invalidate(user_id, deleted=True)
+
+            count = sum(len(batch) for batch in written)
+            now = time.monotonic()
+            lag = now - min(batch.oldest for batch in written)
+            with self._lock:
+                self._flushes += 1
+                self._written += count
+                self._lag_total += lag
+                self._lag_max = max(self._lag_max, lag)
+                self._last_flush = now - started
+
+            return count
+
+    def _write(self, batch):
+        for room_id, status in batch.statuses.items():
+            values = {'status': status}
+            if room_id in batch.games:
+                values.update(games=batch.games[room_id], final_story_text=None)
+            db.session.execute(update(GameRoom).where(GameRoom.id == room_id).values(**values))
+
+        if batch.segments:
+            db.session.execute(StorySegment.__table__.insert(), batch.segments)
+
+        for room_id in batch.finished:
+            materialize_story(room_id)
+
+        deleted = []
+        if batch.guests:
+            guests = User.query.filter(User.id.in_(list(batch.guests)), User.is_guest.is_(True)).all()
+            for user in guests:
+                # Logou de novo depois do pedido de remoção: continua valendo
+                if user.last_login and user.last_login > batch.guests[user.id]:
+                    continue
+                db.session.delete(user)
+                deleted.append(user.id)
+
+        db.session.commit()
+
+        if deleted:
+            logger.info(f"Convidados removidos do banco de dados: {deleted}")
+        return deleted
+
+    def _rollback(self):
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+
+    def _failed(self, batch, queue, e):
+        # Devolve o lote e os que ainda não foram tentados para a frente da fila, na ordem
+        batch.attempts += 1
+        with self._lock:
+            self._failures += 1
+            if batch.attempts > self.max_retries:
+                self._dropped += len(batch)
+                logger.error(f"Lote de escrita descartado após {batch.attempts} tentativas ({len(batch)} mudanças): {e}")
+            else:
+                queue.insert(0, batch)
+                logger.error(f"Erro ao gravar lote no DB (tentativa {batch.attempts}): {e}")
+            self._retry[:0] = queue
+
+    def _drop(self, batch, e):
+        with self._lock:
+            self._dropped += len(batch)
+        logger.error(f"Mudança descartada, recusada pelo banco: {e}")
+
+    def metrics(self):
+        with self._lock:
+            batches = self._retry + [self._pending]
+            oldest = min(filter(None, (batch.oldest for batch in batches)), default=None)
+            return {
+                'pending': sum(len(batch) for batch in batches),
+                'retrying': len(self._retry),
+                'lag': round(time.monotonic() - oldest, 3) if oldest else 0.0,
+                'lag_avg': round(self._lag_total / self._flushes, 3) if self._flushes else 0.0,
+                'lag_max': round(self._lag_max, 3),
+                'flushes': self._flushes,
+                'written': self._written,
+                'failures': self._failures,
+                'dropped': self._dropped,
+                'last_flush': round(self._last_flush, 4),
+            }
+
+
+persistence = PersistenceWriter()
@@ -0,0 +1,240 @@
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update, select, exists, func
+
+from models import db, User, GameRoom, StorySegment, game_participants
+from src.data import RoomState, REAPER_INTERVAL, ROOM_IDLE_TTL, GUEST_TTL, REAPER_BATCH, WORKER_TTL
+from src.store.store import room_store
+from src.room.timer import room_timers
+from src.room.actors import room_actors
+from src.lobby.snapshot import lobby_snapshot
+from src.lobby.matchmaking import matchmaking
+from src.persistence import persistence
+from src.user_cache import user_cache
+
+from src.log import logger
+
+
+# Limpeza periódica do que ficou para trás
+#
+#   - salas em LOBBY criadas há mais de ROOM_IDLE_TTL que nunca tiveram história
+#     e não estão ativas (ninguém conectado)
+#   - membros e mapeamentos usuário -> sala abandonados: de um processo que
+#     caiu (o on_disconnect não rodou) ou de quem já está em outra sala. Só
+#     são liberados se aparecem em duas passadas seguidas, para não pegar uma
+#     entrada no meio do caminho
+#   - convidados sem login há mais de GUEST_TTL que não estão em sala
+#   - salas no room_store que não existem mais no DB
+#
+# As remoções são feitas em lotes de REAPER_BATCH, uma transação por lote, e o
+# que foi removido sai também do room_store, do lobby e do quick join.
+
+
+def _evict_room(room_id):
+    room = room_store.get(room_id)
+    for user_id in (room.members if room else {}):
+        room_store.unmap_user(user_id)
+    room_store.delete(room_id)
+    room_timers.cancel(room_id)
+    matchmaking.remove(room_id)
+
+
+def _release_member(room_id, user_id):
+    # No worker da sala; o store confere de novo se o usuário continua abandonado
+    remaining = room_store.release_member(room_id, user_id)
+    if remaining is None or remaining < 0:
+        return
+
+    logger.info(f"[REAPER] Membro abandonado {user_id} removido da sala {room_id}")
+    if remaining:
+        room = room_store.get(room_id)
+        if room is not None:
+            matchmaking.set_room(room_id, remaining, room.room_state == RoomState.WAITING)
+        return
+
+    logger.info(f"[ROOM {room_id}] A sala ficou vazia. Removida do cache de memória.")
+    room_timers.cancel(room_id)
+    matchmaking.remove(room_id)
+    persistence.set_room_status(room_id, 'LOBBY')
+    persistence.finish_story(room_id)
+
+
+class Reaper:
+    def __init__(self, interval=REAPER_INTERVAL, room_ttl=ROOM_IDLE_TTL, guest_ttl=GUEST_TTL, batch=REAPER_BATCH):
+        self.interval = interval
+        self.room_ttl = room_ttl
+        self.guest_ttl = guest_ttl
+        self.batch = batch
+
+        self._running = False
+        self._runs = 0
+        self._rooms = 0
+        self._guests = 0
+        self._evicted = 0
+        self._released = 0
+        self._suspects = set()   # (room_id, user_id) abandonados na passada anterior
+        self._last = {}
+
+    def start(self, socketio, app):
+        if self._running:
+            return
+        self._running = True
+        self._heartbeat()
+        socketio.start_background_task(self._run, socketio, app)
+
+    def stop(self):
+        self._running = False
+
+    def _heartbeat(self):
+        try:
+            room_store.heartbeat(WORKER_TTL)
+        except Exception as e:
+            logger.error(f"[REAPER] Erro ao renovar o heartbeat: {e}")
+
+    def _run(self, socketio, app):
+        while self._running:
+            socketio.sleep(self.interval)
+            self._heartbeat()
+
+            try:
+                with app.app_context():
+                    self.run_once(socketio.sleep)
+            except Exception as e:
+                logger.error(f"[REAPER] Erro na limpeza: {e}")
+                with app.app_context():
+                    db.session.rollback()
+
+    def run_once(self, pause=None):
+        # pause(0) entre os lotes deixa as outras tarefas rodarem
+        started = time.monotonic()
+        now = datetime.utcnow()
+
+        rooms = self._reap_rooms(now - timedelta(seconds=self.room_ttl), pause)
+        released = self._release_members()
+        guests = self._reap_guests(now - timedelta(seconds=self.guest_ttl), pause)
+        evicted = self._evict_stale_rooms()
+
+        self._runs += 1
+        self._rooms += rooms
+        self._released += released
+        self._guests += guests
+        self._evicted += evicted
+        self._last = {
+            'rooms': rooms,
+            'released': released,
+            'guests': guests,
+            'evicted': evicted,
+            'seconds': round(time.monotonic() - started, 3),
+        }
+
+        if rooms or released or guests or evicted:
+            logger.info(f"[REAPER] Removidos {rooms} salas, {released} membros abandonados, {guests} convidados, {evicted} salas do room_store")
+        return self._last
+
+    def _batches(self, query, column, pause):
+        # Percorre os ids em ordem (keyset), um lote por vez
+        last_id = 0
+        while True:
+            ids = [row[0] for row in query.filter(column > last_id).order_by(column).limit(self.batch).all()]
+            if not ids:
+                return
+
+            yield ids
+            last_id = ids[-1]
+            if pause:
+                pause(0)
+
+    def _reap_rooms(self, cutoff, pause):
+        idle = db.session.query(GameRoom.id).filter(
+            GameRoom.status == 'LOBBY',
+            GameRoom.created_at < cutoff,
+            ~exists().where(StorySegment.game_room_id == GameRoom.id)
+        )
+
+        total = 0
+        for ids in self._batches(idle, GameRoom.id, pause):
+            ids = [room_id for room_id in ids if room_id not in room_store]
+            if not ids:
+                continue
+
+            # Só as que continuam em LOBBY (alguém pode ter começado um jogo desde a consulta)
+            still_idle = select(GameRoom.id).where(GameRoom.id.in_(ids), GameRoom.status == 'LOBBY')
+            db.session.execute(delete(game_participants).where(game_participants.c.game_room_id.in_(still_idle)))
+            deleted = db.session.execute(delete(GameRoom).where(GameRoom.id.in_(ids), GameRoom.status == 'LOBBY'))
+            db.session.commit()
+
+            for room_id in ids:
+                room_timers.cancel(room_id)
+                matchmaking.remove(room_id)
+                lobby_snapshot.remove_room(room_id)
+            total += deleted.rowcount
+
+        return total
+
+    def _release_members(self):
+        suspects = set(room_store.suspect_members())
+        stale = suspects & self._suspects
+        self._suspects = suspects - stale
+
+        for room_id, user_id in stale:
+            room_actors.tell(room_id, _release_member, room_id, user_id)
+        return len(stale)
+
+    def _reap_guests(self, cutoff, pause):
+        last_seen = func.coalesce(User.last_login, User.created_at)
+        dead = db.session.query(User.id).filter(User.is_guest.is_(True), last_seen < cutoff)
+
+        total = 0
+        for ids in self._batches(dead, User.id, pause):
+            # Mapeamentos abandonados já foram liberados (_release_members): quem continua em sala está ativo
+            ids = [user_id for user_id in ids if room_store.room_of(user_id) is None]
+            if not ids:
+                continue
+
+            # Os trechos escritos pelo convidado ficam na história, sem autor
+            db.session.execute(update(StorySegment).where(StorySegment.user_id.in_(ids)).values(user_id=None))
+            db.session.execute(delete(game_participants).where(game_participants.c.user_id.in_(ids)))
+            # Repete o filtro: quem logou de novo desde a consulta fica
+            db.session.execute(delete(User).where(User.id.in_(ids), User.is_guest.is_(True), last_seen < cutoff))
+            db.session.commit()
+
+            kept = {row[0] for row in db.session.query(User.id).filter(User.id.in_(ids))}
+            deleted = [user_id for user_id in ids if user_id not in kept]
+            for user_id in deleted:
+                room_store.unmap_user(user_id)
+                user_cache.invalidate(user_id, deleted=True)
+            total += len(deleted)
+
+        return total
+
+    def _evict_stale_rooms(self):
+        # Salas no room_store (ex: Redis depois de um processo cair) que não existem mais no DB
+        active = room_store.room_ids()
+        if not active:
+            return 0
+
+        existing = set()
+        for start in range(0, len(active), self.batch):
+            chunk = active[start:start + self.batch]
+            existing.update(row[0] for row in db.session.query(GameRoom.id).filter(GameRoom.id.in_(chunk)))
+
+        stale = [room_id for room_id in active if room_id not in existing]
+        for room_id in stale:
+            # No worker da sala, depois dos eventos que ela já recebeu
+            room_actors.tell(room_id, _evict_room, room_id)
+
+        return len(stale)
+
+    def metrics(self):
+        return {
+            'runs': self._runs,
+            'rooms': self._rooms,
+            'guests': self._guests,
+            'evicted': self._evicted,
+            'released': self._released,
+            'last': self._last,
+        }
+
+
+reaper = Reaper()
@@ -0,0 +1,159 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from src.data import ROOM_ACTOR_SHARDS, ROOM_ACTOR_QUEUE_LIMIT, ROOM_ACTOR_TIMEOUT
+
+from src.log import logger
+
+
+# Um único escritor por sala
+#
+# Tudo que muda uma sala (entrada, saída, início do jogo, snippet, prazo da
+# rodada, resposta da IA) vira uma mensagem na caixa da sala e roda em um
+# único worker, na ordem de chegada. As salas são divididas entre os workers
+# pelo room_id: eventos da mesma sala nunca rodam ao mesmo tempo, e salas de
+# workers diferentes não disputam nenhum lock global.
+#
+# Os handlers que precisam do resultado para o ack usam call() e esperam o
+# Future da mensagem. Timers e tarefas de fundo usam tell(), só entregam a
+# mensagem e seguem. Uma mensagem não deve esperar I/O lento (a chamada da IA
+# roda fora e devolve o resultado com tell).
+
+
+class MailboxFull(Exception):
+    pass
+
+
+class _Message:
+    __slots__ = ('room_id', 'fn', 'args', 'future', 'enqueued_at')
+
+    def __init__(self, room_id, fn, args):
+        self.room_id = room_id
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class RoomActors:
+    def __init__(self, shards=ROOM_ACTOR_SHARDS, queue_limit=ROOM_ACTOR_QUEUE_LIMIT, timeout=ROOM_ACTOR_TIMEOUT):
+        self.shards = max(1, shards)
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+
+        self._mailboxes = [queue.Queue() for _ in range(self.shards)]
+        self._local = threading.local()
+        self._app = None
+        self._running = False
+
+        self._processed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._errors = 0
+        self._wait_avg = 0.0   # em segundos, média móvel do tempo na caixa
+
+    def shard_of(self, room_id):
+        return hash(room_id) % self.shards
+
+    def _inline(self, shard):
+        # Sem workers (scripts) ou já dentro do worker da sala: roda direto,
+        # esperar a própria caixa travaria o worker
+        return not self._running or getattr(self._local, 'shard', None) == shard
+
+    def tell(self, room_id, fn, *args):
+        # Entrega a mensagem sem esperar, retorna o Future
+        message = _Message(room_id, fn, args)
+        if not self._running:
+            self._execute(message)
+        else:
+            self._mailboxes[self.shard_of(room_id)].put(message)
+        return message.future
+
+    def call(self, room_id, fn, *args):
+        # Roda fn(*args) no worker da sala e retorna o resultado.
+        # MailboxFull se a caixa estiver cheia ou a mensagem não começar a tempo
+        shard = self.shard_of(room_id)
+        if self._inline(shard):
+            return fn(*args)
+
+        mailbox = self._mailboxes[shard]
+        if mailbox.qsize() >= self.queue_limit:
+            self._rejected += 1
+            raise MailboxFull(f'caixa do worker {shard} cheia')
+
+        message = _Message(room_id, fn, args)
+        mailbox.put(message)
+
+        try:
+            return message.future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Se ainda não começou, não roda mais; se já está rodando, termina logo
+            if message.future.cancel():
+                self._timeouts += 1
+                raise MailboxFull(f'sala {room_id} não respondeu em {self.timeout}s')
+            return message.future.result()
+
+    def start(self, socketio, app):
+        if self._running:
+            return
+        self._running = True
+        self._app = app
+        for shard in range(self.shards):
+            socketio.start_background_task(self._run, shard)
+
+    def stop(self):
+        self._running = False
+        for mailbox in self._mailboxes:
+            mailbox.put(None)
+
+    def _run(self, shard):
+        self._local.shard = shard
+        mailbox = self._mailboxes[shard]
+
+        while self._running:
+            message = mailbox.get()
+            if message is None:
+                break
+            self._execute(message)
+
+    def _execute(self, message):
+        if not message.future.set_running_or_notify_cancel():
+            return
+
+        self._wait_avg += (time.monotonic() - message.enqueued_at - self._wait_avg) * 0.05
+        try:
+            if self._app is not None:
+                with self._app.app_context():
+                    result = message.fn(*message.args)
+            else:
+                result = message.fn(*message.args)
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"[ROOM {message.room_id}] Erro ao processar {getattr(message.fn, '__name__', message.fn)}: {e}")
+            message.future.set_exception(e)
+        else:
+            message.future.set_result(result)
+        finally:
+            self._processed += 1
+
+    def pending(self):
+        return sum(mailbox.qsize() for mailbox in self._mailboxes)
+
+    def metrics(self):
+        depths = [mailbox.qsize() for mailbox in self._mailboxes]
+        return {
+            'shards': self.shards,
+            'queued': sum(depths),
+            'max_queued': max(depths),
+            'processed': self._processed,
+            'rejected': self._rejected,
+            'timeouts': self._timeouts,
+            'errors': self._errors,
+            'avg_wait_ms': round(self._wait_avg * 1000, 2),
+        }
+
+
+room_actors = RoomActors(int(os.getenv('MAKEASTORY_ROOM_SHARDS', ROOM_ACTOR_SHARDS)))
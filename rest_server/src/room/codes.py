@@ -0,0 +1,105 @@
+import hashlib
+import os
+import string
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, CodeSequence
+from src.data import ROOM_CODE_LENGTH, ROOM_CODE_BLOCK
+
+
+# Códigos de sala sem consultas por tentativa
+#
+# Cada processo reserva no DB um bloco de ROOM_CODE_BLOCK números da sequência
+# (uma transação por bloco) e entrega os números em ordem. Cada número passa por
+# uma permutação (Feistel de 32 bits + cycle walking) dentro de [0, 36^6), então
+# números diferentes sempre viram códigos diferentes e os códigos não parecem
+# sequenciais. A unicidade de room_code no DB continua como rede de segurança.
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_SPACE = len(ALPHABET) ** ROOM_CODE_LENGTH
+
+SEQUENCE_NAME = 'room_code'
+
+
+def _round_keys(secret):
+    digest = hashlib.sha256(secret.encode('utf-8')).digest()
+    return [int.from_bytes(digest[i:i + 2], 'big') for i in range(0, 8, 2)]
+
+ROUND_KEYS = _round_keys(os.getenv('MAKEASTORY_ROOM_CODE_KEY', 'makeAStory'))
+
+
+def _feistel(value, keys):
+    left, right = value >> 16, value & 0xFFFF
+    for key in keys:
+        left, right = right, left ^ ((((right * 0x9E37) ^ key) + (right >> 5)) & 0xFFFF)
+    return (left << 16) | right
+
+def scramble(number, keys=ROUND_KEYS):
+    # Permutação de [0, CODE_SPACE): aplica o Feistel até cair dentro do intervalo
+    value = number
+    while True:
+        value = _feistel(value, keys)
+        if value < CODE_SPACE:
+            return value
+
+def encode(value):
+    chars = []
+    for _ in range(ROOM_CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class RoomCodeAllocator:
+    def __init__(self, block_size=ROOM_CODE_BLOCK):
+        self.block_size = block_size
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _reserve_block(self):
+        table = CodeSequence.__table__
+
+        while True:
+            try:
+                with db.engine.begin() as conn:
+                    updated = conn.execute(
+                        table.update()
+                        .where(table.c.name == SEQUENCE_NAME)
+                        .values(next_value=table.c.next_value + self.block_size)
+                    ).rowcount
+
+                    if not updated:
+                        conn.execute(table.insert().values(name=SEQUENCE_NAME, next_value=self.block_size))
+
+                    # Ainda dentro da transação, então ninguém mexeu na linha desde o update
+                    end = conn.execute(
+                        select(table.c.next_value).where(table.c.name == SEQUENCE_NAME)
+                    ).scalar_one()
+
+                return end - self.block_size, end
+
+            except IntegrityError:
+                # Outro processo criou a linha da sequência ao mesmo tempo
+                continue
+
+    def allocate(self):
+        # Precisa de app context só quando o bloco acaba
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve_block()
+
+            number = self._next
+            self._next += 1
+
+        if number >= CODE_SPACE:
+            raise RuntimeError('códigos de sala esgotados')
+
+        return encode(scramble(number))
+
+
+room_codes = RoomCodeAllocator()
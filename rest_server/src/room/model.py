@@ -0,0 +1,132 @@
+from src.data import RoomState, GPT_ENTRY_PROMPT, GPT_SNIPPETS_TEMPLATE
+
+
+# Estado de uma sala ativa
+#
+# Classes com __slots__ no lugar dos dicts aninhados: sem um dict por objeto e
+# sem hashing de chave a cada acesso. Os snippets de cada rodada ficam guardados
+# uma vez só (Round.snippets), e as mensagens enviadas para a IA são montadas
+# a partir deles quando preciso (Room.messages), em vez de ficarem duplicadas
+# num histórico de prompts.
+#
+# to_dict/from_dict dão a forma em JSON usada pelo Redis e pelos snapshots.
+
+
+class Member:
+    __slots__ = ('user_id', 'username', 'submitted', 'snippet')
+
+    def __init__(self, user_id, username, submitted=False, snippet=''):
+        self.user_id = user_id
+        self.username = username
+        self.submitted = submitted
+        self.snippet = snippet
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'submitted': self.submitted,
+            'snippet': self.snippet
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['user_id'], data['username'], data.get('submitted', False), data.get('snippet', ''))
+
+
+class Round:
+    __slots__ = ('number', 'snippets', 'story')
+
+    def __init__(self, number, snippets, story=None):
+        self.number = number
+        self.snippets = snippets    # tupla de (username, snippet), na ordem em que foram enviados
+        self.story = story          # resposta da IA, None enquanto não chega
+
+    def prompt(self):
+        snippets = ''.join(f"- {username}: {snippet}\n" for username, snippet in self.snippets)
+        return GPT_SNIPPETS_TEMPLATE.substitute(cround=self.number, snippets=snippets)
+
+    def messages(self):
+        messages = [{'role': 'user', 'content': self.prompt()}]
+        if self.story is not None:
+            messages.append({'role': 'assistant', 'content': self.story})
+        return messages
+
+    def to_dict(self):
+        return {
+            'number': self.number,
+            'snippets': [list(snippet) for snippet in self.snippets],
+            'story': self.story
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['number'], tuple(tuple(snippet) for snippet in data['snippets']), data.get('story'))
+
+
+class Room:
+    __slots__ = (
+        'room_id', 'room_name', 'room_state', 'members', 'pending',
+        'current_round', 'rounds', 'summary', 'compacting', 'game'
+    )
+
+    def __init__(self, room_id, room_name, room_state=RoomState.WAITING, members=None, pending=0,
+                 current_round=0, rounds=None, summary='', compacting=False, game=0):
+        self.room_id = room_id
+        self.room_name = room_name
+        self.room_state = room_state
+        self.members = members if members is not None else {}    # user_id -> Member
+        self.pending = pending
+        self.current_round = current_round
+        self.rounds = rounds if rounds is not None else []       # rodadas ainda não resumidas (src/llm/context.py)
+        self.summary = summary
+        self.compacting = compacting
+        self.game = game        # GameRoom.games do jogo atual, marca os trechos gravados
+
+    def next_game(self):
+        # Sala nova (ainda sem rodadas) começa outro jogo; uma retomada continua o mesmo
+        if self.current_round == 0:
+            self.game += 1
+        return self.game
+
+    def find_round(self, number):
+        for round_ in reversed(self.rounds):
+            if round_.number == number:
+                return round_
+        return None
+
+    def messages(self, rounds=None):
+        # Prompt de entrada + mensagens das rodadas (todas as não resumidas, por padrão)
+        messages = [{'role': 'developer', 'content': GPT_ENTRY_PROMPT}]
+        for round_ in self.rounds if rounds is None else rounds:
+            messages.extend(round_.messages())
+        return messages
+
+    def to_dict(self):
+        return {
+            'room_id': self.room_id,
+            'room_name': self.room_name,
+            'room_state': self.room_state.value,
+            'members': {user_id: member.to_dict() for user_id, member in self.members.items()},
+            'pending': self.pending,
+            'current_round': self.current_round,
+            'rounds': [round_.to_dict() for round_ in self.rounds],
+            'summary': self.summary,
+            'compacting': self.compacting,
+            'game': self.game
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            room_id=data['room_id'],
+            room_name=data['room_name'],
+            room_state=RoomState(data['room_state']),
+            members={int(user_id): Member.from_dict(member) for user_id, member in data.get('members', {}).items()},
+            pending=data.get('pending', 0),
+            current_round=data.get('current_round', 0),
+            rounds=[Round.from_dict(round_) for round_ in data.get('rounds', [])],
+            summary=data.get('summary', ''),
+            compacting=data.get('compacting', False),
+            game=data.get('game', 0)
+        )
@@ -1,26 +1,46 @@
 from flask import session, request
-import requests
-import os
-from flask_socketio import Namespace, emit, join_room, leave_room
+import threading
+import time
+from flask_socketio import Namespace, emit, leave_room
 from flask_jwt_extended import decode_token
-from models import User, db, GameRoom
+from models import GameRoom
 import json
 
 from src.data import (
-    ROOMS, USER_ROOM_MAP, RoomState, MAX_ROOM_SIZE, 
-    MAX_SNIPPET_SIZE, GPT_SNIPPETS_TEMPLATE, GPT_ENTRY_PROMPT
+    RoomState, MAX_ROOM_SIZE, 
+    MAX_SNIPPET_SIZE, GPT_THEME_PROMPT, STREAM_STORY, STORY_CHUNK_INTERVAL,
+    ROUND_TIMEOUT, READING_TIME
 )
 
-from src.data import ROOMS, USER_ROOM_MAP, RoomState, MAX_ROOM_SIZE, MAX_SNIPPET_SIZE, GPT_SNIPPETS_TEMPLATE
-from src.llm.gpt import submit_round
+from src.llm.gpt import submit_round, stream_round
+from src.llm.context import build_prompt, compact_history
+from src.llm.scheduler import llm_scheduler, PRIORITY_STORY, PRIORITY_BACKGROUND
+from src.media.jamendo import search_track
+from src.store.store import room_store
+from src.room.timer import room_timers
+from src.user_cache import user_cache
+from src.persistence import persistence
+from src.lobby.matchmaking import matchmaking
+from src.room.model import Room, Member, Round
+from src.room.snapshots import room_snapshots
+from src.room.actors import room_actors, MailboxFull
+from src.story import rebuild_room
+from src.store.base import (
+    JOIN_FULL, JOIN_NO_ROOM,
+    SUBMIT_ROUND_ENDED, SUBMIT_NOT_SNIPPETING, SUBMIT_NOT_MEMBER, SUBMIT_NO_ROOM
+)
 
 from src.log import logger
 
 
 class RoomNS(Namespace):
-    def __init__(self, namespace, socketio):
+    def __init__(self, namespace, socketio, app):
         super().__init__(namespace)
         self.socketio = socketio
+        self.app = app
+
+        self._rounds_lock = threading.Lock()
+        self._rounds_in_flight = 0   # rodadas esperando a IA (process_round)
 
     def _get_auth_info(self):
         user_id = session.get('user_id')
@@ -40,16 +60,27 @@ class RoomNS(Namespace):
     
         try:
             token_data = decode_token(token)
-            user_id = token_data['sub']
-            user = User.query.get(user_id)
-
-            if not user:
-                 raise ConnectionRefusedError('unauthorized - user not found')
+            user_id = int(token_data['sub'])
+
+            if user_cache.is_deleted(user_id):
+                raise ConnectionRefusedError('unauthorized - user not found')
+
+            if 'username' in token_data:
+                username = token_data['username']
+                is_guest = token_data.get('is_guest', False)
+            else:
+                # Token emitido antes das claims: busca no cache (ou no DB)
+                user = user_cache.get(user_id)
+                if not user:
+                    raise ConnectionRefusedError('unauthorized - user not found')
+                username = user['username']
+                is_guest = user['is_guest']
 
             # SALVA O ID E USERNAME NA SESSÃO DO SOCKET
-            session['user_id'] = user.id
-            session['username'] = user.username
-            logger.info(f'[ROOM] Conexão autenticada para {user.username} (ID: {user.id}) (sid: {request.sid})')
+            session['user_id'] = user_id
+            session['username'] = username
+            session['is_guest'] = is_guest
+            logger.info(f'[ROOM] Conexão autenticada para {username} (ID: {user_id}) (sid: {request.sid})')
             emit('connect_ack')
 
         except Exception as e:
@@ -83,53 +114,83 @@ class RoomNS(Namespace):
             logger.warning(f"room_id inválido recebido: {room_id_from_client}")
             return {'status': 'error', 'msg': 'room_id deve ser um número'}
 
-        game_room_db = GameRoom.query.get(room_id)
+        return self._join(user_id, username, room_id)
+
+    def on_quick_join(self, data=None):
+        user_id, username = self._get_auth_info()
+        if not user_id:
+            return {'status': 'error', 'msg': 'usuário não autenticado'}
+
+        if room_store.room_of(user_id) is not None:
+            return {'status': 'error', 'msg': 'Você já está em uma sala'}
+
+        # Lugar já segurado pelo POST /api/rooms/quick_join, ou um novo
+        room_id = matchmaking.held_room(user_id) or matchmaking.claim(user_id)
+        if room_id is None:
+            logger.info(f'[ROOM] Quick join de {username} (ID: {user_id}) sem sala disponível')
+            return {'status': 'error', 'msg': 'no room'}
+
+        logger.info(f'[ROOM {room_id}] Quick join de {username} (ID: {user_id})')
+        return self._join(user_id, username, room_id)
+
+    def _join(self, user_id, username, room_id):
+        try:
+            ack = room_actors.call(room_id, self._add_to_room, user_id, username, room_id, request.sid)
+        except MailboxFull as e:
+            logger.warning(f'[ROOM {room_id}] Entrada de {username} (ID: {user_id}) recusada: {e}')
+            ack = {'status': 'error', 'msg': 'Servidor ocupado, tente novamente', 'room_id': room_id}
+
+        if ack['status'] != 'ok' and matchmaking.held_room(user_id) == room_id:
+            matchmaking.release(user_id)
+            room_timers.cancel(('quick_join', user_id))
+        return ack
+
+    def _add_to_room(self, user_id, username, room_id, sid):
+        # Roda no worker da sala (src/room/actors.py). Sala já ativa não precisa do DB
+        if room_id not in room_store:
+            game_room_db = GameRoom.query.get(room_id)
+
+            if not game_room_db:
+                logger.warning(f'[ROOM] User {username} (ID: {user_id}) pediu para entrar na sala {room_id} (inexistente no DB)')
+                return {'status': 'error', 'msg': "A sala não existe.", 'room_id': room_id}
 
-        if not game_room_db:
-            logger.warning(f'[ROOM] User {username} (ID: {user_id}) pediu para entrar na sala {room_id} (inexistente no DB)')
-            return {'status': 'error', 'msg': "A sala não existe.", 'room_id': room_id}
-        
-        if room_id not in ROOMS:
             logger.info(f"[ROOM {room_id}] Sala '{game_room_db.room_code}' está inativa. Ativando e hidratando cache...")
-            ROOMS[room_id] = {
-                'room_id': game_room_db.id,
-                'room_name': game_room_db.room_code,
-                'room_state': RoomState.WAITING,
-                'room_members': {},
-                'pending': 0,
-                'timer': None,
-                'history': [],
-                'history_parsed': [{
-                    'role': 'developer',
-                    'content': GPT_ENTRY_PROMPT
-                }],
-                'current_round': 0
-            }
+            # Jogo interrompido por um reinício: volta do snapshot ou, sem ele, dos trechos no DB.
+            # Sala em LOBBY começa do zero, mesmo que já tenha sido jogada
+            room = None
+            if game_room_db.status == 'IN_PROGRESS':
+                room = room_snapshots.restore(room_id) or rebuild_room(game_room_db)
+            if room is None:
+                room_store.create(Room(game_room_db.id, game_room_db.room_code, game=game_room_db.games))
+            elif room_store.create(room):
+                logger.info(f"[ROOM {room_id}] Jogo retomado na rodada {room.current_round} ({len(room.rounds)} rodadas no contexto)")
         
-        if len(ROOMS[room_id]['room_members']) >= MAX_ROOM_SIZE:
+        # Adiciona o usuário (pelo ID do DB) à sala, checando a lotação na mesma operação
+        joined = room_store.add_member(room_id, user_id, Member(user_id, username), MAX_ROOM_SIZE)
+
+        if joined == JOIN_FULL:
             logger.warning(f'[ROOM] User {username} (ID: {user_id}) tentou entrar na sala {room_id} (cheia no cache)')
             return {'status': 'error', 'msg': 'A sala está cheia', 'room_id': room_id}
+
+        if joined == JOIN_NO_ROOM:
+            # A sala esvaziou e foi removida entre a criação e a entrada
+            logger.warning(f'[ROOM {room_id}] Sala removida enquanto {username} (ID: {user_id}) entrava')
+            return {'status': 'error', 'msg': 'Tente novamente', 'room_id': room_id}
+
+        logger.info(f'[ROOM {room_id}] User {username} (ID: {user_id}) entrou')
+        room_store.map_user(user_id, room_id)
+
+        room = room_store.get(room_id)
+        if room is not None:
+            matchmaking.set_room(room_id, len(room.members), room.room_state == RoomState.WAITING)
+        matchmaking.settle(user_id, room_id)
+        room_timers.cancel(('quick_join', user_id))
         
-        # O usuário já está na sala?
-        if user_id in ROOMS[room_id]['room_members']:
-             logger.info(f"[ROOM {room_id}] User {username} (ID: {user_id}) já está na sala.")
-        else:
-            logger.info(f'[ROOM {room_id}] User {username} (ID: {user_id}) entrou')
-
-        # Adiciona o usuário (pelo ID do DB) à sala (em memória)
-        ROOMS[room_id]['room_members'][user_id] = {
-            'user_id': user_id,
-            'username': username, # Armazena o username
-            'submitted': False,
-            'snippet': ''
-        }
-        USER_ROOM_MAP[user_id] = room_id
-        
-        # Cliente entra no canal da sala para broadcasts
-        join_room(room_id)
+        # Cliente entra no canal da sala para broadcasts, antes de qualquer outro evento da sala
+        self.socketio.server.enter_room(sid, room_id, namespace=self.namespace)
         
         # Avisa os outros que o usuário entrou
-        emit('status_update', {'msg': f'{username} entrou na sala.'}, to=room_id, include_self=False)
+        self.socketio.emit('status_update', {'msg': f'{username} entrou na sala.'}, to=room_id, skip_sid=sid, namespace=self.namespace)
 
         return {'status': 'ok', 'room_id': room_id}
 
@@ -164,87 +225,90 @@ class RoomNS(Namespace):
     def on_disconnect(self):
         user_id, username = self._get_auth_info()
 
-        if not user_id or user_id not in USER_ROOM_MAP:
+        room_id = room_store.room_of(user_id) if user_id else None
+        if room_id is None:
             logger.info(f"Disconnect de SID {request.sid} sem user_id mapeado.")
             return
 
-        room_id = USER_ROOM_MAP[user_id]
-        room = ROOMS.get(room_id)
-
         # Remove o cliente do canal de broadcast
         leave_room(room_id)
 
-        if room:
-            # Remove o usuário da lista de membros da sala
-            if user_id in room['room_members']:
-                room['room_members'].pop(user_id)
-            
+        room_actors.tell(room_id, self._remove_from_room, user_id, username, room_id, session.get('is_guest'))
+
+    def _remove_from_room(self, user_id, username, room_id, is_guest):
+        # Remove o usuário da lista de membros da sala (e a sala, se ficou vazia)
+        remaining = room_store.remove_member(room_id, user_id)
+
+        if remaining is not None:
             # Avisa os outros que o usuário saiu
-            emit('status_update', {'msg': f'{username} saiu.'}, to=room_id)
+            self.socketio.emit('status_update', {'msg': f'{username} saiu.'}, to=room_id, namespace=self.namespace)
             logger.info(f"User {username} (ID: {user_id}) removido da sala {room_id}")
 
-            if len(room['room_members']) == 0:
-                logger.info(f"[ROOM {room_id}] A sala está vazia. Removendo do cache de memória.")
-                ROOMS.pop(room_id, None)
+            if remaining:
+                room = room_store.get(room_id)
+                if room is not None:
+                    matchmaking.set_room(room_id, remaining, room.room_state == RoomState.WAITING)
+
+            if remaining == 0:
+                logger.info(f"[ROOM {room_id}] A sala está vazia. Removida do cache de memória.")
+                room_timers.cancel(room_id)
+                matchmaking.remove(room_id)
                 
-                try:
-                    game_room_db = GameRoom.query.get(room_id)
-                    if game_room_db:
-                        game_room_db.status = 'LOBBY'
-                        # game_room_db.final_story_text = ""
-                        db.session.commit()
-                except Exception as e:
-                    logger.error(f"Erro ao resetar status da sala {room_id} no DB: {e}")
-                    db.session.rollback()
-
-        # Remove o usuário do mapa global
-        if user_id in USER_ROOM_MAP:
-            USER_ROOM_MAP.pop(user_id)
+                persistence.set_room_status(room_id, 'LOBBY')
+                persistence.finish_story(room_id)
+
+        # Remove o usuário do mapa global (se já não entrou em outra sala)
+        if room_store.room_of(user_id) == room_id:
+            room_store.unmap_user(user_id)
         
-        try:
-            user = User.query.get(user_id)
-            if user and user.is_guest:
-                logger.info(f"Convidado {username} (ID: {user_id}) desconectou. Removendo do banco de dados.")
-                db.session.delete(user)
-                db.session.commit()
-                logger.info(f"Convidado {username} (ID: {user_id}) removido com sucesso.")
+        if not is_guest:
+            return
 
-        except Exception as e:
-            logger.error(f"Erro ao tentar remover convidado {user_id}: {e}")
-            db.session.rollback()
+        logger.info(f"Convidado {username} (ID: {user_id}) desconectou. Remoção do banco de dados agendada.")
+        persistence.delete_guest(user_id)
         
 
     def on_start_game(self):
         user_id, username = self._get_auth_info()
 
-        if not user_id or user_id not in USER_ROOM_MAP:
+        room_id = room_store.room_of(user_id) if user_id else None
+        if room_id is None:
             logger.warning(f'[ROOM] User {username} tried to start a game but is not in a room')
             return {'status': 'error', 'msg': 'not in room'}
 
-        room = ROOMS[USER_ROOM_MAP[user_id]]
+        try:
+            return room_actors.call(room_id, self._start_game, user_id, username, room_id)
+        except MailboxFull as e:
+            logger.warning(f'[ROOM {room_id}] Início do jogo recusado: {e}')
+            return {'status': 'error', 'msg': 'Servidor ocupado, tente novamente'}
+
+    def _start_game(self, user_id, username, room_id):
+        room = room_store.get(room_id)
+        if room is None:
+            logger.warning(f'[ROOM] User {username} tried to start a game but is not in a room')
+            return {'status': 'error', 'msg': 'not in room'}
 
-        if room['room_state'] != RoomState.WAITING:
-            logger.warning(f'[ROOM {USER_ROOM_MAP[user_id]}] User {username} tried to start a game but room state {room['room_state']}')
+        if room.room_state != RoomState.WAITING:
+            logger.warning(f'[ROOM {room_id}] User {username} tried to start a game but room state {room.room_state}')
             # return {'status': 'error', 'msg': 'room not waiting'}
 
-        logger.info(f'[ROOM {USER_ROOM_MAP[user_id]}] User {username} started the game')
+        logger.info(f'[ROOM {room_id}] User {username} started the game')
 
-        try:
-            game_room_db = GameRoom.query.get(USER_ROOM_MAP[user_id])
-            if game_room_db:
-                game_room_db.status = 'IN_PROGRESS'
-                db.session.commit()
-        except Exception as e:
-            logger.error(f"Erro ao atualizar status da sala {USER_ROOM_MAP[user_id]} no DB: {e}")
-            db.session.rollback()
+        game = room_store.update(room_id, Room.next_game)
+        if game is None:
+            return {'status': 'error', 'msg': 'not in room'}
 
-        self.start_game(USER_ROOM_MAP[user_id], user_id)
+        persistence.start_game(room_id, game)
+        matchmaking.remove(room_id)
+
+        self.start_game(room_id, user_id)
 
 
     def on_story_snippet(self, data): # ADICIONAR USUARIO
         user_id, username = self._get_auth_info()
 
-        if not user_id in USER_ROOM_MAP:
+        room_id = room_store.room_of(user_id) if user_id else None
+        if room_id is None:
             logger.warning(f'[ROOM] User {username} (ID: {user_id}) tentou enviar snippet mas não está em sala')
             return {'status': 'error', 'msg': 'Você não está em uma sala'}
 
@@ -260,195 +324,258 @@ class RoomNS(Namespace):
         if not snippet:
              return {'status': 'error', 'msg': 'Snippet não pode ser vazio'}
 
-        room = ROOMS[USER_ROOM_MAP[user_id]]
-        if room['room_state'] != RoomState.SNIPPETING:
-            logger.warning(f'[ROOM {USER_ROOM_MAP[user_id]}] User {username} tentou enviar snippet mas o estado é {room['room_state']}')
-            return {'status': 'error', 'msg': 'Não é hora de enviar snippets'}
-        
         if len(snippet) > MAX_SNIPPET_SIZE:
-            logger.warning(f'[ROOM {USER_ROOM_MAP[user_id]}] User {username} enviou snippet muito longo')
+            logger.warning(f'[ROOM {room_id}] User {username} enviou snippet muito longo')
             return {'status': 'error', 'msg': f'Snippet muito longo (max: {MAX_SNIPPET_SIZE})'}
 
-        members = room['room_members']
-        if not members[user_id]['submitted']:
-            members[user_id]['submitted'] = True
-            room['pending'] -= 1
+        try:
+            return room_actors.call(room_id, self._submit_snippet, user_id, username, room_id, snippet)
+        except MailboxFull as e:
+            logger.warning(f'[ROOM {room_id}] Snippet de {username} recusado: {e}')
+            return {'status': 'error', 'msg': 'Servidor ocupado, tente novamente'}
+
+    def _submit_snippet(self, user_id, username, room_id, snippet):
+        # Grava o snippet e decrementa 'pending'; no worker da sala, o fim da
+        # rodada só pode disparar uma vez
+        submitted = room_store.submit_snippet(room_id, user_id, snippet)
+
+        if submitted == SUBMIT_NOT_SNIPPETING:
+            logger.warning(f'[ROOM {room_id}] User {username} tentou enviar snippet fora da hora de snippets')
+            return {'status': 'error', 'msg': 'Não é hora de enviar snippets'}
 
-        members[user_id]['snippet'] = snippet
+        if submitted in (SUBMIT_NOT_MEMBER, SUBMIT_NO_ROOM):
+            logger.warning(f'[ROOM {room_id}] User {username} (ID: {user_id}) tentou enviar snippet mas não está na sala')
+            return {'status': 'error', 'msg': 'Você não está em uma sala'}
         
-        logger.info(f"[ROOM {USER_ROOM_MAP[user_id]}] Snippet recebido de {username} (ID: {user_id})")
+        logger.info(f"[ROOM {room_id}] Snippet recebido de {username} (ID: {user_id})")
 
-        emit('snippet_received', {'username': username}, to=USER_ROOM_MAP[user_id])
+        self.socketio.emit('snippet_received', {'username': username}, to=room_id, namespace=self.namespace)
 
-        if room['pending'] == 0:
-            self.end_round(USER_ROOM_MAP[user_id], 'all_snippets_received')
+        if submitted == SUBMIT_ROUND_ENDED:
+            self.end_round(room_id, 'all_snippets_received')
 
         return {'status': 'ok'}
     
 
     
     def start_game(self, room_id, user_id):
-        room = ROOMS[room_id]
+        room = room_store.get(room_id)
         
         logger.info(f'[ROOM {room_id}] O jogo começou')
         
         # Pega o username de quem iniciou
-        triggerer_username = room['room_members'].get(user_id, {}).get('username', 'Sistema')
+        triggerer = room.members.get(user_id)
+        triggerer_username = triggerer.username if triggerer else 'Sistema'
 
         # Emite para todos na sala (canal)
-        self.socketio.emit('game_started', {'triggerer': triggerer_username}, to=room_id)
+        self.socketio.emit('game_started', {'triggerer': triggerer_username}, to=room_id, namespace=self.namespace)
         self.start_round(room_id, 'game_start')
 
     def start_round(self, room_id, trigger = None):
-        room = ROOMS[room_id]
-        room['room_state'] = RoomState.SNIPPETING
-        room['pending'] = len(room['room_members'])
-        room['current_round'] += 1
+        current_round = room_store.start_round(room_id)
+        if current_round is None:
+            logger.info(f'[ROOM {room_id}] Sala não está mais ativa, rodada não iniciada ({trigger})')
+            return
         
-        logger.info(f'[ROOM {room_id}] Room started the round {room['current_round']} by trigger {trigger}')
+        logger.info(f'[ROOM {room_id}] Room started the round {current_round} by trigger {trigger}')
 
-        for member_id in room['room_members']:
-            room['room_members'][member_id]['submitted'] = False
-            room['room_members'][member_id]['snippet'] = ''
+        room_timers.arm(room_id, ROUND_TIMEOUT, room_actors.tell, room_id, self._round_timeout, room_id, current_round)
 
         self.socketio.emit('round_started', {
             'triggerer': trigger, 
-            'round': room['current_round']
-        }, to=room_id)
-        # TODO: Implementar timer
+            'round': current_round,
+            'timeout': ROUND_TIMEOUT
+        }, to=room_id, namespace=self.namespace)
+
+    def _round_timeout(self, room_id, current_round):
+        # Só fecha se a sala ainda está esperando snippets desta mesma rodada
+        if room_store.close_round(room_id, current_round):
+            self.end_round(room_id, 'timeout')
 
     def end_round(self, room_id, trigger):
-        room = ROOMS[room_id]
-        room['room_state'] = RoomState.RESPONSE
+        room_timers.cancel(room_id)
+        room_store.set_state(room_id, RoomState.RESPONSE)
+        room = room_store.get(room_id)
+        if room is None:
+            return
         
-        logger.info(f'[ROOM {room_id}] Room round {room['current_round']} ended by trigger {trigger}')
+        current_round = room.current_round
+        logger.info(f'[ROOM {room_id}] Room round {current_round} ended by trigger {trigger}')
         
-        members = room['room_members']
         snippets = []
-        history_registry = {
-            'round': room['current_round'],
-            'snippets': {}
-            }
+        segments = []
         
-        for member_id, member_data in members.items():
-            snippet = member_data['snippet']
-            username = member_data.get('username', member_id) # Usa username se tiver
-
-            history_registry['snippets'][username] = snippet # Salva no histórico com username
+        for member in room.members.values():
+            if not member.submitted:
+                continue
 
             snippets.append({
-                'sender_username': username,
-                'snippet': snippet
+                'sender_username': member.username,
+                'snippet': member.snippet
             })
 
-        room['history'].append(history_registry)
-        
-        self.socketio.emit('round_ended', {'snippets': snippets}, to=room_id)
-        self.socketio.start_background_task(self.process_round, room_id, snippets)
+            segments.append({
+                'kind': 'snippet',
+                'user_id': member.user_id,
+                'author_name': member.username,
+                'text_content': member.snippet
+            })
 
-    def process_round(self, room_id, snippets):
-        room = ROOMS[room_id]
-        current_round = room['current_round']
+        if not snippets:
+            logger.info(f'[ROOM {room_id}] Nenhum snippet recebido, reiniciando a rodada')
+            self.start_round(room_id, 'no_snippets')
+            return
 
-        snippets_str = ''
-        for snippet_data in snippets:
-            snippets_str += f"- {snippet_data['sender_username']}: {snippet_data['snippet']}\n"
-        
-        prompt = GPT_SNIPPETS_TEMPLATE.substitute(cround = current_round, snippets = snippets_str)
-        
-        room['history_parsed'].append({
-            'role': 'user',
-            'content': prompt
-        })
+        # Os snippets ficam guardados só na rodada, o prompt é montado a partir dela
+        round_ = Round(current_round, tuple((snippet['sender_username'], snippet['snippet']) for snippet in snippets))
+        room_store.update(room_id, lambda room: room.rounds.append(round_))
+        persistence.append_segments(room_id, room.game, current_round, segments)
+
+        room = room_store.get(room_id)
+        if room is None:
+            return
         
+        self.socketio.emit('round_ended', {'snippets': snippets}, to=room_id, namespace=self.namespace)
+        # O prompt é montado aqui, no worker da sala; a chamada da IA roda fora dele
+        with self._rounds_lock:
+            self._rounds_in_flight += 1
+        self.socketio.start_background_task(self.process_round, room_id, room.game, current_round, build_prompt(room))
+
+    def process_round(self, room_id, game, current_round, input_array):
+        try:
+            self._process_round(room_id, game, current_round, input_array)
+        finally:
+            with self._rounds_lock:
+                self._rounds_in_flight -= 1
+
+    def _process_round(self, room_id, game, current_round, input_array):
         try:
             logger.info(f"[ROOM {room_id}] Enviando prompt para a IA...")
-            response = submit_round(room['history_parsed']) 
-            
-            ia_text_response = response
-            
-            room['history_parsed'].append({
-                'role': 'assistant',
-                'content': ia_text_response
-            })
+            with llm_scheduler.slot(room_id, PRIORITY_STORY):
+                if STREAM_STORY:
+                    ia_text_response = self.stream_story(room_id, current_round, input_array)
+                else:
+                    ia_text_response = submit_round(input_array)
 
-            logger.info(f"[ROOM {room_id}] Resposta da IA recebida.")
-            logger.info(ia_text_response)
+        except Exception as e:
+            logger.error(f"[ROOM {room_id}] Erro ao processar a rodada com a IA: {e}")
+            room_actors.tell(room_id, self.fail_round, room_id)
+            return
 
-            theme = None
-            music_url = None
+        # A resposta volta para o worker da sala, junto com os outros eventos dela
+        room_actors.tell(room_id, self.finish_round, room_id, game, current_round, ia_text_response)
 
-            try:
-                theme_prompt = [
-                    {
-                        'role': 'system', 
-                        'content': (
-                            "Sua tarefa é extrair o 'clima' ou 'sentimento' de um texto. "
-                            "Forneça de 5 a 7 tags em inglês que descrevam o GÊNERO (ex: medieval fantasy, sci-fi) "
-                            ",os instrumentos a serem utilizados na musica e a EMOÇÃO (ex: epic, battle, sad, mysterious, rainy), não os objetos. "
-                            "EVITE tags de objetos literais como 'dragon', 'bard' ou 'sword'. "
-                            "Responda apenas com as tags separadas por vírgula."
-                        )
-                    },
-                    {'role': 'user', 'content': ia_text_response}
-                ]
-                tags_str = submit_round(theme_prompt).strip().lower()
-                theme = tags_str.replace(',', ' ').replace('  ', ' ')
-                logger.info(f"[ROOM {room_id}] Temas extraídos: {theme}")
-                
-            except Exception as e:
-                logger.warning(f"[ROOM {room_id}] Não foi possível extrair os temas: {e}")
+    def finish_round(self, room_id, game, current_round, ia_text_response):
+        def add_story(room):
+            round_ = room.find_round(current_round)
+            if round_ is not None:
+                round_.story = ia_text_response
 
-            try:
-                game_room_db = GameRoom.query.get(room_id)
-                if game_room_db:
-                    if game_room_db.final_story_text is None:
-                        game_room_db.final_story_text = ""
-                    game_room_db.final_story_text += f"\n\n--- Round {current_round} ---\n{ia_text_response}"
-                    db.session.commit()
+        room_store.update(room_id, add_story)
 
-            except Exception as e:
-                logger.error(f"Erro ao salvar história no DB da sala {room_id}: {e}")
-                db.session.rollback()
-                
+        logger.info(f"[ROOM {room_id}] Resposta da IA recebida.")
+        logger.info(ia_text_response)
 
-            if theme:
-                try:
-                    JAMENDO_CLIENT_ID = os.getenv('JAMENDO_CLIENT_ID')
-                    if JAMENDO_CLIENT_ID:
-                        jamendo_url = "https://api.jamendo.com/v3.0/tracks/"
-                        params = {
-                            'client_id': JAMENDO_CLIENT_ID,
-                            'format': 'json',
-                            'limit': 1,
-                            'search': theme,
-                            'order': 'relevance',
-                            'vocalinstrumental': 'instrumental'
-                        }
-                        r = requests.get(jamendo_url, params=params, timeout=5)
-                        r.raise_for_status()
-                        jamendo_data = r.json()
-                        
-                        if jamendo_data.get('results') and len(jamendo_data['results']) > 0:
-                            music_url = jamendo_data['results'][0].get('audio')
-                            logger.info(f"[ROOM {room_id}] URL de música do Jamendo encontrada: {music_url}")
-                        else:
-                            logger.warning(f"[ROOM {room_id}] Nenhuma música encontrada no Jamendo para o tema: {theme}")
-                    else:
-                        logger.warning(f"[ROOM {room_id}] JAMENDO_CLIENT_ID não configurada. Pulando música.")
-                except Exception as e:
-                    logger.error(f"[ROOM {room_id}] Erro ao chamar API do Jamendo: {e}")
-
-
-            self.socketio.emit('new_story_part', {
-                'text': ia_text_response,
-                'music_url': music_url
-            }, to=room_id)
-            
+        self.socketio.emit('new_story_part', {
+            'round': current_round,
+            'text': ia_text_response
+        }, to=room_id, namespace=self.namespace)
+        
+        if READING_TIME > 0:
+            room_store.set_state(room_id, RoomState.READING)
+            room_timers.arm(room_id, READING_TIME, room_actors.tell, room_id, self.start_round, room_id, 'reading_timeout')
+        else:
             self.start_round(room_id, 'ia_finished')
 
+        # Pós-processamento fora do caminho crítico: a próxima rodada já começou
+        persistence.append_segments(room_id, game, current_round, [{
+            'kind': 'ai',
+            'user_id': None,
+            'author_name': None,
+            'text_content': ia_text_response
+        }])
+        self.socketio.start_background_task(self.fetch_story_media, room_id, current_round, ia_text_response)
+        self.socketio.start_background_task(compact_history, room_id)
+
+    def fail_round(self, room_id):
+        self.socketio.emit('error', {'msg': 'Erro na IA, a rodada será reiniciada.'}, to=room_id, namespace=self.namespace)
+        self.start_round(room_id, 'ia_error')
+
+    def drain(self, timeout):
+        # Encerramento do processo: espera as rodadas com a IA e as respostas
+        # ainda na caixa das salas. Retorna quantas rodadas ficaram sem resposta
+        deadline = time.monotonic() + timeout
+        while (self._rounds_in_flight or room_actors.pending()) and time.monotonic() < deadline:
+            self.socketio.sleep(0.1)
+        return self._rounds_in_flight
+
+    def notify_llm_queue(self, room_id, position, eta):
+        self.socketio.emit('llm_queue', {
+            'position': position,
+            'eta': eta
+        }, to=room_id, namespace=self.namespace)
+
+    def stream_story(self, room_id, current_round, input_array):
+        # Repassa o texto da IA para a sala conforme chega, agrupando os pedaços
+        # para não mandar um evento por token
+        parts = []
+        buffer = ''
+        index = 0
+        last_emit = time.monotonic()
+
+        for chunk in stream_round(input_array):
+            parts.append(chunk)
+            buffer += chunk
+
+            now = time.monotonic()
+            if now - last_emit >= STORY_CHUNK_INTERVAL:
+                self.socketio.emit('story_chunk', {
+                    'round': current_round,
+                    'index': index,
+                    'text': buffer
+                }, to=room_id, namespace=self.namespace)
+                buffer = ''
+                index += 1
+                last_emit = now
+
+        if buffer:
+            self.socketio.emit('story_chunk', {
+                'round': current_round,
+                'index': index,
+                'text': buffer
+            }, to=room_id, namespace=self.namespace)
+
+        return ''.join(parts)
+
+    def fetch_story_media(self, room_id, current_round, ia_text_response):
+        theme = None
+        music_url = None
+
+        try:
+            theme_prompt = [
+                {'role': 'system', 'content': GPT_THEME_PROMPT},
+                {'role': 'user', 'content': ia_text_response}
+            ]
+            with llm_scheduler.slot(room_id, PRIORITY_BACKGROUND):
+                tags_str = submit_round(theme_prompt).strip().lower()
+            theme = tags_str.replace(',', ' ').replace('  ', ' ')
+            logger.info(f"[ROOM {room_id}] Temas extraídos: {theme}")
+
         except Exception as e:
-            logger.error(f"[ROOM {room_id}] Erro ao processar a rodada com a IA: {e}")
-            
-            self.socketio.emit('error', {'msg': 'Erro na IA, a rodada será reiniciada.'}, to=room_id)
-            self.start_round(room_id, 'ia_error')
\ No newline at end of file
+            logger.warning(f"[ROOM {room_id}] Não foi possível extrair os temas: {e}")
+
+        if theme:
+            try:
+                music_url = search_track(theme)
+                if music_url:
+                    logger.info(f"[ROOM {room_id}] URL de música do Jamendo encontrada: {music_url}")
+                else:
+                    logger.warning(f"[ROOM {room_id}] Nenhuma música encontrada no Jamendo para o tema: {theme}")
+            except Exception as e:
+                logger.error(f"[ROOM {room_id}] Erro ao chamar API do Jamendo: {e}")
+
+        self.socketio.emit('story_media', {
+            'round': current_round,
+            'theme': theme,
+            'music_url': music_url
+        }, to=room_id, namespace=self.namespace)
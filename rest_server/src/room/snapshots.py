@@ -0,0 +1,222 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from src.data import (
+    RoomState, SNAPSHOT_PATH, SNAPSHOT_INTERVAL,
+    SNAPSHOT_COMPACT_RATIO, SNAPSHOT_COMPACT_MIN, SNAPSHOT_MAX_AGE
+)
+from src.room.model import Room
+from src.store.store import room_store
+
+from src.log import logger
+
+
+# Snapshots das salas ativas, para não perder os jogos quando o processo reinicia
+#
+# Log só de acréscimo (JSONL), uma linha por versão de sala:
+#   <room_id>\t<timestamp>\t<Room.to_dict em JSON>
+#   <room_id>\t<timestamp>\t                        (sala encerrada)
+#
+# A cada SNAPSHOT_INTERVAL só as salas que mudaram (pelo _fingerprint, sem
+# serializar) são copiadas e ganham uma linha nova.
+# Quando o arquivo passa de SNAPSHOT_COMPACT_RATIO linhas por sala, ele é
+# reescrito com só a última versão de cada uma.
+#
+# Ao subir, o arquivo é lido sem decodificar as salas; cada uma só vira um
+# Room no primeiro join_room (restore). Os membros não são restaurados: os
+# jogadores entram de novo e a sala volta em WAITING, com rodadas e resumo.
+#
+# Só faz sentido com o room_store em memória (o Redis já guarda o estado).
+
+
+def _fingerprint(room):
+    last = room.rounds[-1] if room.rounds else None
+    return (
+        room.room_state, room.game, room.current_round, len(room.rounds), len(room.summary),
+        last.number if last else None, last.story is not None if last else False
+    )
+
+
+class RoomSnapshotLog:
+    def __init__(self, path=SNAPSHOT_PATH, interval=SNAPSHOT_INTERVAL,
+                 compact_ratio=SNAPSHOT_COMPACT_RATIO, compact_min=SNAPSHOT_COMPACT_MIN, max_age=SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.interval = interval
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._entries = {}          # room_id -> (timestamp, json) da última versão
+        self._fingerprints = {}     # room_id -> _fingerprint das salas ativas já gravadas
+        self._file = None
+        self._lines = 0
+        self._running = False
+
+        self._written = 0
+        self._restored = 0
+        self._compactions = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path) and room_store.name == 'memory'
+
+    def load(self):
+        # Lê o log (sem decodificar as salas) e abre para acrescentar
+        if not self.enabled:
+            return 0
+
+        started = time.monotonic()
+        entries = {}
+        lines = 0
+
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t', 2)
+                    if len(parts) != 3:
+                        continue    # linha cortada por uma queda no meio da escrita
+
+                    lines += 1
+                    room_id, saved_at, data = parts
+                    if data:
+                        entries[int(room_id)] = (float(saved_at), data)
+                    else:
+                        entries.pop(int(room_id), None)
+
+        with self._lock:
+            self._entries = entries
+            self._lines = lines
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+        logger.info(f"[SNAPSHOT] {len(entries)} salas no log ({lines} linhas) lidas em {time.monotonic() - started:.3f}s")
+        return len(entries)
+
+    def restore(self, room_id):
+        # Room salvo da sala (sem membros, em WAITING) ou None
+        with self._lock:
+            entry = self._entries.get(room_id)
+        if entry is None:
+            return None
+
+        try:
+            room = Room.from_dict(json.loads(entry[1]))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"[SNAPSHOT] Snapshot inválido da sala {room_id}: {e}")
+            return None
+
+        room.members = {}
+        room.pending = 0
+        room.compacting = False
+        room.room_state = RoomState.WAITING
+
+        self._restored += 1
+        return room
+
+    def start(self, socketio):
+        if self._running or not self.enabled:
+            return
+        self._running = True
+        if self._file is None:
+            self.load()
+        atexit.register(self.snapshot)
+        socketio.start_background_task(self._run, socketio)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self, socketio):
+        while self._running:
+            socketio.sleep(self.interval)
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"[SNAPSHOT] Erro ao gravar snapshot: {e}")
+
+    def snapshot(self):
+        # Acrescenta as salas que mudaram desde o último snapshot, retorna quantas linhas gravou
+        if self._file is None:
+            return 0
+
+        now = time.time()
+        lines = []
+        live = set(room_store.room_ids())
+
+        for room_id in live:
+            # O fingerprint é lido direto da sala (store em memória, sem cópia nem lock);
+            # só as salas que mudaram são copiadas, sob o lock do store
+            room = room_store.get(room_id)
+            if room is None or self._fingerprints.get(room_id) == _fingerprint(room):
+                continue
+
+            copy = room_store.update(room_id, lambda room: (_fingerprint(room), room.to_dict()))
+            if copy is None:
+                continue
+
+            fingerprint, data = copy
+
+            self._fingerprints[room_id] = fingerprint
+            lines.append((room_id, now, json.dumps(data, separators=(',', ':'))))
+
+        # Salas que estavam ativas e foram encerradas
+        for room_id in [room_id for room_id in self._fingerprints if room_id not in live]:
+            del self._fingerprints[room_id]
+            lines.append((room_id, now, ''))
+
+        if not lines:
+            return 0
+
+        with self._lock:
+            for room_id, saved_at, data in lines:
+                if data:
+                    self._entries[room_id] = (saved_at, data)
+                else:
+                    self._entries.pop(room_id, None)
+                self._file.write(f'{room_id}\t{saved_at}\t{data}\n')
+            self._file.flush()
+
+            self._lines += len(lines)
+            self._written += len(lines)
+
+            if self._lines > max(self.compact_min, len(self._entries) * self.compact_ratio):
+                self._compact(now)
+
+        return len(lines)
+
+    def _compact(self, now):
+        # Reescreve o log só com a última versão de cada sala (chamado com o lock)
+        live = self._fingerprints
+        self._entries = {
+            room_id: entry for room_id, entry in self._entries.items()
+            if room_id in live or now - entry[0] < self.max_age
+        }
+
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for room_id, (saved_at, data) in self._entries.items():
+                f.write(f'{room_id}\t{saved_at}\t{data}\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._file.close()
+        os.replace(tmp, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lines = len(self._entries)
+        self._compactions += 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'rooms': len(self._entries),
+                'lines': self._lines,
+                'written': self._written,
+                'restored': self._restored,
+                'compactions': self._compactions,
+            }
+
+
+room_snapshots = RoomSnapshotLog(path=os.getenv('MAKEASTORY_SNAPSHOT_PATH', SNAPSHOT_PATH))
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from src.data import TIMER_TICK, TIMER_WHEEL_SLOTS
+
+from src.log import logger
+
+
+# Prazos das salas (rodada, leitura) em uma única roda de timers
+#
+# Cada slot da roda guarda os timers que vencem naquele tick (módulo o tamanho
+# da roda), com o número de voltas que ainda faltam. Armar e cancelar são O(1)
+# e uma única tarefa de fundo avança a roda, sem uma greenlet por sala.
+# Cada chave (ex: room_id) tem no máximo um timer, armar de novo substitui o anterior.
+
+
+class _Timer:
+    __slots__ = ('key', 'slot', 'rounds', 'callback', 'args')
+
+    def __init__(self, key, slot, rounds, callback, args):
+        self.key = key
+        self.slot = slot
+        self.rounds = rounds
+        self.callback = callback
+        self.args = args
+
+
+class TimerWheel:
+    def __init__(self, tick=TIMER_TICK, slots=TIMER_WHEEL_SLOTS):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        self.timers = {}
+
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._started = None
+        self._ticks = 0
+        self._running = False
+        self._fired = 0
+
+    def arm(self, key, delay, callback, *args):
+        with self._lock:
+            self._cancel(key)
+
+            ticks = max(1, int(-(-delay // self.tick)))
+            slot = (self._cursor + ticks) % len(self.slots)
+            timer = _Timer(key, slot, (ticks - 1) // len(self.slots), callback, args)
+
+            self.slots[slot][key] = timer
+            self.timers[key] = timer
+
+    def cancel(self, key):
+        with self._lock:
+            return self._cancel(key)
+
+    def _cancel(self, key):
+        timer = self.timers.pop(key, None)
+        if timer is None:
+            return False
+
+        del self.slots[timer.slot][key]
+        return True
+
+    def advance(self):
+        # Avança um tick e retorna os timers vencidos (já removidos da roda)
+        with self._lock:
+            self._cursor = (self._cursor + 1) % len(self.slots)
+            slot = self.slots[self._cursor]
+
+            expired = []
+            for key, timer in list(slot.items()):
+                if timer.rounds > 0:
+                    timer.rounds -= 1
+                    continue
+
+                del slot[key]
+                del self.timers[key]
+                expired.append(timer)
+
+            return expired
+
+    def start(self, socketio):
+        if self._running:
+            return
+        self._running = True
+        socketio.start_background_task(self._run, socketio)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self, socketio):
+        self._started = time.monotonic()
+
+        while self._running:
+            socketio.sleep(self.tick)
+
+            # Se a tarefa atrasou, avança todos os ticks perdidos
+            due = int((time.monotonic() - self._started) / self.tick)
+            while self._ticks < due:
+                self._ticks += 1
+                for timer in self.advance():
+                    self._fire(timer)
+
+    def _fire(self, timer):
+        self._fired += 1
+        try:
+            timer.callback(*timer.args)
+        except Exception as e:
+            logger.error(f"Erro no timer {timer.key}: {e}")
+
+    def metrics(self):
+        return {
+            'armed': len(self.timers),
+            'fired': self._fired,
+            'tick': self.tick,
+        }
+
+
+room_timers = TimerWheel()
@@ -0,0 +1,110 @@
+# Interface do armazenamento do estado das salas (ROOMS / USER_ROOM_MAP)
+#
+# Cada sala é um Room (src/room/model.py), os membros são Member.
+# Os campos room_state, pending, current_round e members só mudam pelas
+# operações atômicas abaixo, o resto da sala (rodadas, resumo...) muda por
+# update(), que faz ler-modificar-gravar de forma atômica.
+#
+# Lugares segurados pelo quick join (hold_seat) ficam no armazenamento, não só
+# no índice do processo (src/lobby/matchmaking.py): add_member conta os lugares
+# segurados por outros usuários na lotação, então um join_room direto não pega
+# o lugar de quem está a caminho. Um lugar segurado vence sozinho depois de ttl.
+
+SUBMIT_OK = 'ok'
+SUBMIT_ROUND_ENDED = 'round_ended'          # foi este snippet que fechou a rodada
+SUBMIT_NOT_SNIPPETING = 'not_snippeting'
+SUBMIT_NOT_MEMBER = 'not_member'
+SUBMIT_NO_ROOM = 'missing'
+
+JOIN_OK = 'ok'
+JOIN_FULL = 'full'
+JOIN_NO_ROOM = 'missing'
+
+
+class RoomStore:
+    name = 'base'
+
+    def get(self, room_id):
+        # Cópia da sala (ou a própria, no backend em memória), None se não existe
+        raise NotImplementedError
+
+    def __contains__(self, room_id):
+        return self.get(room_id) is not None
+
+    def room_ids(self):
+        raise NotImplementedError
+
+    def create(self, room):
+        # Cria a sala se ainda não existe, retorna True se criou
+        raise NotImplementedError
+
+    def delete(self, room_id):
+        raise NotImplementedError
+
+    def update(self, room_id, fn):
+        # Aplica fn(room) e grava os campos que não são atômicos, retorna o que fn retornar.
+        # fn pode ser chamada mais de uma vez se houver conflito, então não deve ter efeitos colaterais
+        raise NotImplementedError
+
+    def set_state(self, room_id, state):
+        raise NotImplementedError
+
+    def add_member(self, room_id, user_id, member, max_size):
+        # Entra se membros + lugares segurados por outros < max_size (JOIN_FULL se não).
+        # O lugar segurado pelo próprio usuário vira o lugar dele
+        raise NotImplementedError
+
+    def hold_seat(self, room_id, user_id, max_size, ttl):
+        # Segura um lugar para user_id por ttl segundos, com a mesma lotação de add_member
+        raise NotImplementedError
+
+    def release_seat(self, room_id, user_id):
+        raise NotImplementedError
+
+    def remove_member(self, room_id, user_id):
+        # Remove o membro e apaga a sala se ela ficou vazia, retorna quantos sobraram (None se não existe)
+        raise NotImplementedError
+
+    def submit_snippet(self, room_id, user_id, snippet):
+        # Grava o snippet e decrementa pending na primeira submissão do membro.
+        # Quando pending chega a 0 a sala passa para RESPONSE e retorna SUBMIT_ROUND_ENDED
+        raise NotImplementedError
+
+    def close_round(self, room_id, current_round):
+        # Passa a sala para RESPONSE se ela ainda está em SNIPPETING na rodada current_round.
+        # Retorna True só para quem fechou a rodada (usado pelo timeout)
+        raise NotImplementedError
+
+    def start_round(self, room_id):
+        # Limpa os snippets, pending = número de membros, estado SNIPPETING, retorna a nova rodada
+        raise NotImplementedError
+
+    def map_user(self, user_id, room_id):
+        raise NotImplementedError
+
+    def unmap_user(self, user_id):
+        raise NotImplementedError
+
+    def room_of(self, user_id):
+        raise NotImplementedError
+
+    def heartbeat(self, ttl):
+        # Marca este processo como vivo por ttl segundos (só importa com vários processos)
+        pass
+
+    def suspect_members(self):
+        # (room_id, user_id) que parecem abandonados: membro de uma sala mapeado para
+        # outra (ou para nenhuma), ou mapeamento de um processo que parou de dar heartbeat
+        suspects = []
+        for room_id in self.room_ids():
+            room = self.get(room_id)
+            for user_id in (room.members if room else {}):
+                if self.room_of(user_id) != room_id:
+                    suspects.append((room_id, user_id))
+        return suspects
+
+    def release_member(self, room_id, user_id):
+        # Confere de novo e, se ainda abandonado, remove o membro (e a sala, se vazia) e o
+        # mapeamento para esta sala. Retorna quantos membros sobraram (-1 se a sala não
+        # existe), None se o usuário está ativo e nada foi removido
+        raise NotImplementedError
@@ -0,0 +1,189 @@
+import threading
+import time
+
+from src.data import ROOMS, USER_ROOM_MAP, RoomState
+from src.store.base import (
+    RoomStore,
+    SUBMIT_OK, SUBMIT_ROUND_ENDED, SUBMIT_NOT_SNIPPETING, SUBMIT_NOT_MEMBER, SUBMIT_NO_ROOM,
+    JOIN_OK, JOIN_FULL, JOIN_NO_ROOM
+)
+
+
+class MemoryRoomStore(RoomStore):
+    name = 'memory'
+
+    def __init__(self, rooms=ROOMS, user_rooms=USER_ROOM_MAP):
+        self.rooms = rooms
+        self.user_rooms = user_rooms
+        self.holds = {}         # room_id -> {user_id: vence em (time.monotonic)}
+        self._lock = threading.RLock()
+
+    def _live_holds(self, room_id):
+        # Lugares segurados ainda válidos (os vencidos saem); precisa do _lock
+        holds = self.holds.get(room_id, {})
+        now = time.monotonic()
+        for user_id in [user_id for user_id, expires in holds.items() if expires <= now]:
+            del holds[user_id]
+        return holds
+
+    def _drop_room(self, room_id):
+        self.rooms.pop(room_id, None)
+        self.holds.pop(room_id, None)
+
+    def get(self, room_id):
+        return self.rooms.get(room_id)
+
+    def __contains__(self, room_id):
+        return room_id in self.rooms
+
+    def room_ids(self):
+        return list(self.rooms)
+
+    def create(self, room):
+        with self._lock:
+            if room.room_id in self.rooms:
+                return False
+            self.rooms[room.room_id] = room
+            return True
+
+    def delete(self, room_id):
+        with self._lock:
+            self._drop_room(room_id)
+
+    def update(self, room_id, fn):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return None
+            return fn(room)
+
+    def set_state(self, room_id, state):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is not None:
+                room.room_state = state
+
+    def add_member(self, room_id, user_id, member, max_size):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return JOIN_NO_ROOM
+
+            members = room.members
+            holds = self._live_holds(room_id)
+            held = len(holds) - (user_id in holds)
+            if user_id not in members and len(members) + held >= max_size:
+                return JOIN_FULL
+
+            members[user_id] = member
+            self._release_seat(room_id, user_id)
+            return JOIN_OK
+
+    def hold_seat(self, room_id, user_id, max_size, ttl):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return JOIN_NO_ROOM
+
+            holds = self._live_holds(room_id)
+            if user_id not in holds and len(room.members) + len(holds) >= max_size:
+                return JOIN_FULL
+
+            self.holds[room_id] = holds
+            holds[user_id] = time.monotonic() + ttl
+            return JOIN_OK
+
+    def release_seat(self, room_id, user_id):
+        with self._lock:
+            self._release_seat(room_id, user_id)
+
+    def _release_seat(self, room_id, user_id):
+        holds = self.holds.get(room_id)
+        if holds is not None:
+            holds.pop(user_id, None)
+            if not holds:
+                del self.holds[room_id]
+
+    def remove_member(self, room_id, user_id):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return None
+
+            room.members.pop(user_id, None)
+            remaining = len(room.members)
+            if remaining == 0:
+                self._drop_room(room_id)
+            return remaining
+
+    def submit_snippet(self, room_id, user_id, snippet):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return SUBMIT_NO_ROOM
+            if room.room_state != RoomState.SNIPPETING:
+                return SUBMIT_NOT_SNIPPETING
+
+            member = room.members.get(user_id)
+            if member is None:
+                return SUBMIT_NOT_MEMBER
+
+            member.snippet = snippet
+            if member.submitted:
+                return SUBMIT_OK
+
+            member.submitted = True
+            room.pending -= 1
+            if room.pending > 0:
+                return SUBMIT_OK
+
+            room.room_state = RoomState.RESPONSE
+            return SUBMIT_ROUND_ENDED
+
+    def close_round(self, room_id, current_round):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None or room.room_state != RoomState.SNIPPETING or room.current_round != current_round:
+                return False
+
+            room.room_state = RoomState.RESPONSE
+            return True
+
+    def start_round(self, room_id):
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return None
+
+            for member in room.members.values():
+                member.submitted = False
+                member.snippet = ''
+
+            room.room_state = RoomState.SNIPPETING
+            room.pending = len(room.members)
+            room.current_round += 1
+            return room.current_round
+
+    def map_user(self, user_id, room_id):
+        self.user_rooms[user_id] = room_id
+
+    def unmap_user(self, user_id):
+        return self.user_rooms.pop(user_id, None)
+
+    def room_of(self, user_id):
+        return self.user_rooms.get(user_id)
+
+    def release_member(self, room_id, user_id):
+        # Um processo só: o mapeamento é a prova de que o usuário está conectado
+        with self._lock:
+            if self.user_rooms.get(user_id) == room_id:
+                return None
+            room = self.rooms.get(room_id)
+            if room is None:
+                return -1
+
+            room.members.pop(user_id, None)
+            remaining = len(room.members)
+            if remaining == 0:
+                self._drop_room(room_id)
+            return remaining
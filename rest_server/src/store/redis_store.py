@@ -0,0 +1,365 @@
+import json
+import math
+import time
+import uuid
+
+from src.data import RoomState
+from src.room.model import Room
+from src.store.base import RoomStore
+
+
+# Estado das salas em um servidor que fala o protocolo do Redis, compartilhado
+# entre vários processos do servidor.
+#
+#   mas:rooms                   set com os ids das salas ativas
+#   mas:room:<id>               hash: data (Room.to_dict sem os campos atômicos), state, pending, current_round
+#   mas:room:<id>:members       hash: user_id -> Member.to_dict (JSON)
+#   mas:room:<id>:holds         hash: user_id -> quando o lugar segurado vence (time.time)
+#   mas:user_room               hash: user_id -> room_id
+#   mas:user_worker             hash: user_id -> processo que tem o socket do usuário
+#   mas:worker:<id>             existe enquanto o processo dá heartbeat (expira sozinho)
+#
+# As operações atômicas rodam como scripts Lua no servidor.
+#
+# Se um processo cai, o on_disconnect dos seus usuários nunca roda: os membros
+# e os mapeamentos ficam no Redis. O heartbeat mostra quais processos estão
+# vivos, e o reaper libera o que era dos que pararam (release_member).
+
+ROOMS_KEY = 'mas:rooms'
+USER_ROOM_KEY = 'mas:user_room'
+USER_WORKER_KEY = 'mas:user_worker'
+WORKER_PREFIX = 'mas:worker:'
+
+ATOMIC_FIELDS = ('members', 'room_state', 'pending', 'current_round')
+
+CREATE_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], 'data', ARGV[1], 'state', ARGV[2], 'pending', ARGV[3], 'current_round', ARGV[4])
+redis.call('SADD', KEYS[3], ARGV[5])
+return 1
+'''
+
+# Conta os lugares segurados que ainda valem e tira os vencidos
+LIVE_HOLDS = '''
+local function live_holds(key, now)
+    local holds = redis.call('HGETALL', key)
+    local count = 0
+    for i = 1, #holds, 2 do
+        if tonumber(holds[i + 1]) <= now then
+            redis.call('HDEL', key, holds[i])
+        else
+            count = count + 1
+        end
+    end
+    return count
+end
+'''
+
+ADD_MEMBER_SCRIPT = LIVE_HOLDS + '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'missing' end
+local held = live_holds(KEYS[3], tonumber(ARGV[4])) - redis.call('HEXISTS', KEYS[3], ARGV[1])
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 0 and redis.call('HLEN', KEYS[2]) + held >= tonumber(ARGV[3]) then
+    return 'full'
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HDEL', KEYS[3], ARGV[1])
+return 'ok'
+'''
+
+HOLD_SEAT_SCRIPT = LIVE_HOLDS + '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'missing' end
+local held = live_holds(KEYS[3], tonumber(ARGV[3]))
+if redis.call('HEXISTS', KEYS[3], ARGV[1]) == 0 and redis.call('HLEN', KEYS[2]) + held >= tonumber(ARGV[2]) then
+    return 'full'
+end
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+return 'ok'
+'''
+
+REMOVE_MEMBER_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+redis.call('HDEL', KEYS[2], ARGV[1])
+local remaining = redis.call('HLEN', KEYS[2])
+if remaining == 0 then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('SREM', KEYS[3], ARGV[2])
+end
+return remaining
+'''
+
+SUBMIT_SCRIPT = '''
+local state = redis.call('HGET', KEYS[1], 'state')
+if not state then return 'missing' end
+if state ~= ARGV[3] then return 'not_snippeting' end
+
+local raw = redis.call('HGET', KEYS[2], ARGV[1])
+if not raw then return 'not_member' end
+
+local member = cjson.decode(raw)
+local first = not member['submitted']
+member['snippet'] = ARGV[2]
+member['submitted'] = true
+redis.call('HSET', KEYS[2], ARGV[1], cjson.encode(member))
+
+if not first then return 'ok' end
+if redis.call('HINCRBY', KEYS[1], 'pending', -1) > 0 then return 'ok' end
+
+redis.call('HSET', KEYS[1], 'state', ARGV[4])
+return 'round_ended'
+'''
+
+START_ROUND_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+local members = redis.call('HGETALL', KEYS[2])
+local count = 0
+for i = 1, #members, 2 do
+    local member = cjson.decode(members[i + 1])
+    member['submitted'] = false
+    member['snippet'] = ''
+    redis.call('HSET', KEYS[2], members[i], cjson.encode(member))
+    count = count + 1
+end
+redis.call('HSET', KEYS[1], 'state', ARGV[1], 'pending', count)
+return redis.call('HINCRBY', KEYS[1], 'current_round', 1)
+'''
+
+CLOSE_ROUND_SCRIPT = '''
+if redis.call('HGET', KEYS[1], 'state') ~= ARGV[1] then return 0 end
+if redis.call('HGET', KEYS[1], 'current_round') ~= ARGV[2] then return 0 end
+redis.call('HSET', KEYS[1], 'state', ARGV[3])
+return 1
+'''
+
+# Não recria uma sala que já foi apagada
+SET_STATE_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], 'state', ARGV[1])
+return 1
+'''
+
+# Só remove se o usuário não está mapeado para esta sala num processo vivo
+RELEASE_MEMBER_SCRIPT = '''
+local mapped = redis.call('HGET', KEYS[4], ARGV[1])
+local owner = redis.call('HGET', KEYS[5], ARGV[1])
+if mapped == ARGV[2] and owner and redis.call('EXISTS', ARGV[3] .. owner) == 1 then return -2 end
+
+if mapped == ARGV[2] then
+    redis.call('HDEL', KEYS[4], ARGV[1])
+    redis.call('HDEL', KEYS[5], ARGV[1])
+end
+
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+redis.call('HDEL', KEYS[2], ARGV[1])
+local remaining = redis.call('HLEN', KEYS[2])
+if remaining == 0 then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('SREM', KEYS[3], ARGV[2])
+end
+return remaining
+'''
+
+
+def _room_key(room_id):
+    return f'mas:room:{room_id}'
+
+def _members_key(room_id):
+    return f'mas:room:{room_id}:members'
+
+def _holds_key(room_id):
+    return f'mas:room:{room_id}:holds'
+
+
+class RedisRoomStore(RoomStore):
+    name = 'redis'
+
+    def __init__(self, url):
+        import redis
+
+        self._redis_module = redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+
+        self._create = self.redis.register_script(CREATE_SCRIPT)
+        self._add_member = self.redis.register_script(ADD_MEMBER_SCRIPT)
+        self._hold_seat = self.redis.register_script(HOLD_SEAT_SCRIPT)
+        self._remove_member = self.redis.register_script(REMOVE_MEMBER_SCRIPT)
+        self._submit = self.redis.register_script(SUBMIT_SCRIPT)
+        self._start_round = self.redis.register_script(START_ROUND_SCRIPT)
+        self._set_state = self.redis.register_script(SET_STATE_SCRIPT)
+        self._close_round = self.redis.register_script(CLOSE_ROUND_SCRIPT)
+        self._release_member = self.redis.register_script(RELEASE_MEMBER_SCRIPT)
+
+        self.worker_id = uuid.uuid4().hex
+
+    def _dump_data(self, room):
+        return json.dumps({k: v for k, v in room.to_dict().items() if k not in ATOMIC_FIELDS})
+
+    def _build(self, room_hash, members_hash):
+        if not room_hash:
+            return None
+
+        data = json.loads(room_hash['data'])
+        data['room_state'] = int(room_hash['state'])
+        data['pending'] = int(room_hash['pending'])
+        data['current_round'] = int(room_hash['current_round'])
+        data['members'] = {user_id: json.loads(member) for user_id, member in members_hash.items()}
+        return Room.from_dict(data)
+
+    def get(self, room_id):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(_room_key(room_id))
+        pipe.hgetall(_members_key(room_id))
+        room_hash, members_hash = pipe.execute()
+        return self._build(room_hash, members_hash)
+
+    def __contains__(self, room_id):
+        return bool(self.redis.exists(_room_key(room_id)))
+
+    def room_ids(self):
+        return [int(room_id) for room_id in self.redis.smembers(ROOMS_KEY)]
+
+    def create(self, room):
+        room_id = room.room_id
+        created = self._create(
+            keys=[_room_key(room_id), _members_key(room_id), ROOMS_KEY],
+            args=[self._dump_data(room), room.room_state.value, room.pending, room.current_round, room_id]
+        )
+
+        if created and room.members:
+            self.redis.hset(_members_key(room_id), mapping={
+                user_id: json.dumps(member.to_dict()) for user_id, member in room.members.items()
+            })
+        return bool(created)
+
+    def delete(self, room_id):
+        pipe = self.redis.pipeline()
+        pipe.delete(_room_key(room_id), _members_key(room_id), _holds_key(room_id))
+        pipe.srem(ROOMS_KEY, room_id)
+        pipe.execute()
+
+    def update(self, room_id, fn):
+        room_key = _room_key(room_id)
+
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(room_key)
+                    room_hash = pipe.hgetall(room_key)
+                    members_hash = pipe.hgetall(_members_key(room_id))
+                    room = self._build(room_hash, members_hash)
+                    if room is None:
+                        pipe.unwatch()
+                        return None
+
+                    result = fn(room)
+
+                    pipe.multi()
+                    pipe.hset(room_key, 'data', self._dump_data(room))
+                    pipe.execute()
+                    return result
+
+                except self._redis_module.WatchError:
+                    continue
+
+    def set_state(self, room_id, state):
+        self._set_state(keys=[_room_key(room_id)], args=[state.value])
+
+    def add_member(self, room_id, user_id, member, max_size):
+        return self._add_member(
+            keys=[_room_key(room_id), _members_key(room_id), _holds_key(room_id)],
+            args=[user_id, json.dumps(member.to_dict()), max_size, time.time()]
+        )
+
+    def hold_seat(self, room_id, user_id, max_size, ttl):
+        # O hash inteiro expira junto com o último lugar segurado
+        now = time.time()
+        return self._hold_seat(
+            keys=[_room_key(room_id), _members_key(room_id), _holds_key(room_id)],
+            args=[user_id, max_size, now, now + ttl, math.ceil(ttl)]
+        )
+
+    def release_seat(self, room_id, user_id):
+        self.redis.hdel(_holds_key(room_id), user_id)
+
+    def remove_member(self, room_id, user_id):
+        remaining = self._remove_member(
+            keys=[_room_key(room_id), _members_key(room_id), ROOMS_KEY],
+            args=[user_id, room_id]
+        )
+        return None if remaining < 0 else remaining
+
+    def submit_snippet(self, room_id, user_id, snippet):
+        return self._submit(
+            keys=[_room_key(room_id), _members_key(room_id)],
+            args=[user_id, snippet, RoomState.SNIPPETING.value, RoomState.RESPONSE.value]
+        )
+
+    def close_round(self, room_id, current_round):
+        return bool(self._close_round(
+            keys=[_room_key(room_id)],
+            args=[RoomState.SNIPPETING.value, current_round, RoomState.RESPONSE.value]
+        ))
+
+    def start_round(self, room_id):
+        current_round = self._start_round(
+            keys=[_room_key(room_id), _members_key(room_id)],
+            args=[RoomState.SNIPPETING.value]
+        )
+        return None if current_round < 0 else current_round
+
+    def map_user(self, user_id, room_id):
+        pipe = self.redis.pipeline()
+        pipe.hset(USER_ROOM_KEY, user_id, room_id)
+        pipe.hset(USER_WORKER_KEY, user_id, self.worker_id)
+        pipe.execute()
+
+    def unmap_user(self, user_id):
+        pipe = self.redis.pipeline()
+        pipe.hget(USER_ROOM_KEY, user_id)
+        pipe.hdel(USER_ROOM_KEY, user_id)
+        pipe.hdel(USER_WORKER_KEY, user_id)
+        room_id, _, _ = pipe.execute()
+        return int(room_id) if room_id is not None else None
+
+    def room_of(self, user_id):
+        room_id = self.redis.hget(USER_ROOM_KEY, user_id)
+        return int(room_id) if room_id is not None else None
+
+    def heartbeat(self, ttl):
+        self.redis.set(WORKER_PREFIX + self.worker_id, 1, ex=int(ttl))
+
+    def suspect_members(self):
+        user_rooms = {int(user_id): int(room_id) for user_id, room_id in self.redis.hgetall(USER_ROOM_KEY).items()}
+        owners = self.redis.hgetall(USER_WORKER_KEY)
+
+        workers = list(set(owners.values()))
+        pipe = self.redis.pipeline(transaction=False)
+        for worker_id in workers:
+            pipe.exists(WORKER_PREFIX + worker_id)
+        alive = {worker_id for worker_id, exists in zip(workers, pipe.execute()) if exists}
+
+        # Mapeamentos de processos mortos (ou de antes do heartbeat)
+        suspects = {
+            (room_id, user_id) for user_id, room_id in user_rooms.items()
+            if owners.get(str(user_id)) not in alive
+        }
+
+        # Membros que não estão mapeados para a própria sala
+        room_ids = self.room_ids()
+        pipe = self.redis.pipeline(transaction=False)
+        for room_id in room_ids:
+            pipe.hkeys(_members_key(room_id))
+        for room_id, members in zip(room_ids, pipe.execute()):
+            suspects.update(
+                (room_id, int(user_id)) for user_id in members
+                if user_rooms.get(int(user_id)) != room_id
+            )
+
+        return list(suspects)
+
+    def release_member(self, room_id, user_id):
+        remaining = self._release_member(
+            keys=[_room_key(room_id), _members_key(room_id), ROOMS_KEY, USER_ROOM_KEY, USER_WORKER_KEY],
+            args=[user_id, room_id, WORKER_PREFIX]
+        )
+        return None if remaining == -2 else remaining
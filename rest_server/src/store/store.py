@@ -0,0 +1,24 @@
+import os
+
+from src.store.memory import MemoryRoomStore
+
+
+# MAKEASTORY_STATE_STORE:
+#   memory             (padrão) dicts do processo, só funciona com um processo
+#   redis://host:port  compartilhado entre processos, junto com MAKEASTORY_MESSAGE_QUEUE
+
+def create_store(url=None):
+    url = url or os.getenv('MAKEASTORY_STATE_STORE', 'memory')
+
+    if url == 'memory':
+        return MemoryRoomStore()
+
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        from src.store.redis_store import RedisRoomStore
+
+        return RedisRoomStore(url)
+
+    raise ValueError(f'armazenamento de salas desconhecido: {url}')
+
+
+room_store = create_store()
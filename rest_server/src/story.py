@@ -0,0 +1,73 @@
+from models import db, GameRoom, StorySegment
+from src.data import CONTEXT_TOKEN_BUDGET, CHARS_PER_TOKEN
+from src.room.model import Room, Round
+
+
+# A história de uma sala é a sequência dos trechos da IA (StorySegment kind='ai')
+# do jogo atual (GameRoom.games), na ordem em que foram gravados. Uma sala que
+# volta para LOBBY pode ser jogada de novo: os números das rodadas recomeçam e
+# o que separa os jogos é StorySegment.game.
+# final_story_text é só a versão pronta desse texto, gerada no fim do jogo
+# (src/persistence.py) e apagada quando outro jogo começa.
+
+
+def _format(segments):
+    return ''.join(f"\n\n--- Round {segment.round_number} ---\n{segment.text_content}" for segment in segments)
+
+
+def _story_segments(room_id, game):
+    return StorySegment.query.filter_by(
+        game_room_id=room_id, game=game, kind='ai'
+    ).order_by(
+        StorySegment.id
+    ).all()
+
+
+def story_text(game_room_db):
+    return _format(_story_segments(game_room_db.id, game_room_db.games))
+
+
+def materialize_story(room_id):
+    # Grava final_story_text a partir dos trechos do jogo atual (não faz commit)
+    game_room_db = db.session.get(GameRoom, room_id)
+    if game_room_db is None:
+        return None
+
+    # Outro jogo começou antes do lote ser gravado: o texto sai no fim dele
+    if game_room_db.status != 'LOBBY':
+        return None
+
+    segments = _story_segments(room_id, game_room_db.games)
+    # Salas de antes dos trechos só têm o texto antigo, que é mantido
+    if segments or game_room_db.final_story_text is None:
+        game_room_db.final_story_text = _format(segments)
+    return game_room_db.final_story_text
+
+
+def rebuild_room(game_room_db, segments=None):
+    # Sala sem snapshot: refaz as rodadas do jogo atual a partir dos trechos
+    # gravados (segments do jogo, na ordem do id, ou lidos aqui). Salas de
+    # antes dos trechos só têm final_story_text, que vira o resumo
+    rounds = {}
+    if segments is None:
+        segments = StorySegment.query.filter_by(
+            game_room_id=game_room_db.id, game=game_room_db.games
+        ).order_by(
+            StorySegment.id
+        ).all()
+
+    for segment in segments:
+        round_ = rounds.setdefault(segment.round_number, Round(segment.round_number, ()))
+        if segment.kind == 'ai':
+            round_.story = segment.text_content
+        else:
+            round_.snippets += ((segment.author_name or '?', segment.text_content),)
+
+    room = Room(game_room_db.id, game_room_db.room_code, rounds=list(rounds.values()), game=game_room_db.games)
+    room.current_round = max(rounds, default=0)
+
+    if not rounds and game_room_db.final_story_text:
+        # Só o fim da história, o resto o prompt não comportaria
+        room.summary = game_room_db.final_story_text.strip()[-CONTEXT_TOKEN_BUDGET * CHARS_PER_TOKEN // 2:]
+
+    return room
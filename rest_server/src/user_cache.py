@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+from models import db, User
+from src.data import USER_CACHE_SIZE, USER_CACHE_TTL
+
+
+# Cache dos dados de usuário usados pelos sockets (id, username, is_guest)
+#
+# O caminho comum não passa por aqui: o token já traz username e is_guest como
+# claims. O cache atende tokens antigos, sem as claims, e lembra dos usuários
+# removidos por este processo (ex: convidados que saíram), para recusar os
+# tokens deles sem ir ao DB. Guarda dicts simples, nunca objetos do SQLAlchemy.
+
+_DELETED = object()
+
+
+def user_info(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'is_guest': user.is_guest
+    }
+
+
+class UserCache:
+    def __init__(self, size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._users = OrderedDict()     # user_id -> (expira_em, info ou _DELETED)
+        self._hits = 0
+        self._misses = 0
+
+    def _lookup(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+
+            if entry[0] < time.monotonic():
+                del self._users[user_id]
+                return None
+
+            self._users.move_to_end(user_id)
+            return entry[1]
+
+    def _store(self, user_id, value):
+        with self._lock:
+            self._users[user_id] = (time.monotonic() + self.ttl, value)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.size:
+                self._users.popitem(last=False)
+
+    def is_deleted(self, user_id):
+        return self._lookup(user_id) is _DELETED
+
+    def _cached(self, user_id):
+        # (True, dados ou None) se está no cache, (False, None) se precisa ir ao DB
+        cached = self._lookup(user_id)
+        with self._lock:
+            if cached is None:
+                self._misses += 1
+                return False, None
+            self._hits += 1
+        return True, None if cached is _DELETED else cached
+
+    def _loaded(self, user_id, user):
+        if user is None:
+            return None
+
+        info = user_info(user)
+        self._store(user_id, info)
+        return info
+
+    def get(self, user_id):
+        # Dados do usuário ou None se não existe. Precisa de app context se não estiver no cache
+        found, info = self._cached(user_id)
+        if found:
+            return info
+        return self._loaded(user_id, db.session.get(User, user_id))
+
+    async def get_async(self, user_id, load):
+        # Igual ao get, mas o usuário vem de await load(user_id) (servidor asyncio)
+        found, info = self._cached(user_id)
+        if found:
+            return info
+        return self._loaded(user_id, await load(user_id))
+
+    def put(self, user):
+        self._store(user.id, user_info(user))
+
+    def invalidate(self, user_id, deleted=False):
+        if deleted:
+            self._store(user_id, _DELETED)
+            return
+
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'size': len(self._users),
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+
+user_cache = UserCache()
@@ -0,0 +1,78 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+# Ambiente de teste: antes de importar o app (as configurações são lidas no import)
+_tmp = tempfile.mkdtemp(prefix='makeastory-tests-')
+os.environ['MAKEASTORY_DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp, "test.db")}'
+os.environ['MAKEASTORY_SNAPSHOT_PATH'] = os.path.join(_tmp, 'room_snapshots.jsonl')
+os.environ['MAKEASTORY_LLM_PROVIDER'] = 'stub'
+os.environ['MAKEASTORY_ASYNC_MODE'] = 'threading'
+os.environ['MAKEASTORY_DEBUG'] = '0'
+os.environ['MAKEASTORY_BCRYPT_ROUNDS'] = '4'
+os.environ['JWT_SECRET_KEY'] = 'chave-jwt-de-teste-com-32-bytes-ou-mais'
+os.environ.pop('MAKEASTORY_MESSAGE_QUEUE', None)
+os.environ.pop('MAKEASTORY_STATE_STORE', None)
+os.environ.pop('JAMENDO_CLIENT_ID', None)   # sem chamadas de rede na busca de música
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server():
+    from src.main import create_app
+    from src.migrations import upgrade
+    from models import db
+
+    app, socketio = create_app()
+    with app.app_context():
+        db.create_all()
+        upgrade()
+
+    yield app, socketio
+
+    # Grava o que ficou pendente antes do pytest fechar a saída (o atexit chegaria tarde)
+    from src.persistence import persistence
+    from src.room.actors import room_actors
+    from src.room.snapshots import room_snapshots
+
+    deadline = time.monotonic() + 5
+    while room_actors.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.1)   # a última mensagem retirada da caixa ainda pode estar rodando
+    persistence.stop()
+    persistence.flush()
+    room_snapshots.snapshot()
+
+
+@pytest.fixture
+def http(server):
+    return server[0].test_client()
+
+
+def guest_token(http, username):
+    response = http.post('/auth/guest_login', json={'username': username})
+    assert response.status_code == 200
+    return response.get_json()['access_token']
+
+
+def create_room(server):
+    from models import db, GameRoom
+    from src.room.codes import room_codes
+
+    app, _ = server
+    with app.app_context():
+        room = GameRoom(room_code=room_codes.allocate(), status='LOBBY')
+        db.session.add(room)
+        db.session.commit()
+        return room.id
+
+
+def room_client(server, token):
+    app, socketio = server
+    client = socketio.test_client(app, namespace='/r', auth={'token': token})
+    assert client.is_connected('/r')
+    return client
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from src.passwords import PasswordHasher, PasswordQueueFull
+
+
+JOB_SECONDS = 0.25
+
+
+@pytest.fixture
+def hasher():
+    # Custo 12: a estimativa inicial é de um job de JOB_SECONDS, como o time.sleep abaixo
+    hasher = PasswordHasher(rounds=12, workers=2, queue_timeout=0.5)
+    warmup = [hasher._pool().submit(time.sleep, 0.2) for _ in range(hasher.workers)]
+    for future in warmup:
+        future.result()
+    yield hasher
+    hasher.shutdown()
+
+
+def test_queue_only_takes_what_starts_before_the_timeout(hasher):
+    # Em andamento ao mesmo tempo: os que rodam e os que começam antes do timeout
+    capacity = int(hasher.workers * hasher.queue_timeout / JOB_SECONDS)
+    jobs = capacity * 3
+    results = []
+
+    def job():
+        started = time.monotonic()
+        try:
+            hasher._run(time.sleep, JOB_SECONDS)
+            results.append(('ok', None))
+        except PasswordQueueFull as e:
+            results.append((str(e), time.monotonic() - started))
+
+    threads = [threading.Thread(target=job) for _ in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    completed = [result for result in results if result[0] == 'ok']
+    rejected = [result for result in results if result[0] != 'ok']
+
+    # Quem entra na fila começa a tempo; o excesso é recusado na hora, sem esperar o timeout
+    assert len(completed) == capacity
+    assert len(rejected) == jobs - capacity
+    assert all(message == 'Fila de senhas cheia' for message, _ in rejected)
+    assert all(waited < hasher.queue_timeout for _, waited in rejected)
+
+    metrics = hasher.metrics()
+    assert metrics['completed'] == capacity
+    assert metrics['rejected'] == jobs - capacity
@@ -0,0 +1,56 @@
+import time
+
+from conftest import guest_token, create_room, room_client
+
+
+def test_room_namespace_registered(server):
+    _, socketio = server
+    assert '/r' in socketio.server.namespace_handlers
+    assert '/' in socketio.server.namespace_handlers
+
+
+def test_connect_and_join_room(server, http):
+    room_id = create_room(server)
+    client = room_client(server, guest_token(http, 'guest-connect'))
+
+    events = [event['name'] for event in client.get_received('/r')]
+    assert 'connect_ack' in events or 'connect_confirm' in events
+
+    ack = client.emit('join_room', {'room_id': room_id}, namespace='/r', callback=True)
+    assert ack == {'status': 'ok', 'room_id': room_id}
+
+    client.disconnect(namespace='/r')
+
+
+def _wait_for(client, names, timeout=5):
+    # Os eventos da rodada saem de workers em background: junta o que chegar até o prazo
+    received = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        received += [event['name'] for event in client.get_received('/r')]
+        if set(names) <= set(received):
+            break
+        time.sleep(0.05)
+    return received
+
+
+def test_round_events_arrive_on_room_namespace(server, http):
+    room_id = create_room(server)
+    client = room_client(server, guest_token(http, 'guest-round'))
+    client.emit('join_room', {'room_id': room_id}, namespace='/r', callback=True)
+    client.get_received('/r')
+
+    client.emit('start_game', namespace='/r', callback=True)
+    received = _wait_for(client, ['game_started', 'round_started'])
+    assert 'game_started' in received
+    assert 'round_started' in received
+
+    ack = client.emit('story_snippet', {'snippet': 'Era uma vez'}, namespace='/r', callback=True)
+    assert ack == {'status': 'ok'}
+    received = _wait_for(client, ['round_ended', 'new_story_part', 'story_media'])
+    assert 'round_ended' in received
+    assert 'new_story_part' in received
+    assert 'story_media' in received
+    assert 'error' not in received
+
+    client.disconnect(namespace='/r')
@@ -0,0 +1,65 @@
+import time
+
+from src.lobby.matchmaking import MatchmakingIndex
+from src.room.model import Room, Member
+from src.store.base import JOIN_OK, JOIN_FULL, JOIN_NO_ROOM
+from src.store.memory import MemoryRoomStore
+
+
+def make_store(members=0, size=3):
+    store = MemoryRoomStore(rooms={}, user_rooms={})
+    store.create(Room(1, 'SALA01'))
+    for user_id in range(100, 100 + members):
+        assert store.add_member(1, user_id, Member(user_id, f'u{user_id}'), size) == JOIN_OK
+    return store
+
+
+def test_held_seats_count_against_capacity():
+    store = make_store(members=1)
+    assert store.hold_seat(1, 7, 3, ttl=10) == JOIN_OK
+    assert store.hold_seat(1, 8, 3, ttl=10) == JOIN_OK
+    assert store.hold_seat(1, 9, 3, ttl=10) == JOIN_FULL
+
+    # join_room direto não pega o lugar de quem segurou
+    assert store.add_member(1, 9, Member(9, 'u9'), 3) == JOIN_FULL
+
+    # Quem segurou entra e o lugar segurado vira o dele
+    assert store.add_member(1, 7, Member(7, 'u7'), 3) == JOIN_OK
+    assert store.add_member(1, 8, Member(8, 'u8'), 3) == JOIN_OK
+    assert store.holds == {}
+
+
+def test_released_and_expired_holds_free_the_seat():
+    store = make_store(members=2)
+    assert store.hold_seat(1, 7, 3, ttl=10) == JOIN_OK
+    store.release_seat(1, 7)
+    assert store.add_member(1, 9, Member(9, 'u9'), 3) == JOIN_OK
+
+    store = make_store(members=2)
+    assert store.hold_seat(1, 7, 3, ttl=0.05) == JOIN_OK
+    time.sleep(0.1)
+    assert store.add_member(1, 9, Member(9, 'u9'), 3) == JOIN_OK
+
+
+def test_hold_on_missing_room():
+    store = make_store()
+    assert store.hold_seat(2, 7, 3, ttl=10) == JOIN_NO_ROOM
+
+
+def test_claim_skips_rooms_full_in_the_store():
+    store = make_store(members=1)
+    store.create(Room(2, 'SALA02'))
+    matchmaking = MatchmakingIndex(size=3, store=store)
+    matchmaking.set_room(1, 1, True)
+    matchmaking.set_room(2, 0, True)
+
+    # Outro processo segurou os lugares da sala 1 e o índice daqui não viu
+    assert store.hold_seat(1, 50, 3, ttl=10) == JOIN_OK
+    assert store.hold_seat(1, 51, 3, ttl=10) == JOIN_OK
+
+    assert matchmaking.claim(7) == 2
+    assert matchmaking.held_room(7) == 2
+    assert 7 in store.holds[2]
+
+    matchmaking.release(7)
+    assert 7 not in store.holds.get(2, {})
@@ -5,4 +5,4 @@ logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
 if __name__ == "__main__":
     app, socketio = create_app()
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=5000, debug=app.debug)
\ No newline at end of file
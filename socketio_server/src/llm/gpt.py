@@ -1,17 +1,62 @@
 import os
-import openai
 
-openai.api_key = os.getenv('MAKEASTORY_GPT_API_KEY')
+from src.log import logger
+
+
+# Provedor escolhido por configuração:
+#   MAKEASTORY_LLM_PROVIDER   stub (padrão) ou openai
+#   MAKEASTORY_LLM_MODEL      modelo usado pelo provedor openai
+#
+# Stub (ver src/llm/stub.py):
+#   MAKEASTORY_STUB_LATENCY       tempo total de geração, ex: lognormal:0.5:0.4
+#   MAKEASTORY_STUB_FIRST_TOKEN   tempo até o primeiro pedaço, ex: uniform:0.1:0.3
+#   MAKEASTORY_STUB_ERROR_RATE    chance de erro por chamada, de 0 a 1
+#   MAKEASTORY_STUB_CHUNKS        pedaços por resposta no streaming
+#   MAKEASTORY_STUB_SEED          seed da latência e dos erros
+
+_provider = None
+
+
+def create_provider(name=None):
+    name = name or os.getenv('MAKEASTORY_LLM_PROVIDER', 'stub')
+
+    if name == 'openai':
+        from src.llm.openai_provider import OpenAIProvider
+
+        return OpenAIProvider(
+            api_key=os.getenv('MAKEASTORY_GPT_API_KEY'),
+            model=os.getenv('MAKEASTORY_LLM_MODEL', 'gpt-5-nano')
+        )
+
+    if name == 'stub':
+        from src.llm.stub import StubProvider
+
+        seed = os.getenv('MAKEASTORY_STUB_SEED')
+        return StubProvider(
+            latency=os.getenv('MAKEASTORY_STUB_LATENCY', 'fixed:0'),
+            first_token=os.getenv('MAKEASTORY_STUB_FIRST_TOKEN', 'fixed:0'),
+            error_rate=float(os.getenv('MAKEASTORY_STUB_ERROR_RATE', '0')),
+            chunks=int(os.getenv('MAKEASTORY_STUB_CHUNKS', '20')),
+            seed=int(seed) if seed is not None else None
+        )
+
+    raise ValueError(f'provedor de LLM desconhecido: {name}')
+
+def get_provider():
+    global _provider
+
+    if _provider is None:
+        _provider = create_provider()
+        logger.info(f"Provedor de LLM: {_provider.name}")
+
+    return _provider
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
 
 def submit_round(input_array):
-    response = openai.responses.create(
-        model = "gpt-5-nano",
-        input = input_array,
-        
-        reasoning = {"effort": "minimal"},
-        service_tier = "flex",
-        store = False
-    )
-
-    response_text = response.output[1].content[0].text
-    return response_text
\ No newline at end of file
+    return get_provider().submit(input_array)
+
+def stream_round(input_array):
+    return get_provider().stream(input_array)
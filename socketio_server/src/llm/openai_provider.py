@@ -0,0 +1,24 @@
+from src.llm.provider import LLMProvider
+
+
+class OpenAIProvider(LLMProvider):
+    name = 'openai'
+
+    def __init__(self, api_key, model):
+        # Import aqui para que o stub rode sem o pacote openai instalado
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key)
+        self.model = model
+
+    def submit(self, input_array):
+        response = self.client.responses.create(
+            model = self.model,
+            input = input_array,
+
+            reasoning = {"effort": "minimal"},
+            service_tier = "flex",
+            store = False
+        )
+
+        return response.output[1].content[0].text
@@ -0,0 +1,13 @@
+class LLMProvider:
+    name = 'base'
+
+    def submit(self, input_array):
+        raise NotImplementedError
+
+    def stream(self, input_array):
+        # Provedores sem streaming entregam a resposta inteira de uma vez
+        yield self.submit(input_array)
+
+
+class LLMProviderError(Exception):
+    pass
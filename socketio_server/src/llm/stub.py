@@ -0,0 +1,94 @@
+import hashlib
+import random
+import time
+
+from src.llm.provider import LLMProvider, LLMProviderError
+
+
+# Provedor local e determinístico para testes de carga, sem rede e sem chave
+#
+# O texto depende só das mensagens enviadas (mesma entrada, mesma resposta).
+# A latência e os erros são sorteados com um gerador próprio, controlado por seed.
+
+WORDS = (
+    'the', 'old', 'dragon', 'forest', 'whispered', 'under', 'a', 'silver', 'moon',
+    'while', 'thief', 'princess', 'storm', 'castle', 'ancient', 'map', 'river',
+    'shadow', 'sword', 'song', 'village', 'secret', 'door', 'fire', 'glimmered',
+    'across', 'mountains', 'and', 'of', 'their', 'journey', 'began', 'again'
+)
+
+
+def parse_distribution(spec):
+    # 'fixed:0.5', 'uniform:0.2:1.5', 'normal:1.0:0.3' ou 'lognormal:0.0:0.5' (em segundos)
+    kind, *params = spec.split(':')
+    params = [float(p) for p in params]
+
+    if kind == 'fixed':
+        return lambda rng: params[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(params[0], params[1])
+
+    raise ValueError(f'distribuição de latência desconhecida: {spec}')
+
+
+class StubProvider(LLMProvider):
+    name = 'stub'
+
+    def __init__(self, latency='fixed:0', first_token='fixed:0', error_rate=0.0,
+                 response_chars=800, chunks=20, seed=None):
+        self.latency = parse_distribution(latency)
+        self.first_token = parse_distribution(first_token)
+        self.error_rate = error_rate
+        self.response_chars = response_chars
+        self.chunks = max(1, chunks)
+        self.rng = random.Random(seed)
+
+    def _text(self, input_array):
+        digest = hashlib.sha256(repr([m['content'] for m in input_array]).encode('utf-8')).digest()
+        rng = random.Random(digest)
+
+        words = []
+        size = 0
+        while size < self.response_chars:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+
+        return ' '.join(words).capitalize()[:self.response_chars].rstrip() + '.'
+
+    def _fails(self):
+        # Um sorteio por chamada, para a taxa de erro ser a configurada
+        return bool(self.error_rate) and self.rng.random() < self.error_rate
+
+    def _maybe_fail(self):
+        if self._fails():
+            raise LLMProviderError('erro simulado pelo stub')
+
+    def _chunks(self, input_array):
+        # Pedaços do texto e, se a chamada vai falhar, antes de qual deles
+        # (erro no meio da geração também acontece com provedores reais)
+        text = self._text(input_array)
+        step = -(-len(text) // self.chunks)
+        chunks = [text[start:start + step] for start in range(0, len(text), step)]
+        fail_at = self.rng.randrange(len(chunks)) if self._fails() else None
+        return chunks, fail_at
+
+    def submit(self, input_array):
+        time.sleep(self.first_token(self.rng) + self.latency(self.rng))
+        self._maybe_fail()
+        return self._text(input_array)
+
+    def stream(self, input_array):
+        chunks, fail_at = self._chunks(input_array)
+        time.sleep(self.first_token(self.rng))
+        delay = self.latency(self.rng) / self.chunks
+
+        for index, chunk in enumerate(chunks):
+            if index == fail_at:
+                raise LLMProviderError('erro simulado pelo stub')
+            yield chunk
+            time.sleep(delay)
@@ -9,7 +9,7 @@ import os
 
 def create_app():
     app = Flask(__name__)
-    app.debug = True
+    app.debug = os.getenv('MAKEASTORY_DEBUG', '1') == '1'
     app.config['SECRET_KEY'] = os.getenv('MAKEASTORY_SOCKETIO_APP_KEY')
 
     socketio = SocketIO(cors_allowed_origins='*')
@@ -177,9 +177,7 @@ class RoomNS(Namespace):
             'content': prompt
         })
         
-        llm_response = 'Placeholder Response.'
-        
-        # llm_response = submit_round(room['history_parsed'])
+        llm_response = submit_round(room['history_parsed'])
         
         room['history_parsed'].append({
             'role': 'assistant',